@@ -8,15 +8,16 @@ import datetime
 import uuid
 import joblib
 import subprocess
+import threading
 from collections import deque
 from typing import List, Dict, Any
 
 import pandas as pd
 import numpy as np
 import socketio
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, ValidationError
 from dotenv import load_dotenv
 
@@ -24,26 +25,27 @@ from dotenv import load_dotenv
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from config import config
-from services.model_service import generate_signal_from_data
-from services.trading_service import BinanceTradingService
+from services.model_service import model_version
+from services.signal_cache import signal_cache
+from services.single_flight import signal_flight
+from services.compute_pool import compute_pool
+from services.job_queue import JobQueue, JobQueueFull
+from services.trainer_pool import trainer_pool
+from services.signal_stream import SignalStream
+from services.trading_service import BinanceTradingService, closed_klines
 from services.data_service import write_trade_audit, replace_nan_with_none
+from services import metrics, profiler
 
-# Legacy imports
-try:
-    import MetaTrader5 as mt5
-except Exception:
-    mt5 = None
-
-from data_handler import get_any_stock_data
+from data_handler import get_any_stock_data, get_cache_path
 from feature_generator import generate_features
 from model_trainer import create_target_labels
-from backtester import Backtester
-from stock_diagnoser import diagnose_stock
-from trader import Trader
-try:
-    from sklearn.ensemble import RandomForestRegressor
-except ImportError:
-    pass
+from fast_backtester import TRADE_DTYPE
+from robustness import run_backtester_robustness
+from backtest_store import BacktestStore, compute_fingerprint
+from scanner import to_display_records
+from scanner_snapshot import (load_snapshot, list_snapshots, query_snapshot, is_fresh, run_snapshot_scan,
+                              next_snapshot_time, SNAPSHOT_RETRY_SECONDS)
+# MetaTrader5 / Trader / sklearn / Backtester / stock_diagnoser 导入较慢，在第一次用到时才导入
 
 # --- Initialization ---
 load_dotenv()
@@ -62,8 +64,10 @@ app.add_middleware(
 
 # --- Global State ---
 signal_logs = deque(maxlen=config.SIGNAL_LOG_MAX_LEN)
-trader = Trader()
+_mt5_module = None
+_trader = None
 binance_service = BinanceTradingService()
+backtest_store = BacktestStore()
 
 # --- Pydantic Models ---
 class TickerInfo(BaseModel):
@@ -73,6 +77,13 @@ class TickerInfo(BaseModel):
 class TrainRequest(BaseModel):
     ticker: str
 
+class CompareRequest(BaseModel):
+    run_ids: List[str]
+
+class BatchPredictRequest(BaseModel):
+    symbols: List[str]
+    stream: bool = False # True 时以 NDJSON 逐行返回，每只股票完成即输出
+
 class StrategyConfig(BaseModel):
     ticker: str = '600519'
     train_start_date: str = '20180101'
@@ -83,6 +94,9 @@ class StrategyConfig(BaseModel):
     future_days: int = 5
     external_event: int = 0
     fundamental_factors: List[str] = []
+    robustness_paths: int = 2000 # 0 表示不做蒙特卡洛稳健性分析
+    robustness_method: str = 'block_bootstrap'
+    robustness_block_size: int = 20
 
 # --- Helper Functions ---
 def add_global_log(message: str):
@@ -91,12 +105,32 @@ def add_global_log(message: str):
     print(log_entry)
     signal_logs.appendleft(log_entry)
 
+def get_mt5():
+    """第一次使用时导入 MetaTrader5 (只在 Windows 上可用)，导入失败返回 None。"""
+    global _mt5_module
+    if _mt5_module is None:
+        try:
+            import MetaTrader5
+            _mt5_module = MetaTrader5
+        except Exception:
+            _mt5_module = False
+    return _mt5_module or None
+
+def get_trader():
+    """Trader 构造时会连接 MT5，推迟到第一次调用交易接口时创建。"""
+    global _trader
+    if _trader is None:
+        from trader import Trader
+        _trader = Trader()
+    return _trader
+
 # --- Events ---
 @app.on_event("startup")
 async def startup_event():
     print("API Startup...")
     if platform.system() == "Windows":
         try:
+            mt5 = get_mt5()
             if mt5 and mt5.initialize():
                  print("✅ MT5 initialized.")
             else:
@@ -109,15 +143,33 @@ async def startup_event():
     except Exception as e:
         print(f"❌ Binance Init Warning: {e}")
 
+    compute_pool.start()
+    trainer_pool.start()
+
+    loop = asyncio.get_running_loop()
+    strategy_jobs.on_event = lambda event: asyncio.run_coroutine_threadsafe(
+        sio.emit('strategy_progress', event, to=f"job:{event['job_id']}"), loop)
+    signal_stream.publish = lambda key, payload: sio.emit('signal', payload, to=signal_room(*key))
+
+    # 由独立进程 (python scanner_snapshot.py --loop) 负责扫描时设置 SCANNER_SNAPSHOT_SCHEDULE=0
+    if os.getenv('SCANNER_SNAPSHOT_SCHEDULE', '1') == '1':
+        asyncio.create_task(snapshot_scheduler())
+
 @app.on_event("shutdown")
 async def shutdown_event():
-    if platform.system() == "Windows" and mt5:
-        mt5.shutdown()
+    if platform.system() == "Windows" and _mt5_module:
+        _mt5_module.shutdown()
     await binance_service.close()
+    compute_pool.shutdown()
+    strategy_jobs.shutdown()
+    trainer_pool.shutdown()
+    signal_stream.shutdown()
 
 # --- Core Logic (Strategy) ---
 # Keeping this here to avoid breaking dependencies in short term
-def run_strategy_pipeline(config: StrategyConfig) -> Dict[str, Any]:
+def run_strategy_pipeline(config: StrategyConfig, progress=None) -> Dict[str, Any]:
+    """progress(stage, message) 上报阶段进度: data / features / train / backtest / predict。"""
+    progress = progress or (lambda stage, message='': None)
     safe_ticker_upper = config.ticker.replace('/', '_').upper()
     MODEL_PATH = config.ticker + '_model.joblib' # Using config ticker for naming to match existing expectations if any
     # Correction: Use config.get_model_path if possible, or consistent naming.
@@ -125,12 +177,25 @@ def run_strategy_pipeline(config: StrategyConfig) -> Dict[str, Any]:
     MODEL_PATH = f'./{safe_ticker_upper}_model.joblib'
 
     print(f"为股票 {safe_ticker_upper} 准备数据...")
+    progress('data', f"为股票 {safe_ticker_upper} 准备数据")
     raw_data_train = get_any_stock_data(ticker=safe_ticker_upper, start_date=config.train_start_date, end_date=config.train_end_date)
     if raw_data_train.empty:
         raise HTTPException(status_code=400, detail="无法获取训练数据")
+    raw_data_backtest = get_any_stock_data(ticker=safe_ticker_upper, start_date=config.backtest_start_date, end_date=config.backtest_end_date)
+
+    # 模型在流水线内按固定随机种子重新训练，因此 参数 + 数据文件 + 特征/回测代码 即可确定结果。
+    # 指纹在数据加载 (首次运行时下载) 之后按实际的数据文件计算；命中时把保存的模型恢复到 MODEL_PATH，
+    # 与重新训练一样留下本次运行的模型文件
+    run_id = compute_fingerprint(config.model_dump(), data_paths=[get_cache_path(safe_ticker_upper)])
+    if backtest_store.exists(run_id) and backtest_store.has_model_file(run_id):
+        print(f"命中回测结果缓存: {run_id}")
+        backtest_store.restore_model_file(run_id, MODEL_PATH)
+        print(f"已恢复该次运行的模型文件: {MODEL_PATH}")
+        return load_strategy_result(run_id)
 
     raw_data_train['external_event'] = 0
     print("正在生成技术指标特征...")
+    progress('features', "正在生成技术指标特征")
     data_with_features_train, _ = generate_features(raw_data_train.copy())
     if data_with_features_train.empty:
         raise HTTPException(status_code=400, detail="生成训练特征失败")
@@ -162,6 +227,8 @@ def run_strategy_pipeline(config: StrategyConfig) -> Dict[str, Any]:
     if X_train.empty or y_train.empty:
         raise HTTPException(status_code=400, detail="数据处理后没有可用于训练的样本。")
 
+    progress('train', f"使用 {len(X_train)} 个样本、{len(features_to_use)} 个特征训练模型")
+    from sklearn.ensemble import RandomForestRegressor
     model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1)
     model.fit(X_train, y_train)
     joblib.dump(model, MODEL_PATH)
@@ -171,9 +238,10 @@ def run_strategy_pipeline(config: StrategyConfig) -> Dict[str, Any]:
     feature_importance_data = sorted(zip(features_to_use, importances), key=lambda x: x[1], reverse=True)
 
     print(f"在样本外数据上进行回测...")
-    raw_data_backtest = get_any_stock_data(ticker=safe_ticker_upper, start_date=config.backtest_start_date, end_date=config.backtest_end_date)
-    
-    metrics, kline_data, buy_signals, sell_signals = {}, [], [], []
+    progress('backtest', "在样本外数据上进行回测")
+
+    metrics, robustness = {}, {}
+    backtest_dates, backtest_arrays, backtest_trades = pd.DatetimeIndex([]), {}, np.empty(0, dtype=TRADE_DTYPE)
     
     if not raw_data_backtest.empty:
         raw_data_backtest['external_event'] = 0
@@ -181,19 +249,23 @@ def run_strategy_pipeline(config: StrategyConfig) -> Dict[str, Any]:
         if not data_for_backtest.empty:
             backtest_features_to_use = [f for f in features_to_use if f in data_for_backtest.columns]
             if backtest_features_to_use:
+                from backtester import Backtester
                 backtester = Backtester(data=data_for_backtest, model_path=MODEL_PATH, features=backtest_features_to_use, initial_capital=config.initial_capital)
-                backtester.run_backtest()
+                backtester.run_backtest(engine='fast')
                 metrics = backtester.get_performance_metrics()
-                
-                ohlc_data = data_for_backtest[['open', 'close', 'low', 'high']].reset_index()
-                ohlc_data.rename(columns={'index': 'date'}, inplace=True)
-                ohlc_data['date'] = pd.to_datetime(ohlc_data['date']).dt.strftime('%Y-%m-%d')
-                kline_data = ohlc_data.values.tolist()
-                
-                buy_signals = [[trade['date'].strftime('%Y-%m-%d'), trade['price']] for trade in backtester.trades if trade['type'] == 'BUY']
-                sell_signals = [[trade['date'].strftime('%Y-%m-%d'), trade['price']] for trade in backtester.trades if trade['type'] == 'SELL']
+                if config.robustness_paths > 0:
+                    robustness = run_backtester_robustness(backtester, method=config.robustness_method,
+                                                           n_paths=config.robustness_paths,
+                                                           block_size=config.robustness_block_size)
+
+                backtest_dates = backtester.data.index
+                backtest_arrays = {col: backtester.data[col].to_numpy() for col in ('open', 'high', 'low', 'close')}
+                backtest_arrays.update(portfolio_value=backtester.portfolio_value, daily_returns=backtester.daily_returns,
+                                       predictions=backtester.predictions)
+                backtest_trades = backtester.trade_array
 
     print(f"根据最新数据预测 {config.future_days} 个交易日后的情况...")
+    progress('predict', f"预测 {config.future_days} 个交易日后的情况")
     last_day_features_df = data_with_features_train.iloc[-1:][features_to_use].copy()
     last_day_features_df['external_event'] = config.external_event
     
@@ -213,12 +285,11 @@ def run_strategy_pipeline(config: StrategyConfig) -> Dict[str, Any]:
     last_trading_date = data_with_features_train.index[-1]
     predicted_date = (last_trading_date + pd.Timedelta(days=config.future_days)).strftime('%Y-%m-%d')
 
-    results = {
+    meta = {
+        "params": config.model_dump(),
         "metrics": metrics,
-        "kline_data": kline_data,
-        "buy_signals": buy_signals,
-        "sell_signals": sell_signals,
-        "feature_importance": feature_importance_data,
+        "robustness": robustness,
+        "feature_importance": [[name, float(value)] for name, value in feature_importance_data],
         "next_day_prediction": {
             "date": predicted_date,
             "signal": prediction_signal,
@@ -226,7 +297,51 @@ def run_strategy_pipeline(config: StrategyConfig) -> Dict[str, Any]:
             "predicted_return": f"{predicted_return:.2%}"
         }
     }
-    return replace_nan_with_none(results)
+    if run_id is None:
+        return replace_nan_with_none(_strategy_result(meta, backtest_dates, backtest_arrays, backtest_trades))
+    backtest_store.save_model_file(run_id, MODEL_PATH)
+    backtest_store.save(run_id, backtest_dates, backtest_arrays, backtest_trades, replace_nan_with_none(meta))
+    return load_strategy_result(run_id)
+
+def _strategy_result(meta: Dict[str, Any], dates: pd.DatetimeIndex, arrays: Dict[str, np.ndarray], trades: np.ndarray) -> Dict[str, Any]:
+    """把回测数组和元数据组装成 /strategy/run 的返回格式。"""
+    date_strs = pd.DatetimeIndex(dates).strftime('%Y-%m-%d')
+    kline_data = [[d, float(o), float(c), float(l), float(h)]
+                  for d, o, c, l, h in zip(date_strs, arrays.get('open', []), arrays.get('close', []),
+                                           arrays.get('low', []), arrays.get('high', []))]
+    trade_dates = date_strs[trades['index']]
+    buy_signals = [[d, float(p)] for d, p, t in zip(trade_dates, trades['price'], trades['type']) if t == 1]
+    sell_signals = [[d, float(p)] for d, p, t in zip(trade_dates, trades['price'], trades['type']) if t == -1]
+    return {
+        "run_id": meta.get("run_id"),
+        "metrics": meta["metrics"],
+        "kline_data": kline_data,
+        "buy_signals": buy_signals,
+        "sell_signals": sell_signals,
+        "robustness": meta["robustness"],
+        "feature_importance": meta["feature_importance"],
+        "next_day_prediction": meta["next_day_prediction"],
+    }
+
+def load_strategy_result(run_id: str) -> Dict[str, Any]:
+    """从回测结果存储读取一次运行并组装成 /strategy/run 的返回格式。"""
+    arrays = backtest_store.load_arrays(run_id)
+    dates = arrays.pop('dates')
+    trades = arrays.pop('trades')
+    return replace_nan_with_none(_strategy_result(backtest_store.load_meta(run_id), dates, arrays, trades))
+
+# 策略流水线任务队列 (最多 STRATEGY_MAX_CONCURRENT_JOBS 个同时运行)
+def run_strategy_job(params: Dict[str, Any], progress) -> Dict[str, Any]:
+    """params['profile'] 为 True 时 (提交请求开启了 profiling) 分析整个流水线，结果中附带 profile_id。"""
+    params = dict(params)
+    if not params.pop('profile', False):
+        return run_strategy_pipeline(StrategyConfig(**params), progress)
+    with profiler.profile_request('strategy_run', ticker=params.get('ticker')) as profile:
+        result = run_strategy_pipeline(StrategyConfig(**params), progress)
+    return dict(result, profile_id=profile.profile_id) if profile is not None else result
+
+strategy_jobs = JobQueue(run_strategy_job,
+                         max_concurrent=int(os.getenv('STRATEGY_MAX_CONCURRENT_JOBS', '2')))
 
 # --- Background Tasks ---
 def run_script_sync(script_name: str, sid: str, loop, sio_server):
@@ -248,17 +363,6 @@ def run_script_sync(script_name: str, sid: str, loop, sio_server):
                 if line:
                     emit_log(line)
         process.wait()
-        if script_name == 'scanner.py':
-            result_path = os.path.join(os.path.dirname(__file__), 'predicted_stocks.json')
-            if os.path.exists(result_path):
-                with open(result_path, 'r', encoding='utf-8') as f:
-                    results = json.load(f)
-                asyncio.run_coroutine_threadsafe(
-                    sio_server.emit('prediction_result', {'data': results}, to=sid), loop
-                )
-                try: 
-                    os.remove(result_path) 
-                except: pass
     except Exception as e:
         error_message = f"执行脚本 {script_name} 时发生严重错误: {e}"
         asyncio.run_coroutine_threadsafe(
@@ -275,6 +379,98 @@ async def run_script(script_name: str, sid: str):
         None, functools.partial(run_script_sync, script_name, sid, loop, sio)
     )
 
+# 每个客户端正在运行的全市场扫描的取消标志
+scan_cancel_events: Dict[str, threading.Event] = {}
+# predict 任务推送给前端的股票数量
+SCAN_TOP_N = 50
+
+def run_scan_sync(sid: str, loop, cancel_event: threading.Event, refresh: bool = False):
+    """
+    当日快照已存在时直接推送快照中的 Top N；否则流式扫描全市场：推送进度，
+    Top N 变化时推送部分结果，结束时推送最终结果并保存为当日快照。
+    进程内同时只有一次扫描，其他客户端 (包括 refresh) 和定时扫描都加入正在运行的扫描。
+    """
+    def emit(event, payload):
+        asyncio.run_coroutine_threadsafe(sio.emit(event, payload, to=sid), loop)
+
+    def emit_snapshot(meta, snapshot):
+        emit('log', {'data': f"使用 {meta['trade_date']} 的全市场扫描快照 ({meta['created_at']} 生成，共 {meta['count']} 只)。"})
+        emit('prediction_result', {'data': to_display_records(snapshot.head(SCAN_TOP_N)), 'partial': False,
+                                   'snapshot': meta['trade_date']})
+
+    try:
+        meta, snapshot = load_snapshot()
+        if not refresh and is_fresh(meta):
+            emit_snapshot(meta, snapshot)
+            return
+
+        updates = []
+        def on_update(update):
+            updates[:] = [update]
+            emit('scan_progress', {'done': update['done'], 'total': update['total'], 'failed': update['failed']})
+            if update['improved']:
+                emit('prediction_result', {'data': to_display_records(update['top']), 'partial': True})
+
+        meta = run_snapshot_scan(cancel_event=cancel_event, on_update=on_update, force=refresh)
+        if not updates:
+            if meta is not None:
+                # 等待期间其他扫描已生成当日快照
+                emit_snapshot(*load_snapshot(meta['trade_date']))
+            elif cancel_event.is_set():
+                emit('log', {'data': "扫描已取消。"})
+            else:
+                emit('log', {'data': "未能获取股票列表，扫描中止。"})
+        else:
+            last = updates[0]
+            cancelled = cancel_event.is_set() or last['cancelled']
+            status = "已取消" if cancelled else "完成"
+            emit('log', {'data': f"扫描{status}: {last['done']}/{last['total']} 只股票，失败 {last['failed']} 只。"})
+            emit('prediction_result', {'data': to_display_records(last['top']), 'partial': False,
+                                       'cancelled': cancelled})
+    except Exception as e:
+        emit('log', {'data': f"执行全市场扫描时发生严重错误: {e}"})
+    finally:
+        emit('task_done', {'script': 'scanner.py'})
+
+async def run_scan(sid: str, refresh: bool = False):
+    if sid in scan_cancel_events:
+        await sio.emit('log', {'data': "扫描已在运行中。"}, to=sid)
+        return
+    cancel_event = scan_cancel_events[sid] = threading.Event()
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, functools.partial(run_scan_sync, sid, loop, cancel_event, refresh))
+    finally:
+        scan_cancel_events.pop(sid, None)
+
+async def snapshot_scheduler():
+    """每个交易日收盘数据发布后扫描一次全市场并保存快照；启动时当日快照缺失则立即补扫。"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            if not is_fresh(load_snapshot()[0]):
+                add_global_log("开始定时全市场扫描...")
+                # 客户端触发的扫描正在运行时加入它，不重复扫描
+                meta = await loop.run_in_executor(None, functools.partial(run_snapshot_scan, force=False))
+                add_global_log(f"定时扫描完成: {meta['count']} 只股票。" if meta else "定时扫描没有产生结果。")
+            delay = (next_snapshot_time() - pd.Timestamp.now()).total_seconds()
+        except Exception as e:
+            add_global_log(f"定时全市场扫描失败: {e}")
+            delay = SNAPSHOT_RETRY_SECONDS
+        await asyncio.sleep(max(0.0, delay))
+
+async def run_train_task(ticker: str, sid: str):
+    """在常驻训练进程中训练指定品种的模型，训练日志逐行推送给客户端。"""
+    loop = asyncio.get_running_loop()
+    def log_callback(message):
+        asyncio.run_coroutine_threadsafe(sio.emit('log', {'data': message}, to=sid), loop)
+    try:
+        outcome = await trainer_pool.train(ticker, log_func=log_callback)
+        if not outcome['ok']:
+            await sio.emit('log', {'data': f"训练 {ticker} 失败: {outcome['error']}"}, to=sid)
+    finally:
+        await sio.emit('task_done', {'script': 'model_trainer.py'}, to=sid)
+
 async def run_diagnose_task(stock_code: str, sid: str):
     loop = asyncio.get_running_loop()
     def log_callback(message):
@@ -283,6 +479,7 @@ async def run_diagnose_task(stock_code: str, sid: str):
         )
     log_callback(f"开始诊断股票: {stock_code}...")
     try:
+        from stock_diagnoser import diagnose_stock
         advice = await loop.run_in_executor(None, diagnose_stock, stock_code)
         log_callback(f"诊断完成。")
         asyncio.run_coroutine_threadsafe(
@@ -324,21 +521,53 @@ async def btc_signal_for_ea(symbol: str = 'BTC/USDT', timeframe: str = '5m', tra
         log_wrapper(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
+def load_predict_data(symbol: str):
+    """/predict 使用的最近 250 天行情；数据不足 50 行时返回 None。"""
+    end_date = datetime.datetime.now().strftime("%Y%m%d")
+    start_date = (datetime.datetime.now() - datetime.timedelta(days=250)).strftime("%Y%m%d")
+    market_data = get_any_stock_data(ticker=symbol, start_date=start_date, end_date=end_date)
+    if market_data is None or market_data.empty or len(market_data) < 50:
+        return None
+    return market_data
+
 @app.get("/predict")
-async def predict_signal_for_ea(symbol: str):
+async def predict_signal_for_ea(symbol: str, request: Request, response: Response):
+    if profiler.profiling_requested(request):
+        with profiler.profile_request('predict', symbol=symbol) as profile:
+            result = await predict_signal(symbol)
+        if profile is not None:
+            response.headers['X-Profile-Id'] = profile.profile_id
+        return result
+    return await predict_signal(symbol)
+
+async def compute_predict_signal(symbol: str, log_wrapper):
+    """/predict 与信号推送共用的日线信号计算，返回 (最新日K线时间, 信号结果)。"""
+    loop = asyncio.get_running_loop()
+    async def _work():
+        market_data = await loop.run_in_executor(None, load_predict_data, symbol)
+        if market_data is None:
+             return None, {"signal": "ERROR", "comment": "Insufficient data"}
+        # 最新一根日K线和模型都未变化时直接返回缓存的信号
+        bar_ts = str(market_data.index[-1])
+        version = model_version(symbol)
+        cached = signal_cache.get('predict', symbol, '1d', version, bar_ts)
+        if cached is not None:
+            return bar_ts, cached
+        # 特征生成与预测在计算进程池中执行，不占用事件循环所在进程的 GIL
+        result = await compute_pool.stock_signal(symbol, market_data, log_wrapper)
+        if result["signal"] != "ERROR":
+            signal_cache.put('predict', symbol, '1d', version, bar_ts, result)
+        return bar_ts, result
+    # 同一品种的并发请求只计算一次，其余请求等待同一个结果
+    return await signal_flight.do(('predict', symbol), _work)
+
+async def predict_signal(symbol: str):
     def log_wrapper(msg):
         add_global_log(f"[GET /predict] {msg}")
     log_wrapper(f"Request: {symbol}")
     try:
-        loop = asyncio.get_running_loop()
-        def _work():
-            end_date = datetime.datetime.now().strftime("%Y%m%d")
-            start_date = (datetime.datetime.now() - datetime.timedelta(days=250)).strftime("%Y%m%d")
-            market_data = get_any_stock_data(ticker=symbol, start_date=start_date, end_date=end_date)
-            if market_data is None or market_data.empty or len(market_data) < 50:
-                 return {"signal": "ERROR", "comment": "Insufficient data"}
-            return generate_signal_from_data(symbol, market_data, log_wrapper)
-        result = await loop.run_in_executor(None, _work)
+        with metrics.stage_timer('predict_request', symbol=symbol, timeframe='1d'):
+            _, result = await compute_predict_signal(symbol, log_wrapper)
         if result["signal"] == "ERROR":
             raise HTTPException(status_code=500, detail=result.get("comment", "Unknown Error"))
         return {"signal": result["signal"]}
@@ -347,6 +576,145 @@ async def predict_signal_for_ea(symbol: str):
         log_wrapper(f"Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def signal_room(symbol: str, timeframe: str) -> str:
+    return f"signal:{symbol}:{timeframe}"
+
+async def compute_stream_signal(symbol: str, timeframe: str):
+    """SignalStream 的计算函数：加密货币 (含 '/') 走币安K线，其余按股票日线计算。返回 (K线时间, 信号结果)。"""
+    def log_wrapper(msg):
+        add_global_log(f"[signal stream {symbol} {timeframe}] {msg}")
+    with metrics.stage_timer('stream_signal', symbol=symbol, timeframe=timeframe):
+        if '/' in symbol:
+            # 收盘后几秒触发时最后一根K线是刚开始形成的新K线，信号与 K线时间都以刚收盘的那根为准
+            df = closed_klines(await binance_service.get_klines(symbol, timeframe), timeframe)
+            bar = int(df['timestamp'].iloc[-1]) if not df.empty else None
+            return bar, await binance_service.signal_for_klines(symbol, timeframe, df, log_wrapper)
+        return await compute_predict_signal(symbol, log_wrapper)
+
+# 订阅 (品种, 周期) 后每根K线收盘推送一次信号 (Socket.IO 'signal' 事件)
+signal_stream = SignalStream(compute_stream_signal)
+
+@app.get("/signals/latest")
+async def get_latest_signal(symbol: str, timeframe: str = '1d'):
+    """最近一次推送的信号 (不触发计算)，供无法使用 Socket.IO 的客户端 (如 MT5 EA) 轮询。"""
+    latest = signal_stream.latest.get((symbol, timeframe))
+    if latest is None:
+        raise HTTPException(status_code=404, detail=f"{symbol} {timeframe} 没有订阅中的信号推送")
+    return latest
+
+@app.get("/signals/stream/stats")
+async def get_signal_stream_stats():
+    return signal_stream.stats()
+
+# 单次批量预测最多的股票数量
+MAX_BATCH_SYMBOLS = 500
+
+def _batch_item(symbol: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    if result.get("signal") == "ERROR":
+        return {"symbol": symbol, "error": result.get("comment", "Unknown Error")}
+    item = {"symbol": symbol, "signal": result["signal"]}
+    for key in ("prediction", "comment"):
+        if key in result:
+            item[key] = result[key]
+    return item
+
+async def predict_model_group(symbols: List[str], log_func) -> List[Dict[str, Any]]:
+    """并发加载一组共用模型文件的股票行情，命中信号缓存的直接返回，其余一次批量预测。"""
+    loop = asyncio.get_running_loop()
+    loaded = await asyncio.gather(*[loop.run_in_executor(None, load_predict_data, s) for s in symbols],
+                                  return_exceptions=True)
+    items, to_predict, keys = [], {}, {}
+    for symbol, market_data in zip(symbols, loaded):
+        if isinstance(market_data, Exception):
+            items.append({"symbol": symbol, "error": f"Data load failed: {market_data}"})
+            continue
+        if market_data is None:
+            items.append({"symbol": symbol, "error": "Insufficient data"})
+            continue
+        keys[symbol] = (model_version(symbol), str(market_data.index[-1]))
+        cached = signal_cache.get('predict', symbol, '1d', *keys[symbol])
+        if cached is not None:
+            items.append(_batch_item(symbol, cached))
+        else:
+            to_predict[symbol] = market_data
+    if to_predict:
+        results = await compute_pool.stock_signals_batch(to_predict, log_func)
+        for symbol, result in results.items():
+            if result["signal"] != "ERROR":
+                signal_cache.put('predict', symbol, '1d', *keys[symbol], result)
+            items.append(_batch_item(symbol, result))
+    return items
+
+@app.post("/predict/batch")
+async def predict_batch(request: BatchPredictRequest):
+    """
+    批量预测：按模型文件分组，各组并发加载行情并各做一次向量化预测。
+    默认一次返回全部结果 (单只股票失败不影响其他股票)；stream=True 时每组完成即输出 NDJSON 行。
+    """
+    def log_wrapper(msg):
+        add_global_log(f"[POST /predict/batch] {msg}")
+    symbols = list(dict.fromkeys(s.strip() for s in request.symbols if s.strip()))
+    if not symbols:
+        raise HTTPException(status_code=400, detail="symbols 不能为空")
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"单次最多 {MAX_BATCH_SYMBOLS} 只股票")
+    log_wrapper(f"Request: {len(symbols)} symbols")
+
+    groups: Dict[str, List[str]] = {}
+    for symbol in symbols:
+        groups.setdefault(config.get_model_path(symbol), []).append(symbol)
+
+    async def run_group(group):
+        try:
+            return await predict_model_group(group, log_wrapper)
+        except Exception as e:
+            log_wrapper(f"Error: {e}")
+            return [{"symbol": s, "error": str(e)} for s in group]
+
+    tasks = [asyncio.ensure_future(run_group(group)) for group in groups.values()]
+    if request.stream:
+        async def ndjson():
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    for item in await finished:
+                        yield json.dumps(replace_nan_with_none(item), ensure_ascii=False) + "\n"
+            finally:
+                for task in tasks:
+                    task.cancel()
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    items = [item for group_items in await asyncio.gather(*tasks) for item in group_items]
+    order = {s: i for i, s in enumerate(symbols)}
+    items.sort(key=lambda item: order[item["symbol"]])
+    return replace_nan_with_none({"results": items, "errors": sum(1 for item in items if "error" in item)})
+
+@app.get("/compute_pool/stats")
+async def get_compute_pool_stats():
+    return compute_pool.stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus 文本格式的信号流水线各阶段耗时直方图。"""
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
+@app.get("/profiles")
+def list_profiles():
+    return {"status": "success", "data": profiler.list_profiles()}
+
+@app.get("/profiles/{profile_id}")
+def download_profile(profile_id: str, format: str = 'txt'):
+    """format=txt 为按累计耗时排序的摘要，format=prof 为 pstats 原始数据 (可用 snakeviz 等工具打开)。"""
+    path = profiler.profile_path(profile_id, format)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"未找到分析结果: {profile_id}")
+    if format == 'txt':
+        return PlainTextResponse(open(path, encoding='utf-8').read())
+    return FileResponse(path, media_type='application/octet-stream', filename=os.path.basename(path))
+
+@app.get("/signal_cache/stats")
+async def get_signal_cache_stats():
+    return {**signal_cache.stats(), 'single_flight': signal_flight.stats()}
+
 @app.post("/get_signal")
 async def get_signal_for_ea(request: Request):
     def log_wrapper(msg):
@@ -362,6 +730,10 @@ async def get_signal_for_ea(request: Request):
         raise HTTPException(status_code=422, detail=f"Invalid Body: {e}")
 
     try:
+        mt5 = get_mt5()
+        if mt5 is None:
+            raise HTTPException(status_code=503, detail="MetaTrader5 is not installed")
+        trader = get_trader()
         timeframe_map = {'M1': mt5.TIMEFRAME_M1, 'H1': mt5.TIMEFRAME_H1, 'D1': mt5.TIMEFRAME_D1}
         mt5_timeframe = timeframe_map.get(info.timeframe, mt5.TIMEFRAME_H1)
         rates = mt5.copy_rates_from_pos(info.ticker, mt5_timeframe, 0, 200)
@@ -374,7 +746,7 @@ async def get_signal_for_ea(request: Request):
         rates_df.set_index('date', inplace=True)
         rates_df.rename(columns={'tick_volume': 'volume'}, inplace=True)
 
-        result = generate_signal_from_data(info.ticker, rates_df, log_wrapper)
+        result = await compute_pool.stock_signal(info.ticker, rates_df, log_wrapper)
         if result["signal"] == "ERROR":
             raise HTTPException(status_code=500, detail=result["comment"])
 
@@ -421,6 +793,13 @@ async def get_signal_for_ea(request: Request):
 async def train_model_endpoint(train_request: TrainRequest):
     ticker = train_request.ticker
     try:
+        if trainer_pool.started:
+            # 常驻训练进程已导入依赖并加载因子数据，无需为每次训练启动新解释器
+            outcome = await trainer_pool.train(ticker)
+            if outcome['ok']:
+                return {"status": "success", "message": f"Training completed for {ticker}", "logs": outcome['logs']}
+            raise HTTPException(status_code=500, detail=f"Training failed: {outcome['error']}\n{outcome['logs']}")
+
         python_executable = sys.executable
         script_path = os.path.join(os.path.dirname(__file__), 'model_trainer.py')
         process_env = os.environ.copy()
@@ -436,27 +815,96 @@ async def train_model_endpoint(train_request: TrainRequest):
             return {"status": "success", "message": f"Training completed for {ticker}", "logs": stdout_decoded}
         else:
             raise HTTPException(status_code=500, detail=f"Training failed: {stderr_decoded}")
+    except HTTPException as e: raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/trainer_pool/stats")
+async def get_trainer_pool_stats():
+    return trainer_pool.stats()
+
 @app.get("/get_trade_logs")
 def get_trade_logs():
-    return trader.get_trade_log()
+    return get_trader().get_trade_log()
 
 @app.get("/get_account_info")
 def get_account_info():
-    return trader.get_account_info()
+    return get_trader().get_account_info()
 
 @app.post("/strategy/run")
-def run_strategy_endpoint(config: StrategyConfig):
+async def run_strategy_endpoint(config: StrategyConfig, request: Request, sid: str = None):
+    """
+    提交策略流水线任务并立即返回 job_id；参数相同的任务在排队或运行中时直接返回该任务。
+    进度通过 Socket.IO 的 strategy_progress 事件推送到 job:<job_id> 房间 (传入 sid 时自动加入)，
+    结果通过 GET /strategy/jobs/{job_id} 获取。开启 profiling 时结果中的 profile_id 可用于 GET /profiles/{profile_id}。
+    """
+    params = config.model_dump()
+    if profiler.profiling_requested(request):
+        params['profile'] = True
     try:
-        results = run_strategy_pipeline(config)
-        return {"status": "success", "data": results}
-    except HTTPException as e: raise e
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+        job, deduplicated = strategy_jobs.submit(params)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    if sid:
+        await sio.enter_room(sid, f"job:{job.job_id}")
+    return {"status": job.status, "job_id": job.job_id, "deduplicated": deduplicated}
+
+@app.get("/strategy/jobs")
+def list_strategy_jobs():
+    return {"status": "success", "data": strategy_jobs.list_jobs(), "counts": strategy_jobs.stats()}
+
+@app.get("/strategy/jobs/{job_id}")
+def get_strategy_job(job_id: str):
+    job = strategy_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"未找到任务: {job_id}")
+    data = dict(job.summary(), progress=job.progress)
+    if job.status == 'succeeded':
+        data['result'] = job.result
+    elif job.status == 'failed':
+        data['error_status'] = job.error_status
+    return {"status": "success", "data": data}
+
+@app.get("/strategy/runs")
+def list_strategy_runs():
+    return {"status": "success", "data": backtest_store.list_runs()}
+
+@app.get("/strategy/runs/{run_id}")
+def get_strategy_run(run_id: str):
+    try:
+        if not backtest_store.exists(run_id):
+            raise HTTPException(status_code=404, detail=f"未找到回测结果: {run_id}")
+        return {"status": "success", "data": load_strategy_result(run_id)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/strategy/compare")
+def compare_strategy_runs(request: CompareRequest):
+    try:
+        return {"status": "success", "data": replace_nan_with_none(backtest_store.compare(request.run_ids))}
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"未找到回测结果: {e.args[0]}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/scanner/snapshots")
+async def get_scanner_snapshots():
+    return {"snapshots": list_snapshots()}
+
+@app.get("/scanner/snapshot")
+async def get_scanner_snapshot(date: str = None, min_return: float = None, max_return: float = None,
+                               prefix: str = None, name: str = None, sort_by: str = 'predicted_return',
+                               order: str = 'desc', limit: int = 50, offset: int = 0):
+    """读取全市场扫描快照 (默认最新)，predicted_return 为小数收益率。"""
+    try:
+        meta, snapshot = load_snapshot(date)
+        if meta is None:
+            raise HTTPException(status_code=404, detail="没有可用的全市场扫描快照")
+        total, page = query_snapshot(snapshot, min_return, max_return, prefix, name, sort_by,
+                                     ascending=(order == 'asc'), limit=max(0, min(limit, 5000)), offset=max(0, offset))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"snapshot": meta, "fresh": is_fresh(meta), "total": total, "data": page.to_dict(orient='records')}
 
 @app.post("/execute_trade")
 async def execute_trade(payload: Dict[str, Any]):
@@ -515,7 +963,10 @@ async def connect(sid, environ):
 
 @sio.event
 async def disconnect(sid):
-    pass
+    cancel_event = scan_cancel_events.get(sid)
+    if cancel_event is not None:
+        cancel_event.set()
+    signal_stream.unsubscribe_all(sid)
 
 @sio.on('execute_task')
 async def on_execute_task(sid, data):
@@ -523,9 +974,12 @@ async def on_execute_task(sid, data):
     script_map = {
         'download': 'data_downloader.py',
         'train': 'model_trainer.py',
-        'predict': 'scanner.py'
     }
-    if task_name == 'diagnose':
+    if task_name == 'predict':
+        asyncio.create_task(run_scan(sid, refresh=bool(data.get('refresh'))))
+    elif task_name == 'train' and data.get('ticker') and trainer_pool.started:
+        asyncio.create_task(run_train_task(data['ticker'], sid))
+    elif task_name == 'diagnose':
         stock_code = data.get('stock_code')
         if stock_code:
             asyncio.create_task(run_diagnose_task(stock_code, sid))
@@ -535,6 +989,58 @@ async def on_execute_task(sid, data):
     else:
         await sio.emit('log', {'data': f"Unknown task '{task_name}'"}, to=sid)
 
+@sio.on('watch_job')
+async def on_watch_job(sid, data):
+    """加入任务房间以接收 strategy_progress，并立即推送任务当前状态。"""
+    job = strategy_jobs.get((data or {}).get('job_id', ''))
+    if job is None:
+        await sio.emit('log', {'data': f"未找到任务: {(data or {}).get('job_id')}"}, to=sid)
+        return
+    await sio.enter_room(sid, f"job:{job.job_id}")
+    await sio.emit('strategy_progress', job.progress[-1], to=sid)
+
+@sio.on('subscribe_signal')
+async def on_subscribe_signal(sid, data):
+    """
+    订阅 {symbol, timeframe} 的信号推送：加密货币 (如 BTC/USDT) 默认 5m，股票只支持 1d。
+    之后每根K线收盘推送一次 'signal' 事件；已有推送结果时立即推送一次。
+    """
+    symbol = (data or {}).get('symbol')
+    if not symbol:
+        await sio.emit('log', {'data': "subscribe_signal 需要 symbol"}, to=sid)
+        return
+    timeframe = (data or {}).get('timeframe') or (config.DEFAULT_TIMEFRAME if '/' in symbol else '1d')
+    if '/' not in symbol and timeframe != '1d':
+        await sio.emit('log', {'data': f"股票信号只支持 1d 周期: {symbol} {timeframe}"}, to=sid)
+        return
+    # 先加入房间，保证不会错过订阅后立即开始的第一次计算
+    await sio.enter_room(sid, signal_room(symbol, timeframe))
+    try:
+        latest = signal_stream.subscribe(sid, symbol, timeframe)
+    except ValueError as e:
+        await sio.leave_room(sid, signal_room(symbol, timeframe))
+        await sio.emit('log', {'data': str(e)}, to=sid)
+        return
+    await sio.emit('log', {'data': f"已订阅 {symbol} {timeframe} 信号推送"}, to=sid)
+    if latest is not None:
+        await sio.emit('signal', latest, to=sid)
+
+@sio.on('unsubscribe_signal')
+async def on_unsubscribe_signal(sid, data):
+    symbol = (data or {}).get('symbol')
+    timeframe = (data or {}).get('timeframe') or (config.DEFAULT_TIMEFRAME if '/' in (symbol or '') else '1d')
+    signal_stream.unsubscribe(sid, symbol, timeframe)
+    await sio.leave_room(sid, signal_room(symbol, timeframe))
+
+@sio.on('cancel_task')
+async def on_cancel_task(sid, data):
+    cancel_event = scan_cancel_events.get(sid)
+    if cancel_event is None:
+        await sio.emit('log', {'data': "当前没有正在运行的扫描任务。"}, to=sid)
+        return
+    cancel_event.set()
+    await sio.emit('log', {'data': "正在取消扫描..."}, to=sid)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
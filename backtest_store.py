@@ -0,0 +1,154 @@
+import os
+import json
+import shutil
+import hashlib
+import datetime
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Iterable
+
+from fast_backtester import TRADE_DTYPE
+
+# 回测结果存储目录：每次运行一个子目录，arrays.npz 存列式数组，meta.json 存参数与指标
+BACKTEST_STORE_DIR = 'backtest_results'
+# 存储格式或回测规则变化时递增，使旧结果失效
+STORE_VERSION = 1
+# 参与指纹计算的源码文件 (特征、标签、模型与回测逻辑)
+FINGERPRINT_SOURCES = ('feature_generator.py', 'model_trainer.py', 'backtester.py', 'fast_backtester.py', 'robustness.py')
+ARRAY_COLUMNS = ('open', 'high', 'low', 'close', 'portfolio_value', 'daily_returns', 'predictions')
+# 与运行结果一起保存的模型文件 (命中缓存时恢复到原位置)
+MODEL_FILE = 'model.joblib'
+
+
+def _file_signature(path: str) -> Dict[str, Any]:
+    """文件的大小与修改时间；文件不存在时返回 None。"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _source_digest(paths: Iterable[str]) -> str:
+    digest = hashlib.sha256()
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in paths:
+        path = os.path.join(base_dir, name)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def compute_fingerprint(params: Dict[str, Any], data_paths: Iterable[str] = (), model_paths: Iterable[str] = ()) -> str:
+    """
+    由运行参数 (含数据区间)、数据文件与模型文件的签名、以及特征/回测代码的哈希计算运行指纹。
+    任一数据文件不存在时返回 None (无法判断数据是否变化，不使用缓存)。
+    """
+    data_signatures = {path: _file_signature(path) for path in data_paths}
+    if any(sig is None for sig in data_signatures.values()):
+        return None
+    payload = json.dumps({
+        'version': STORE_VERSION,
+        'params': params,
+        'data': data_signatures,
+        'models': {path: _file_signature(path) for path in model_paths},
+        'source': _source_digest(FINGERPRINT_SOURCES),
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:24]
+
+
+class BacktestStore:
+    """
+    回测结果的列式存储：净值曲线、成交、预测值等数组存为 npz，参数与指标存为 json。
+    以运行指纹为键，相同请求可直接读取而无需重新计算。
+    """
+
+    def __init__(self, root: str = BACKTEST_STORE_DIR):
+        self.root = root
+
+    def _run_dir(self, run_id: str) -> str:
+        if not run_id or not all(c in '0123456789abcdef' for c in run_id):
+            raise ValueError(f"非法的 run_id: {run_id}")
+        return os.path.join(self.root, run_id)
+
+    def exists(self, run_id: str) -> bool:
+        return run_id is not None and os.path.exists(os.path.join(self._run_dir(run_id), 'meta.json'))
+
+    def save(self, run_id: str, dates: pd.DatetimeIndex, arrays: Dict[str, np.ndarray], trades: np.ndarray,
+             meta: Dict[str, Any]) -> str:
+        """保存一次运行。先写临时文件再原子替换，避免并发读到不完整的结果。"""
+        run_dir = self._run_dir(run_id)
+        os.makedirs(run_dir, exist_ok=True)
+        columns = {name: np.asarray(values, dtype=np.float64) for name, values in arrays.items() if values is not None}
+        tmp_npz = os.path.join(run_dir, 'arrays.tmp.npz')
+        np.savez(tmp_npz, dates=np.asarray(dates, dtype='datetime64[ns]').astype(np.int64),
+                 trades=np.asarray(trades, dtype=TRADE_DTYPE), **columns)
+        os.replace(tmp_npz, os.path.join(run_dir, 'arrays.npz'))
+
+        meta = dict(meta, run_id=run_id, created_at=datetime.datetime.now().isoformat(timespec='seconds'))
+        tmp_meta = os.path.join(run_dir, 'meta.json.tmp')
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, default=str)
+        os.replace(tmp_meta, os.path.join(run_dir, 'meta.json'))
+        return run_id
+
+    def save_model_file(self, run_id: str, model_path: str):
+        """保存本次运行训练出的模型文件 (需在 save 之前调用，save 写入 meta.json 后运行才可见)。"""
+        run_dir = self._run_dir(run_id)
+        os.makedirs(run_dir, exist_ok=True)
+        tmp_path = os.path.join(run_dir, MODEL_FILE + '.tmp')
+        shutil.copyfile(model_path, tmp_path)
+        os.replace(tmp_path, os.path.join(run_dir, MODEL_FILE))
+
+    def has_model_file(self, run_id: str) -> bool:
+        return run_id is not None and os.path.exists(os.path.join(self._run_dir(run_id), MODEL_FILE))
+
+    def restore_model_file(self, run_id: str, model_path: str):
+        """把运行保存的模型文件复制回 model_path (原子替换)。"""
+        tmp_path = model_path + '.tmp'
+        shutil.copyfile(os.path.join(self._run_dir(run_id), MODEL_FILE), tmp_path)
+        os.replace(tmp_path, model_path)
+
+    def load_meta(self, run_id: str) -> Dict[str, Any]:
+        with open(os.path.join(self._run_dir(run_id), 'meta.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def load_arrays(self, run_id: str, columns: Iterable[str] = None) -> Dict[str, Any]:
+        """读取数组；columns 指定只读取部分列 (npz 按列延迟加载)。"""
+        with np.load(os.path.join(self._run_dir(run_id), 'arrays.npz')) as npz:
+            names = [name for name in (columns or npz.files) if name in npz.files]
+            arrays = {name: npz[name] for name in names}
+        if 'dates' in arrays:
+            arrays['dates'] = pd.to_datetime(arrays['dates'])
+        return arrays
+
+    def list_runs(self) -> List[Dict[str, Any]]:
+        """列出所有已保存运行的摘要，按创建时间倒序。"""
+        if not os.path.isdir(self.root):
+            return []
+        runs = []
+        for run_id in os.listdir(self.root):
+            try:
+                meta = self.load_meta(run_id)
+            except (OSError, ValueError):
+                continue
+            runs.append({key: meta.get(key) for key in ('run_id', 'created_at', 'params', 'metrics')})
+        return sorted(runs, key=lambda r: r['created_at'] or '', reverse=True)
+
+    def compare(self, run_ids: List[str]) -> Dict[str, Any]:
+        """并排读取多次运行的参数、指标和净值曲线 (不重新计算)。"""
+        runs = []
+        for run_id in run_ids:
+            if not self.exists(run_id):
+                raise KeyError(run_id)
+            meta = self.load_meta(run_id)
+            arrays = self.load_arrays(run_id, ['dates', 'portfolio_value'])
+            runs.append({
+                'run_id': run_id,
+                'params': meta.get('params'),
+                'metrics': meta.get('metrics'),
+                'equity_curve': [[d, float(v)] for d, v in zip(arrays['dates'].strftime('%Y-%m-%d'),
+                                                               arrays['portfolio_value'])],
+            })
+        return {'runs': runs}
@@ -2,6 +2,7 @@ import pandas as pd
 import numpy as np
 import joblib
 from typing import List, Dict, Any
+from fast_backtester import simulate_signals, performance_metrics_from_arrays
 
 class Backtester:
     def __init__(self, data: pd.DataFrame, model_path: str, features: List[str], initial_capital: float = 100000.0):
@@ -107,34 +108,57 @@ class Backtester:
         self.portfolio_value = []
         self.trades = []
         self.daily_returns = []
+        self.trade_array = None # 快速引擎的结构化成交记录 (TRADE_DTYPE)
+        self.predictions = None # 最近一次回测的逐K线预测收益率 (两种引擎都会记录，供结果存储复用)
 
         print(f"回测器初始化完成，初始资金: {self.initial_capital}")
 
     def _calculate_portfolio_value(self, current_price: float) -> float:
         return self.capital + self.shares * current_price
 
-    def run_backtest(self, transaction_cost_rate: float = 0.0003, slippage_rate: float = 0.0001):
+    def predict_returns(self) -> np.ndarray:
+        """
+        对整个回测区间一次性批量预测。特征含 NaN 的行不参与预测，结果为 NaN。
+        """
+        feature_frame = self.data[self.features]
+        valid_mask = feature_frame.notna().all(axis=1).to_numpy()
+        predictions = np.full(len(self.data), np.nan)
+        if valid_mask.any():
+            predictions[valid_mask] = self.model.predict(feature_frame[valid_mask])
+        return predictions
+
+    @staticmethod
+    def predictions_to_signals(predictions: np.ndarray, buy_threshold: float = 0.01, sell_threshold: float = -0.01) -> np.ndarray:
+        """
+        将预测收益率映射为交易信号: 1 买入, -1 卖出, 0 持有 (NaN 视为持有)。支持任意形状的数组。
+        """
+        predictions = np.asarray(predictions, dtype=np.float64)
+        signals = np.zeros(predictions.shape, dtype=np.int8)
+        signals[predictions > buy_threshold] = 1
+        signals[predictions < sell_threshold] = -1
+        return signals
+
+    def run_backtest(self, transaction_cost_rate: float = 0.0003, slippage_rate: float = 0.0001, engine: str = 'loop'):
         """
         运行回测。
+        engine='loop' 为逐 bar 的事件驱动回测 (记录 dict 成交日志并打印信号)；
+        engine='fast' 使用 fast_backtester 的数组引擎，规则与结果一致，成交记录保存在 self.trade_array。
         """
+        if engine == 'fast':
+            return self._run_backtest_fast(transaction_cost_rate, slippage_rate)
+        if engine != 'loop':
+            raise ValueError(f"未知的回测引擎: {engine}")
+
         print("开始运行回测...")
-        for i in range(len(self.data)):
-            current_date = self.data.index[i]
-            current_row = self.data.iloc[i]
-            current_price = current_row['close']
+        self.predictions = self.predict_returns()
+        signals = self.predictions_to_signals(self.predictions)
+        dates = self.data.index
+        close_prices = self.data['close'].to_numpy()
 
-            if not all(pd.notna(current_row[f]) for f in self.features):
-                signal = 0
-            else:
-                X_current = pd.DataFrame([current_row[self.features]])
-                predicted_return = self.model.predict(X_current)[0]
-                
-                if predicted_return > 0.01: # Buy signal if predicted return is above threshold
-                    signal = 1
-                elif predicted_return < -0.01: # Sell signal if predicted return is below threshold
-                    signal = -1
-                else:
-                    signal = 0
+        for i in range(len(self.data)):
+            current_date = dates[i]
+            current_price = close_prices[i]
+            signal = signals[i]
 
             if signal != 0:
                 print(f"Date: {current_date.date()}, Signal: {signal}, Price: {current_price}")
@@ -199,10 +223,26 @@ class Backtester:
 
         print("回测运行结束。")
 
+    def _run_backtest_fast(self, transaction_cost_rate: float, slippage_rate: float):
+        self.predictions = self.predict_returns()
+        signals = self.predictions_to_signals(self.predictions)
+        result = simulate_signals(self.data['close'].to_numpy(), signals, self.initial_capital,
+                                  transaction_cost_rate, slippage_rate)
+        self.capital = result['capital']
+        self.shares = result['shares']
+        self.portfolio_value = result['portfolio_value']
+        self.daily_returns = result['daily_returns']
+        self.trade_array = result['trades']
+        print(f"快速回测运行结束，共 {len(self.data)} 根K线，{len(self.trade_array)} 笔成交。")
+
     def get_performance_metrics(self) -> Dict[str, Any]:
         """
         计算并返回回测的性能指标。
         """
+        if self.trade_array is not None:
+            return performance_metrics_from_arrays(self.portfolio_value, self.daily_returns, self.trade_array,
+                                                   self.initial_capital, self.capital, len(self.data))
+
         if not self.portfolio_value:
             return {"Error": "回测尚未运行，无法计算性能指标。"}
 
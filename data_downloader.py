@@ -1,12 +1,9 @@
-import baostock as bs
 import pandas as pd
 import os
 from tqdm import tqdm
 import sys
 import time
-import yfinance as yf
-import akshare as ak
-import ccxt # <-- 新增：导入 ccxt 用于加密货币
+# baostock / yfinance / akshare / ccxt 导入很慢，只在对应的下载函数中导入
 from datetime import datetime # <-- 新增：导入 datetime
 
 # --- 全局设置 ---
@@ -19,6 +16,7 @@ def download_crypto_data(ticker: str, start_date: str, end_date: str):
     使用 ccxt 从币安 (Binance) 下载加密货币的历史日线数据。
     ticker 格式应为 'BTC/USDT', 'ETH/USDT' 等。
     """
+    import ccxt
     print(f"开始为加密货币 {ticker} 下载数据 (源: Binance)...")
     
     # 格式化文件名，例如 BTC/USDT -> btc_usdt
@@ -92,6 +90,7 @@ def download_us_stock_data(ticker: str, start_date: str, end_date: str, max_retr
     下载单个美股/ETF的历史日线数据，优先使用 yfinance，失败后自动尝试 akshare。
     增加了重试机制。
     """
+    import yfinance as yf
     filename = f"us_{ticker.lower()}_daily.csv"
     filepath = os.path.join(DATA_CACHE_DIR, filename)
 
@@ -124,6 +123,7 @@ def download_us_stock_data(ticker: str, start_date: str, end_date: str, max_retr
                 print("yfinance 达到最大重试次数，将尝试备用数据源。")
 
     # --- 尝试方法二：akshare (备用) ---
+    import akshare as ak
     for attempt in range(max_retries):
         try:
             print(f"开始为股票/ETF {ticker} 下载数据 (备用: akshare, 尝试次数: {attempt + 1}/{max_retries})...")
@@ -162,6 +162,7 @@ def download_futures_data(ticker: str, start_date: str, end_date: str):
     """
     使用 akshare 下载单个国际商品期货的历史日线数据并保存到本地。
     """
+    import akshare as ak
     print(f"开始为商品期货 {ticker} 下载数据 (使用 akshare)...")
     
     filename = f"us_{ticker.lower()}_daily.csv"
@@ -191,6 +192,7 @@ def download_single_a_stock_data(ticker: str, start_date: str, end_date: str):
     """
     使用 baostock 下载单个A股的历史日线数据并保存到本地。
     """
+    import baostock as bs
     print(f"开始为A股股票 {ticker} 下载数据...")
     lg = bs.login()
     if lg.error_code != '0':
@@ -222,6 +224,7 @@ def download_single_a_stock_data(ticker: str, start_date: str, end_date: str):
         bs.logout()
 
 def download_all_stock_data(start_date: str = '2020-01-01', end_date: str = '2023-12-31'):
+    import baostock as bs
     lg = bs.login()
     if lg.error_code != '0': return
     stock_rs = bs.query_all_stock(day=end_date)
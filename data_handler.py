@@ -4,6 +4,7 @@ import re
 import time
 import os
 from data_downloader import download_single_a_stock_data, download_us_stock_data, download_crypto_data # 导入下载函数
+from services.metrics import timed
 
 # 定义缓存目录
 CACHE_DIR = 'stock_data_cache'
@@ -24,6 +25,7 @@ def _preprocess_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     print("DataFrame 预处理完成，数据类型已强制转换为数值型。")
     return df
 
+@timed('load_stock_data', symbol_arg='ticker')
 def get_stock_data(ticker: str, start_date: str, end_date: str) -> pd.DataFrame:
     """
     获取指定A股股票在给定日期范围内的历史日线数据。
@@ -55,6 +57,7 @@ def get_stock_data(ticker: str, start_date: str, end_date: str) -> pd.DataFrame:
         print(f"警告: data_downloader 未能成功下载A股 {ticker} 的数据。")
         return pd.DataFrame()
 
+@timed('load_us_stock_data', symbol_arg='ticker')
 def get_us_stock_data(ticker: str, start_date: str, end_date: str) -> pd.DataFrame:
     """
     获取指定美股股票在给定日期范围内的历史日线数据。
@@ -87,6 +90,7 @@ def get_us_stock_data(ticker: str, start_date: str, end_date: str) -> pd.DataFra
         return pd.DataFrame()
 
 # --- 新增：获取加密货币数据函数 ---
+@timed('load_crypto_data', symbol_arg='ticker')
 def get_crypto_data(ticker: str, start_date: str, end_date: str) -> pd.DataFrame:
     """
     获取指定加密货币在给定日期范围内的历史日线数据。
@@ -137,6 +141,18 @@ def get_any_stock_data(ticker: str, start_date: str, end_date: str) -> pd.DataFr
         print(f"检测到非A股代码 (按美股处理): {ticker_upper}")
         return get_us_stock_data(ticker_upper, start_date, end_date)
 
+def get_cache_path(ticker: str) -> str:
+    """
+    返回 get_any_stock_data 对该代码使用的本地缓存文件路径 (判断逻辑与 get_any_stock_data 一致)。
+    """
+    ticker_upper = ticker.upper()
+    if '/' in ticker_upper or (len(ticker_upper) > 5 and not (ticker_upper.startswith('SH.') or ticker_upper.startswith('SZ.'))):
+        return os.path.join(CACHE_DIR, f"crypto_{ticker_upper.replace('/', '_').lower()}_daily.csv")
+    elif '.' in ticker_upper:
+        return os.path.join(CACHE_DIR, f"{ticker_upper.replace('.', '_')}_daily.csv")
+    else:
+        return os.path.join(CACHE_DIR, f"us_{ticker_upper}_daily.csv")
+
 def get_fundamental_data(ticker: str) -> pd.DataFrame:
     """
     获取指定A股股票的主要财务指标历史数据。
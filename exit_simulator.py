@@ -0,0 +1,215 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Any
+
+# 平仓原因编码 (检查顺序与 Trader._check_positions_for_exit / jjquant check_exit_signal 一致)
+EXIT_OPEN = 0         # 数据结束时仍未平仓
+EXIT_STOP_LOSS = 1    # 固定止损
+EXIT_TAKE_PROFIT = 2  # 固定止盈
+EXIT_TRAILING = 3     # 移动止损
+EXIT_BOLLINGER = 4    # 收盘价跌破布林中轨
+EXIT_SIGNAL = 5       # 外部平仓信号 (如模型预测低于阈值)
+EXIT_REASONS = {
+    EXIT_OPEN: 'open',
+    EXIT_STOP_LOSS: 'stop_loss',
+    EXIT_TAKE_PROFIT: 'take_profit',
+    EXIT_TRAILING: 'trailing_stop',
+    EXIT_BOLLINGER: 'bollinger_mid',
+    EXIT_SIGNAL: 'signal',
+}
+
+EXIT_TRADE_DTYPE = np.dtype([
+    ('entry_index', np.int64),
+    ('exit_index', np.int64),
+    ('entry_price', np.float64),
+    ('exit_price', np.float64),
+    ('peak_price', np.float64),
+    ('return', np.float64),
+    ('reason', np.int8),
+])
+
+# 首次搜索窗口长度 (K线数)，未命中时加倍
+INITIAL_SEARCH_WINDOW = 256
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """基于累计和的滚动均值，前 window-1 个值为 NaN (与 feature_generator 中 BBL_20_2.0 的计算一致)。"""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        csum = np.cumsum(np.concatenate(([0.0], values)))
+        out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+
+def _find_exit(close, signal_exit, bb_break, start, entry_price, stop_level, take_level, trailing_factor):
+    """
+    从 start 开始查找第一根触发平仓的K线。按窗口向量化：窗口内用 np.maximum.accumulate 得到持仓期最高价，
+    用 argmax 找第一个命中位置；未命中则把最高价带入下一个 (加倍的) 窗口继续搜索。
+    返回 (exit_index, reason, peak_price)，未平仓时 exit_index 为 -1。
+    """
+    n_bars = len(close)
+    peak = entry_price
+    window = INITIAL_SEARCH_WINDOW
+    while start < n_bars:
+        end = min(start + window, n_bars)
+        segment = close[start:end]
+        running_peak = np.maximum.accumulate(np.maximum(segment, peak))
+        stop_hit = segment <= stop_level
+        take_hit = segment >= take_level
+        trailing_hit = segment <= running_peak * trailing_factor
+        bb_hit = bb_break[start:end]
+        signal_hit = signal_exit[start:end]
+        hit = stop_hit | take_hit | trailing_hit | bb_hit | signal_hit
+        if hit.any():
+            k = int(hit.argmax())
+            if stop_hit[k]:
+                reason = EXIT_STOP_LOSS
+            elif take_hit[k]:
+                reason = EXIT_TAKE_PROFIT
+            elif trailing_hit[k]:
+                reason = EXIT_TRAILING
+            elif bb_hit[k]:
+                reason = EXIT_BOLLINGER
+            else:
+                reason = EXIT_SIGNAL
+            return start + k, reason, float(running_peak[k])
+        peak = float(running_peak[-1])
+        start = end
+        window *= 2
+    return -1, EXIT_OPEN, peak
+
+
+def simulate_exits(close: np.ndarray, entries: np.ndarray, exit_signals: np.ndarray = None,
+                   stop_loss_pct: float = -0.08, take_profit_pct: float = 0.16, trailing_stop_pct: float = -0.12,
+                   bb_window: int = 20, bb_mid: np.ndarray = None) -> np.ndarray:
+    """
+    在K线数组上模拟实盘的平仓规则。
+
+    - entries: 布尔数组，空仓时在该K线收盘价开仓；持仓期间的开仓信号被忽略 (交易互不重叠)。
+    - exit_signals: 可选布尔数组，持仓期间为 True 时平仓 (如模型预测 < exit_threshold)。
+    - 规则按 固定止损 -> 固定止盈 -> 移动止损 -> 跌破布林中轨 -> 外部信号 的顺序判断，全部基于收盘价；
+      移动止损的最高价从开仓价开始计算。止损类参数为 None 表示不启用。
+    - bb_mid: 布林中轨数组；为 None 时用 bb_window 日收盘价均值计算，bb_window 也为 None 则不启用该规则。
+
+    返回 EXIT_TRADE_DTYPE 结构化数组；最后一笔若未平仓，exit_index 为最后一根K线，reason 为 EXIT_OPEN。
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    n_bars = len(close)
+    entries = np.asarray(entries, dtype=bool)
+    signal_exit = np.zeros(n_bars, dtype=bool) if exit_signals is None else np.asarray(exit_signals, dtype=bool)
+    if bb_mid is None and bb_window:
+        bb_mid = rolling_mean(close, bb_window)
+    bb_break = np.zeros(n_bars, dtype=bool) if bb_mid is None else (close < np.nan_to_num(bb_mid, nan=-np.inf))
+
+    stop_factor = 1 + stop_loss_pct if stop_loss_pct is not None else 0.0
+    take_factor = 1 + take_profit_pct if take_profit_pct is not None else np.inf
+    trailing_factor = 1 + trailing_stop_pct if trailing_stop_pct is not None else 0.0
+
+    entry_idx = np.flatnonzero(entries)
+    trades = []
+    pos = 0
+    while pos < len(entry_idx):
+        i = int(entry_idx[pos])
+        entry_price = close[i]
+        exit_i, reason, peak = _find_exit(close, signal_exit, bb_break, i + 1, entry_price,
+                                          entry_price * stop_factor, entry_price * take_factor, trailing_factor)
+        if exit_i < 0:
+            exit_i = n_bars - 1
+        trades.append((i, exit_i, entry_price, close[exit_i], peak, close[exit_i] / entry_price - 1, reason))
+        if reason == EXIT_OPEN:
+            break
+        # 平仓当根K线不再开仓
+        pos = int(np.searchsorted(entry_idx, exit_i, side='right'))
+
+    return np.array(trades, dtype=EXIT_TRADE_DTYPE)
+
+
+def exit_trades_to_returns(close: np.ndarray, trades: np.ndarray, position_fraction: float = 1.0,
+                           transaction_cost_rate: float = 0.0003, slippage_rate: float = 0.0001) -> np.ndarray:
+    """
+    把交易列表转换为每根K线的组合收益率：持仓区间 (entry, exit] 按 position_fraction 承担价格涨跌，
+    开仓和平仓K线各扣除一次手续费与滑点。
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n_bars = len(close)
+    in_position = np.zeros(n_bars + 1, dtype=np.int64)
+    np.add.at(in_position, trades['entry_index'] + 1, 1)
+    np.add.at(in_position, trades['exit_index'] + 1, -1)
+    held = np.cumsum(in_position[:n_bars]) > 0
+
+    bar_returns = np.zeros(n_bars, dtype=np.float64)
+    bar_returns[1:] = np.where(held[1:], close[1:] / close[:-1] - 1, 0.0) * position_fraction
+    cost = (transaction_cost_rate + slippage_rate) * position_fraction
+    np.subtract.at(bar_returns, trades['entry_index'], cost)
+    closed = trades[trades['reason'] != EXIT_OPEN]
+    np.subtract.at(bar_returns, closed['exit_index'], cost)
+    return bar_returns
+
+
+def summarize_exits(trades: np.ndarray, bar_returns: np.ndarray = None, periods_per_year: float = 252) -> Dict[str, Any]:
+    """按平仓原因统计交易数和平均收益，并给出组合层面的总收益、夏普比率和最大回撤。"""
+    closed = trades[trades['reason'] != EXIT_OPEN]
+    summary = {
+        'Number of Trades': len(closed),
+        'Win Rate': f"{(closed['return'] > 0).mean():.2%}" if len(closed) else "0.00%",
+        'Average Trade Return': f"{closed['return'].mean():.2%}" if len(closed) else "0.00%",
+        'Average Holding Bars': float((closed['exit_index'] - closed['entry_index']).mean()) if len(closed) else 0.0,
+        'Exit Reasons': {
+            EXIT_REASONS[code]: {
+                'count': int((trades['reason'] == code).sum()),
+                'average_return': float(trades['return'][trades['reason'] == code].mean())
+                if (trades['reason'] == code).any() else None,
+            }
+            for code in EXIT_REASONS
+        },
+    }
+    if bar_returns is not None and len(bar_returns) > 1:
+        equity = np.cumprod(1 + bar_returns)
+        peak = np.maximum.accumulate(np.maximum(equity, 1.0))
+        std = bar_returns.std(ddof=1)
+        summary['Total Return'] = f"{equity[-1] - 1:.2%}"
+        summary['Sharpe Ratio'] = f"{bar_returns.mean() / std * np.sqrt(periods_per_year) if std else 0:.2f}"
+        summary['Max Drawdown'] = f"{((equity - peak) / peak).min():.2%}"
+    return summary
+
+
+def simulate_exits_frame(df: pd.DataFrame, entries, exit_signals=None, periods_per_year: float = 252,
+                         **kwargs) -> Dict[str, Any]:
+    """
+    对带 close 列的 DataFrame 运行平仓规则模拟，返回交易明细 (DataFrame) 与统计摘要。
+    若 df 中已有 BBL_20_2.0 (feature_generator 中作为布林中轨使用的列) 且未显式传入 bb_mid，则直接使用。
+    """
+    close = df['close'].to_numpy(dtype=np.float64)
+    if 'bb_mid' not in kwargs and 'BBL_20_2.0' in df.columns:
+        kwargs['bb_mid'] = df['BBL_20_2.0'].to_numpy(dtype=np.float64)
+    trades = simulate_exits(close, np.asarray(entries), exit_signals, **kwargs)
+    bar_returns = exit_trades_to_returns(close, trades)
+    trades_df = pd.DataFrame({
+        'entry_time': df.index[trades['entry_index']],
+        'exit_time': df.index[trades['exit_index']],
+        'entry_price': trades['entry_price'],
+        'exit_price': trades['exit_price'],
+        'peak_price': trades['peak_price'],
+        'return': trades['return'],
+        'reason': [EXIT_REASONS[int(code)] for code in trades['reason']],
+    })
+    return {'trades': trades_df, 'summary': summarize_exits(trades, bar_returns, periods_per_year)}
+
+
+if __name__ == '__main__':
+    import time
+
+    # 合成数据演示: 5 年 5 分钟加密货币K线 (约 52.6 万根)
+    rng = np.random.default_rng(0)
+    n_bars = 5 * 365 * 24 * 12
+    demo_close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.002, n_bars)))
+    demo_entries = rng.random(n_bars) < 0.002
+
+    start = time.perf_counter()
+    demo_trades = simulate_exits(demo_close, demo_entries, bb_window=20 * 288)
+    demo_returns = exit_trades_to_returns(demo_close, demo_trades, position_fraction=0.2)
+    elapsed = time.perf_counter() - start
+    print(f"{n_bars} 根K线, {len(demo_trades)} 笔交易, 耗时 {elapsed:.3f}s")
+    for key, value in summarize_exits(demo_trades, demo_returns, periods_per_year=365 * 288).items():
+        print(f"{key}: {value}")
@@ -0,0 +1,180 @@
+"""
+基于数组的快速回测引擎 (与 Backtester.run_backtest 规则一致)。
+持仓状态机用 numba 编译 (requirements.txt 中的 numba)；numba 未安装或编译失败时
+退回同一函数的纯 Python 版本，结果相同，只是逐信号循环较慢。
+"""
+import numpy as np
+from typing import Dict, Any
+
+# 成交记录的结构化数组格式
+# type: 1 = BUY, -1 = SELL；amount 对买入为总成本，对卖出为净收入；profit_loss 仅卖出有效 (买入为 NaN)
+TRADE_DTYPE = np.dtype([
+    ('index', np.int64),
+    ('type', np.int8),
+    ('price', np.float64),
+    ('shares', np.int64),
+    ('amount', np.float64),
+    ('profit_loss', np.float64),
+])
+
+
+def _simulate_events(event_idx, event_signal, close, initial_capital, transaction_cost_rate, slippage_rate,
+                     buy_fraction, sell_fraction, capital_out, shares_out, trades):
+    """
+    只在有信号的 bar 上推进持仓状态机，规则与 Backtester.run_backtest 完全一致：
+    买入使用当前资金的 buy_fraction，卖出当前持股的 sell_fraction，按成交额计手续费和滑点。
+    capital_out / shares_out 记录每个信号 bar 之后的状态，trades 为预分配的成交记录数组。
+    返回成交笔数。
+    """
+    capital = initial_capital
+    shares = 0
+    average_cost_basis = 0.0
+    n_trades = 0
+    for k in range(len(event_idx)):
+        i = event_idx[k]
+        price = close[i]
+        if event_signal[k] == 1:
+            if capital > 0:
+                buy_amount = capital * buy_fraction
+                num_shares = int(buy_amount / price)
+                if num_shares > 0:
+                    cost = num_shares * price
+                    transaction_cost = cost * transaction_cost_rate
+                    slippage_cost = cost * slippage_rate
+                    total_cost = cost + transaction_cost + slippage_cost
+                    if capital >= total_cost:
+                        new_total_value = average_cost_basis * shares + total_cost
+                        capital -= total_cost
+                        shares += num_shares
+                        average_cost_basis = new_total_value / shares if shares > 0 else 0.0
+                        trades[n_trades]['index'] = i
+                        trades[n_trades]['type'] = 1
+                        trades[n_trades]['price'] = price
+                        trades[n_trades]['shares'] = num_shares
+                        trades[n_trades]['amount'] = total_cost
+                        trades[n_trades]['profit_loss'] = np.nan
+                        n_trades += 1
+        elif event_signal[k] == -1:
+            if shares > 0:
+                num_shares = int(shares * sell_fraction)
+                if num_shares > 0:
+                    revenue = num_shares * price
+                    transaction_cost = revenue * transaction_cost_rate
+                    slippage_cost = revenue * slippage_rate
+                    total_revenue = revenue - transaction_cost - slippage_cost
+                    profit_loss = total_revenue - average_cost_basis * num_shares
+                    capital += total_revenue
+                    shares -= num_shares
+                    if shares == 0:
+                        average_cost_basis = 0.0
+                    trades[n_trades]['index'] = i
+                    trades[n_trades]['type'] = -1
+                    trades[n_trades]['price'] = price
+                    trades[n_trades]['shares'] = num_shares
+                    trades[n_trades]['amount'] = total_revenue
+                    trades[n_trades]['profit_loss'] = profit_loss
+                    n_trades += 1
+        capital_out[k] = capital
+        shares_out[k] = shares
+    return n_trades
+
+
+_simulate_events_impl = None
+
+def _get_simulate_events():
+    """第一次回测时才导入 numba 并编译状态机 (导入 numba 较慢，只用到 TRADE_DTYPE 的模块不需要它)。"""
+    global _simulate_events_impl
+    if _simulate_events_impl is None:
+        try:
+            from numba import njit
+            _simulate_events_impl = njit(cache=True)(_simulate_events)
+        except Exception:
+            _simulate_events_impl = _simulate_events
+    return _simulate_events_impl
+
+
+def simulate_signals(close: np.ndarray, signals: np.ndarray, initial_capital: float = 100000.0,
+                     transaction_cost_rate: float = 0.0003, slippage_rate: float = 0.0001,
+                     buy_fraction: float = 0.2, sell_fraction: float = 0.5) -> Dict[str, Any]:
+    """
+    基于 NumPy 数组的快速回测引擎。
+    signals 为每个 bar 的信号 (1 买入, -1 卖出, 0 持有)。状态机只在信号 bar 上执行，
+    其余 bar 的资金/持股通过前向填充得到，组合净值与日收益率全部向量化计算。
+
+    返回字典: portfolio_value, daily_returns, trades (TRADE_DTYPE 结构化数组), capital, shares。
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    signals = np.asarray(signals)
+    n_bars = len(close)
+
+    event_idx = np.flatnonzero(signals).astype(np.int64)
+    event_signal = signals[event_idx].astype(np.int8)
+    capital_out = np.empty(len(event_idx), dtype=np.float64)
+    shares_out = np.empty(len(event_idx), dtype=np.int64)
+    trades = np.empty(len(event_idx), dtype=TRADE_DTYPE)
+
+    n_trades = _get_simulate_events()(event_idx, event_signal, close, float(initial_capital), float(transaction_cost_rate),
+                                float(slippage_rate), float(buy_fraction), float(sell_fraction),
+                                capital_out, shares_out, trades)
+    trades = trades[:n_trades]
+
+    # 把信号 bar 上的状态前向填充到所有 bar (第一个信号之前保持初始状态)
+    if len(event_idx):
+        state_pos = np.searchsorted(event_idx, np.arange(n_bars), side='right') - 1
+        safe_pos = np.maximum(state_pos, 0)
+        capital = np.where(state_pos >= 0, capital_out[safe_pos], float(initial_capital))
+        shares = np.where(state_pos >= 0, shares_out[safe_pos], 0)
+    else:
+        capital = np.full(n_bars, float(initial_capital))
+        shares = np.zeros(n_bars, dtype=np.int64)
+
+    portfolio_value = capital + shares * close
+    daily_returns = np.zeros(n_bars, dtype=np.float64)
+    if n_bars > 1:
+        prev = portfolio_value[:-1]
+        nonzero = prev != 0
+        daily_returns[1:][nonzero] = (portfolio_value[1:][nonzero] - prev[nonzero]) / prev[nonzero]
+
+    return {
+        'portfolio_value': portfolio_value,
+        'daily_returns': daily_returns,
+        'trades': trades,
+        'capital': float(capital_out[-1]) if len(event_idx) else float(initial_capital),
+        'shares': int(shares_out[-1]) if len(event_idx) else 0,
+    }
+
+
+def performance_metrics_from_arrays(portfolio_value: np.ndarray, daily_returns: np.ndarray, trades: np.ndarray,
+                                    initial_capital: float, final_capital: float, num_trading_days: int = None) -> Dict[str, Any]:
+    """
+    由数组计算与 Backtester.get_performance_metrics 相同的性能指标 (不打印成交明细)。
+    """
+    if len(portfolio_value) == 0:
+        return {"Error": "回测尚未运行，无法计算性能指标。"}
+    if num_trading_days is None:
+        num_trading_days = len(portfolio_value)
+
+    final_value = float(portfolio_value[-1])
+    total_return = (final_value - initial_capital) / initial_capital
+    annualized_return = (1 + total_return)**(252 / num_trading_days) - 1 if num_trading_days > 0 else 0
+
+    std = daily_returns.std(ddof=1) if len(daily_returns) > 1 else 0
+    sharpe_ratio = daily_returns.mean() / std * np.sqrt(252) if len(daily_returns) > 1 and std != 0 else 0
+
+    peak = np.maximum.accumulate(portfolio_value)
+    max_drawdown = ((portfolio_value - peak) / peak).min()
+
+    sell_pnl = trades['profit_loss'][trades['type'] == -1]
+    win_rate = (sell_pnl > 0).sum() / len(sell_pnl) if len(sell_pnl) > 0 else 0
+
+    return {
+        "Initial Capital": initial_capital,
+        "Final Capital": final_capital,
+        "Final Portfolio Value": final_value,
+        "Total Return": f"{total_return:.2%}",
+        "Annualized Return": f"{annualized_return:.2%}",
+        "Sharpe Ratio": f"{sharpe_ratio:.2f}",
+        "Max Drawdown": f"{max_drawdown:.2%}",
+        "Number of Trades": len(trades),
+        "Win Rate": f"{win_rate:.2%}"
+    }
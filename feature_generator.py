@@ -1,12 +1,13 @@
 import pandas as pd
 import numpy as np
 import os
+import threading
 try:
     import pandas_ta as ta
 except Exception:
     ta = None
 
-# --- 全局加载因子数据 ---
+# --- 宏观/情绪因子数据 (第一次生成特征时加载) ---
 DATA_CACHE_DIR = 'stock_data_cache'
 FACTOR_FILES = {
     'gspc': os.path.join(DATA_CACHE_DIR, 'factor_gspc_daily.csv'),
@@ -16,24 +17,39 @@ FACTOR_FILES = {
     'news_sentiment': os.path.join(DATA_CACHE_DIR, 'factor_news_sentiment_daily.csv'),
 }
 factor_data = {}
+_factor_data_loaded = False
+_factor_data_lock = threading.Lock()
 
 def _load_factor_data():
-    """在首次导入时加载所有因子数据到全局变量中"""
+    """
+    加载所有因子数据到全局变量中。
+    先在局部字典中读完全部文件再替换 factor_data 并设置已加载标记，
+    其他线程不会看到只加载了一部分的字典 (已发布的字典之后不再修改)。
+    """
+    global factor_data, _factor_data_loaded
     print("正在加载宏观/情绪因子数据...")
+    loaded = {}
     for name, path in FACTOR_FILES.items():
         if os.path.exists(path):
             try:
                 df = pd.read_csv(path, skiprows=[1])
                 df['date'] = pd.to_datetime(df['date']) # 转换为datetime对象以便合并
-                factor_data[name] = df
+                loaded[name] = df
                 print(f"成功加载因子: {name}")
             except Exception as e:
                 print(f"加载因子 {name} 失败: {e}")
         else:
             print(f"因子文件不存在: {path}")
+    factor_data = loaded
+    _factor_data_loaded = True
 
-# 在模块加载时执行一次
-_load_factor_data()
+def ensure_factor_data():
+    """返回因子数据，首次调用时才读取因子文件 (导入本模块不做任何文件 IO)。"""
+    if not _factor_data_loaded:
+        with _factor_data_lock:
+            if not _factor_data_loaded:
+                _load_factor_data()
+    return factor_data
 
 def generate_fibonacci_features(df: pd.DataFrame, lookback: int = 15):
     """
@@ -286,7 +302,7 @@ def generate_features(df: pd.DataFrame):
         print("正在合并宏观/情绪因子...")
         df['merge_date'] = df['date'].dt.normalize()
         
-        for name, factor_df in factor_data.items():
+        for name, factor_df in ensure_factor_data().items():
             temp_factor_df = factor_df.copy()
             
             source_col = 'close'
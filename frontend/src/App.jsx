@@ -1,5 +1,4 @@
 import React, { useState, useEffect, useRef } from 'react';
-import axios from 'axios';
 import { Routes, Route, Link, Outlet, BrowserRouter, useNavigate } from 'react-router-dom';
 import io from 'socket.io-client'; // 导入 socket.io-client
 import Controls from './components/Controls';
@@ -12,6 +11,7 @@ import Login from './components/Login'; // 导入 Login 组件
 import ProtectedRoute from './components/ProtectedRoute'; // 导入 ProtectedRoute 组件
 import MT5Trader from './components/MT5Trader'; // 导入 MT5Trader 组件
 import './App.css'; // 确保 App.css 存在或创建它
+import { runStrategyJob } from './strategyJobs';
 
 function Layout({ onLogout }) {
   const navigate = useNavigate();
@@ -40,12 +40,23 @@ function Layout({ onLogout }) {
   );
 }
 
+const STAGE_LABELS = {
+  queued: '排队中',
+  running: '启动中',
+  data: '准备数据',
+  features: '生成特征',
+  train: '训练模型',
+  backtest: '回测',
+  predict: '预测',
+};
+
 function BacktestPlatform() {
   const [currentTicker, setCurrentTicker] = useState('');
   const [currentStockName, setCurrentStockName] = useState('');
   const [results, setResults] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
+  const [stage, setStage] = useState('');
 
   const handleRunStrategy = async (config, stockName) => {
     setLoading(true);
@@ -53,13 +64,9 @@ function BacktestPlatform() {
     setResults(null);
     setCurrentTicker(config.ticker);
     setCurrentStockName(stockName);
+    setStage('queued');
     try {
-      const response = await axios.post('http://localhost:8000/strategy/run', config);
-      if (response.data.status === 'success') {
-        setResults(response.data.data);
-      } else {
-        setError(response.data.message || '未知错误');
-      }
+      setResults(await runStrategyJob(config, setStage));
     } catch (err) {
       console.error('Error running strategy:', err);
       setError(err.response?.data?.detail || err.message || '运行策略时发生网络错误');
@@ -72,7 +79,7 @@ function BacktestPlatform() {
     <div className="App backtest-container">
       <h1>量化交易智能体回测平台</h1>
       <Controls onRunStrategy={handleRunStrategy} />
-      {loading && <div className="loading">正在构建股票代码 {currentTicker}，股票名称：{currentStockName} 的量化模型....</div>}
+      {loading && <div className="loading">正在构建股票代码 {currentTicker}，股票名称：{currentStockName} 的量化模型 ({STAGE_LABELS[stage] || stage})....</div>}
       {error && <div className="error">错误: {error}</div>}
       <div className="results-container">
         {results && (
@@ -11,6 +11,8 @@ const ControlPanel = () => {
   const [logs, setLogs] = useState([]);
   const [results, setResults] = useState([]);
   const [isTaskRunning, setIsTaskRunning] = useState(false);
+  const [runningTask, setRunningTask] = useState(null);
+  const [scanProgress, setScanProgress] = useState(null); // { done, total, failed }
   const [tickerToTrain, setTickerToTrain] = useState(''); // 新增 state 用于存储待训练的 ticker
   const logsEndRef = useRef(null);
 
@@ -41,10 +43,15 @@ const ControlPanel = () => {
       setResults(message.data);
     });
 
+    newSocket.on('scan_progress', (message) => {
+      setScanProgress(message);
+    });
+
     newSocket.on('task_done', (message) => {
       console.log('收到 task_done 消息:', message.script);
       setLogs(prev => [...prev, `--- 任务 ${message.script} 完成 ---`]);
       setIsTaskRunning(false);
+      setRunningTask(null);
     });
 
     return () => {
@@ -57,11 +64,20 @@ const ControlPanel = () => {
     if (socket && !isTaskRunning) {
       setLogs([`请求执行任务: ${taskName}...`]);
       setResults([]);
+      setScanProgress(null);
       setIsTaskRunning(true);
+      setRunningTask(taskName);
       socket.emit('execute_task', { task: taskName });
     }
   };
 
+  // 取消正在运行的全市场扫描 (已推送的部分结果保留)
+  const handleCancelTask = () => {
+    if (socket && runningTask === 'predict') {
+      socket.emit('cancel_task', { task: 'predict' });
+    }
+  };
+
   // 新增：处理为指定 ticker 训练模型的请求
   const handleTrainTicker = async () => {
     if (!tickerToTrain) {
@@ -99,7 +115,7 @@ const ControlPanel = () => {
   const tasks = [
     { name: 'download', title: '下载最新数据', description: '运行 data_downloader.py，从网络获取最新的股票日线数据并保存到本地。' },
     { name: 'train', title: '训练全局模型', description: '运行 model_trainer.py，使用所有本地数据训练一个通用的股票预测模型。' },
-    { name: 'predict', title: 'AI agent选股', description: '运行 scanner.py，加载模型并对所有股票进行分析，选出预期收益最高的股票。' },
+    { name: 'predict', title: 'AI agent选股', description: '加载模型并流式扫描所有股票，边扫描边更新预期收益最高的股票，可随时取消。' },
   ];
 
   return (
@@ -118,6 +134,14 @@ const ControlPanel = () => {
             >
               {isTaskRunning ? '任务执行中...' : '开始执行'}
             </button>
+            {task.name === 'predict' && runningTask === 'predict' && (
+              <>
+                {scanProgress && (
+                  <p>已扫描 {scanProgress.done} / {scanProgress.total} 只（失败 {scanProgress.failed} 只）</p>
+                )}
+                <button onClick={handleCancelTask}>取消扫描</button>
+              </>
+            )}
           </div>
         ))}
 
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import './MT5Trader.css';
+import { runStrategyJob } from '../strategyJobs';
 
 const MT5Trader = () => {
     const [ticker, setTicker] = useState('NVDA');
@@ -26,12 +27,8 @@ const MT5Trader = () => {
         };
 
         try {
-            const response = await axios.post('http://localhost:8000/strategy/run', config);
-            if (response.data.status === 'success') {
-                setSuccessMessage(`为 ${ticker.toUpperCase()} 训练模型成功！模型文件已保存。`);
-            } else {
-                setError(response.data.message || '发生未知错误');
-            }
+            await runStrategyJob(config);
+            setSuccessMessage(`为 ${ticker.toUpperCase()} 训练模型成功！模型文件已保存。`);
         } catch (err) {
             console.error('Error training model:', err);
             setError(err.response?.data?.detail || err.message || '运行策略时发生网络错误');
@@ -0,0 +1,17 @@
+import axios from 'axios';
+
+const API_URL = 'http://localhost:8000';
+
+// 提交策略任务并轮询直到完成；onStage 接收当前阶段 (queued / data / features / train / backtest / predict)
+export async function runStrategyJob(config, onStage) {
+  const submit = await axios.post(`${API_URL}/strategy/run`, config);
+  const jobId = submit.data.job_id;
+  for (;;) {
+    const response = await axios.get(`${API_URL}/strategy/jobs/${jobId}`);
+    const job = response.data.data;
+    if (onStage) onStage(job.stage);
+    if (job.status === 'succeeded') return job.result;
+    if (job.status === 'failed') throw new Error(job.error || '策略任务失败');
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+  }
+}
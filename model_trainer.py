@@ -2,7 +2,7 @@
 import pandas as pd
 import numpy as np
 # from sklearn.ensemble import RandomForestRegressor # 注释掉 RandomForestRegressor
-import lightgbm as lgb # 确保 LightGBM 已导入
+# lightgbm 在训练函数内导入：命令行参数错误、只导入 create_target_labels 时不加载它
 import joblib
 import os
 from tqdm import tqdm
@@ -12,6 +12,19 @@ import argparse # 导入 argparse 用于接收命令行参数
 # --- 全局设置 ---
 # 数据缓存目录
 DATA_CACHE_DIR = 'stock_data_cache'
+# 多周期训练的默认预测周期 (交易日)
+DEFAULT_HORIZONS = (5, 10, 20)
+# 与 train_single_stock_model 中 LGBMRegressor 相同的 lgb.train 参数
+LGB_TRAIN_PARAMS = {
+    'objective': 'regression',
+    'learning_rate': 0.05,
+    'num_leaves': 31,
+    'max_depth': -1,
+    'seed': 42,
+    'num_threads': 0,
+    'verbose': -1,
+}
+LGB_NUM_BOOST_ROUND = 200
 
 # --- 1. 数据加载模块 (重构后) ---
 
@@ -69,10 +82,86 @@ def create_target_labels(df: pd.DataFrame, future_days: int = 5) -> pd.DataFrame
     df[f'future_{future_days}d_return'] = df['close'].shift(-future_days) / df['close'] - 1
     return df
 
+def create_multi_horizon_labels(df: pd.DataFrame, horizons=DEFAULT_HORIZONS) -> pd.DataFrame:
+    """
+    一次性生成多个预测周期的标签矩阵。
+    对每个周期 N 生成 future_{N}d_return (与 create_target_labels 同名)、
+    future_{N}d_max_drawdown (持有N日期间的最大回撤) 和 future_{N}d_volatility (未来N日对数收益率的标准差)。
+    所有周期共用一次移位堆叠 (n_rows x max_horizon 的价格路径矩阵)，窗口不完整的行为 NaN。
+    """
+    if df.empty or 'close' not in df.columns:
+        return pd.DataFrame()
+
+    horizons = sorted({int(h) for h in horizons})
+    if not horizons or horizons[0] < 1:
+        raise ValueError(f"预测周期必须为正整数: {horizons}")
+
+    close = df['close'].to_numpy(dtype=float)
+    n_rows, max_horizon = len(close), horizons[-1]
+
+    # path[t, k-1] = close[t+k] / close[t]
+    padded = np.concatenate([close, np.full(max_horizon, np.nan)])
+    path = padded[np.arange(n_rows)[:, None] + np.arange(1, max_horizon + 1)] / close[:, None]
+    path_with_entry = np.concatenate([np.ones((n_rows, 1)), path], axis=1)
+
+    # NaN 会沿累积方向传播，因此窗口不完整的周期自动得到 NaN
+    peak = np.maximum.accumulate(path_with_entry, axis=1)[:, 1:]
+    max_drawdown = np.minimum.accumulate(path / peak - 1, axis=1)
+
+    log_returns = np.log(path_with_entry[:, 1:] / path_with_entry[:, :-1])
+    cum_sum = np.cumsum(log_returns, axis=1)
+    cum_sq = np.cumsum(log_returns ** 2, axis=1)
+
+    labels = {}
+    for h in horizons:
+        labels[f'future_{h}d_return'] = path[:, h - 1] - 1
+        labels[f'future_{h}d_max_drawdown'] = max_drawdown[:, h - 1]
+        if h > 1:
+            variance = (cum_sq[:, h - 1] - cum_sum[:, h - 1] ** 2 / h) / (h - 1)
+            labels[f'future_{h}d_volatility'] = np.sqrt(np.clip(variance, 0, None))
+        else:
+            labels[f'future_{h}d_volatility'] = np.full(n_rows, np.nan)
+
+    label_df = pd.DataFrame(labels, index=df.index)
+    df = df.drop(columns=[c for c in label_df.columns if c in df.columns])
+    return pd.concat([df, label_df], axis=1)
+
+def train_multi_horizon_models(labeled_df: pd.DataFrame, features: list, horizons=DEFAULT_HORIZONS,
+                               params: dict = None, num_boost_round: int = LGB_NUM_BOOST_ROUND) -> dict:
+    """
+    为每个预测周期训练一个 LightGBM 模型，返回 {horizon: lgb.Booster}。
+    特征只分箱构造一次 (共享同一个 lgb.Dataset)，每个周期仅替换标签，因此新增周期的额外成本只有建树本身。
+    共享的 Dataset 只包含所有周期标签都有效的行 (即去掉最长周期末尾缺少未来数据的行)，
+    每个周期的模型与在这些行上训练的 LGBMRegressor 相同；较短周期因此少用序列末尾 max(horizons) - h 行。
+    """
+    import lightgbm as lgb
+    horizons = sorted({int(h) for h in horizons})
+    train_params = dict(LGB_TRAIN_PARAMS, **(params or {}))
+    target_cols = [f'future_{h}d_return' for h in horizons]
+    train_df = labeled_df[features + target_cols].dropna()
+    if train_df.empty:
+        raise ValueError("移除NaN特征和标签后没有可用于训练的数据。")
+
+    dataset = lgb.Dataset(train_df[features], free_raw_data=False, params={'verbose': -1})
+    dataset.construct()
+
+    models = {}
+    print(f"多周期共享样本数: {len(train_df)}")
+    for h, target in zip(horizons, target_cols):
+        dataset.set_label(train_df[target].to_numpy(dtype=float))
+        print(f"正在训练 {h} 日周期模型...")
+        models[h] = lgb.train(train_params, dataset, num_boost_round=num_boost_round)
+    return models
+
 # --- 4. 主训练流程 (修改为针对单个股票) ---
 
-def train_single_stock_model(ticker: str):
-    """为单个股票训练并保存模型"""
+def train_single_stock_model(ticker: str, horizons=None, primary_horizon: int = 5):
+    """
+    为单个股票训练并保存模型。
+    传入 horizons 时为每个周期各训练一个模型 (见 train_multi_horizon_models)，
+    primary_horizon 对应的模型作为 payload['model'] 供信号服务使用。
+    """
+    import lightgbm as lgb
     
     # 步骤1：获取指定股票的数据文件
     stock_file = get_stock_file(ticker)
@@ -94,6 +183,11 @@ def train_single_stock_model(ticker: str):
     
     print(f"为 {ticker} 生成特征...")
     features_df, features = generate_features(daily_df) # 接收返回的特征列表
+
+    if horizons:
+        _train_and_save_multi_horizon(ticker, features_df, features, horizons, primary_horizon)
+        return
+
     labeled_df = create_target_labels(features_df)
 
     # 步骤3：数据清洗
@@ -157,13 +251,47 @@ def train_single_stock_model(ticker: str):
     joblib.dump(model_payload, model_path)
     print("模型和特征列表保存成功！")
 
+def _train_and_save_multi_horizon(ticker: str, features_df: pd.DataFrame, features: list, horizons, primary_horizon: int):
+    """多周期训练流程：一次生成标签矩阵，共享 Dataset 训练，并保存所有周期的模型。"""
+    horizons = sorted({int(h) for h in horizons})
+    print(f"为 {ticker} 生成多周期标签: {horizons}")
+    labeled_df = create_multi_horizon_labels(features_df, horizons)
+    if labeled_df.empty:
+        print(f"数据处理后为空，无法为 {ticker} 训练模型。")
+        return
+
+    models = train_multi_horizon_models(labeled_df, features, horizons)
+    if not models:
+        print("没有任何周期训练成功。")
+        return
+    if primary_horizon not in models:
+        primary_horizon = min(models)
+
+    feature_importance = pd.DataFrame({'feature': features, 'importance': models[primary_horizon].feature_importance()}).sort_values('importance', ascending=False)
+    print(f"\n{primary_horizon} 日周期模型特征重要性:")
+    print(feature_importance)
+
+    safe_ticker = ticker.replace('/', '_').upper()
+    model_path = f'./{safe_ticker}_model.joblib'
+    print(f"训练完成，正在将 {len(models)} 个周期的模型保存至 {model_path} ...")
+    model_payload = {
+        'model': models[primary_horizon],
+        'features': features,
+        'horizon': primary_horizon,
+        'horizon_models': models,
+    }
+    joblib.dump(model_payload, model_path)
+    print("模型和特征列表保存成功！")
+
 
 if __name__ == '__main__':
     # --- 使用 argparse 解析命令行参数 ---
     parser = argparse.ArgumentParser(description='为指定的股票代码训练模型。')
     parser.add_argument('ticker', type=str, help='要训练的股票代码 (例如: USDCHF, AMD, 600519)。')
+    parser.add_argument('--horizons', type=int, nargs='+', default=None,
+                        help='一次训练多个预测周期 (例如: --horizons 5 10 20)，默认只训练5日模型。')
     args = parser.parse_args()
 
     print(f"--- 开始为 {args.ticker} 执行模型训练脚本 ---")
-    train_single_stock_model(args.ticker)
+    train_single_stock_model(args.ticker, horizons=args.horizons)
     print(f"--- {args.ticker} 的模型训练脚本执行完毕 ---")
\ No newline at end of file
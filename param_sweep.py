@@ -0,0 +1,198 @@
+import itertools
+import concurrent.futures
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable
+
+# 参数网格的列及默认值 (与 Backtester 当前的硬编码规则一致)；止损类参数为 NaN 表示不启用
+PARAM_DEFAULTS = {
+    'buy_threshold': 0.01,
+    'sell_threshold': -0.01,
+    'buy_fraction': 0.2,
+    'sell_fraction': 0.5,
+    'stop_loss_pct': np.nan,
+    'take_profit_pct': np.nan,
+    'trailing_stop_pct': np.nan,
+}
+
+
+def build_grid(**param_values: Iterable) -> pd.DataFrame:
+    """
+    构造参数网格 (笛卡尔积)。未指定的参数取 PARAM_DEFAULTS 中的默认值。
+    例: build_grid(buy_threshold=[0.005, 0.01, 0.02], stop_loss_pct=[np.nan, -0.08])
+    """
+    unknown = set(param_values) - set(PARAM_DEFAULTS)
+    if unknown:
+        raise ValueError(f"未知的参数: {sorted(unknown)}")
+    axes = {name: list(param_values.get(name, [default])) for name, default in PARAM_DEFAULTS.items()}
+    return pd.DataFrame(list(itertools.product(*axes.values())), columns=list(axes.keys()))
+
+
+def _sweep_kernel(close: np.ndarray, predictions: np.ndarray, grid: Dict[str, np.ndarray], initial_capital: float,
+                  transaction_cost_rate: float, slippage_rate: float) -> Dict[str, np.ndarray]:
+    """
+    在参数轴上向量化的回测：状态变量都是长度为 P (配置数) 的数组，逐 bar 同时推进所有配置。
+    规则与 Backtester 一致，另外支持按平均成本计算的固定止损/止盈和按持仓期最高价计算的移动止损
+    (触发时全部平仓，且当根K线不再开仓)。
+    """
+    n_configs = len(grid['buy_threshold'])
+    buy_threshold = grid['buy_threshold']
+    sell_threshold = grid['sell_threshold']
+    buy_fraction = grid['buy_fraction']
+    sell_fraction = grid['sell_fraction']
+    stop_loss = np.where(np.isnan(grid['stop_loss_pct']), -np.inf, grid['stop_loss_pct'])
+    take_profit = np.where(np.isnan(grid['take_profit_pct']), np.inf, grid['take_profit_pct'])
+    trailing_stop = np.where(np.isnan(grid['trailing_stop_pct']), -np.inf, grid['trailing_stop_pct'])
+
+    capital = np.full(n_configs, float(initial_capital))
+    shares = np.zeros(n_configs, dtype=np.int64)
+    avg_cost = np.zeros(n_configs)
+    peak_price = np.zeros(n_configs)
+    n_trades = np.zeros(n_configs, dtype=np.int64)
+    n_sells = np.zeros(n_configs, dtype=np.int64)
+    n_wins = np.zeros(n_configs, dtype=np.int64)
+
+    # 组合净值的在线统计: Welford 均值/方差 与 最大回撤
+    prev_value = np.full(n_configs, float(initial_capital))
+    equity_peak = np.full(n_configs, float(initial_capital))
+    max_drawdown = np.zeros(n_configs)
+    ret_mean = np.zeros(n_configs)
+    ret_m2 = np.zeros(n_configs)
+
+    for t in range(len(close)):
+        price = close[t]
+        prediction = predictions[t]
+        holding = shares > 0
+
+        # --- 1. 规则平仓 (止损/止盈/移动止损) ---
+        peak_price = np.where(holding, np.maximum(peak_price, price), 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            position_return = np.where(holding, price / avg_cost - 1, 0.0)
+            drawdown_from_peak = np.where(holding, price / peak_price - 1, 0.0)
+        rule_exit = holding & ((position_return <= stop_loss) | (position_return >= take_profit)
+                               | (drawdown_from_peak <= trailing_stop))
+
+        # --- 2. 模型信号 ---
+        if np.isnan(prediction):
+            buy_signal = np.zeros(n_configs, dtype=bool)
+            sell_signal = buy_signal
+        else:
+            buy_signal = prediction > buy_threshold
+            sell_signal = prediction < sell_threshold
+
+        sell_qty = np.where(rule_exit, shares,
+                            np.where(sell_signal & holding, (shares * sell_fraction).astype(np.int64), 0))
+        selling = sell_qty > 0
+        if selling.any():
+            revenue = sell_qty * price
+            net_revenue = revenue - revenue * transaction_cost_rate - revenue * slippage_rate
+            profit_loss = net_revenue - avg_cost * sell_qty
+            capital = np.where(selling, capital + net_revenue, capital)
+            shares = shares - sell_qty
+            avg_cost = np.where(shares == 0, 0.0, avg_cost)
+            n_trades += selling
+            n_sells += selling
+            n_wins += selling & (profit_loss > 0)
+
+        buying = buy_signal & ~rule_exit & (capital > 0)
+        if buying.any():
+            buy_qty = np.where(buying, (capital * buy_fraction / price).astype(np.int64), 0)
+            cost = buy_qty * price
+            total_cost = cost + cost * transaction_cost_rate + cost * slippage_rate
+            buying &= (buy_qty > 0) & (capital >= total_cost)
+            new_shares = shares + np.where(buying, buy_qty, 0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                avg_cost = np.where(buying, (avg_cost * shares + total_cost) / new_shares, avg_cost)
+            peak_price = np.where(buying & (shares == 0), price, peak_price)
+            capital = np.where(buying, capital - total_cost, capital)
+            shares = new_shares
+            n_trades += buying
+
+        value = capital + shares * price
+        with np.errstate(divide='ignore', invalid='ignore'):
+            daily_ret = np.where(prev_value != 0, (value - prev_value) / prev_value, 0.0) if t > 0 else np.zeros(n_configs)
+        delta = daily_ret - ret_mean
+        ret_mean += delta / (t + 1)
+        ret_m2 += delta * (daily_ret - ret_mean)
+        equity_peak = np.maximum(equity_peak, value) if t > 0 else value.copy()
+        max_drawdown = np.minimum(max_drawdown, (value - equity_peak) / equity_peak)
+        prev_value = value
+
+    n_bars = len(close)
+    std = np.sqrt(ret_m2 / (n_bars - 1)) if n_bars > 1 else np.zeros(n_configs)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(std > 0, ret_mean / std * np.sqrt(252), 0.0)
+    total_return = (prev_value - initial_capital) / initial_capital
+    return {
+        'final_value': prev_value,
+        'total_return': total_return,
+        'annualized_return': (1 + total_return) ** (252 / max(n_bars, 1)) - 1,
+        'sharpe_ratio': sharpe,
+        'max_drawdown': max_drawdown,
+        'win_rate': np.where(n_sells > 0, n_wins / np.maximum(n_sells, 1), 0.0),
+        'num_trades': n_trades,
+    }
+
+
+def _run_chunk(args):
+    close, predictions, chunk, initial_capital, transaction_cost_rate, slippage_rate = args
+    grid = {name: chunk[name].to_numpy(dtype=np.float64) for name in PARAM_DEFAULTS}
+    return pd.DataFrame(_sweep_kernel(close, predictions, grid, initial_capital, transaction_cost_rate, slippage_rate),
+                        index=chunk.index)
+
+
+def sweep(close: np.ndarray, predictions: np.ndarray, grid: pd.DataFrame, initial_capital: float = 100000.0,
+          transaction_cost_rate: float = 0.0003, slippage_rate: float = 0.0001, n_jobs: int = 1,
+          sort_by: str = 'sharpe_ratio') -> pd.DataFrame:
+    """
+    对一组已计算好的模型预测值，评估参数网格中的所有配置，返回按 sort_by 降序排列的结果表。
+    每个进程内部在参数轴上向量化；n_jobs > 1 时把网格切块后分发到多个进程。
+    """
+    close = np.asarray(close, dtype=np.float64)
+    predictions = np.asarray(predictions, dtype=np.float64)
+    if len(close) != len(predictions):
+        raise ValueError("close 与 predictions 长度不一致。")
+    grid = grid.reset_index(drop=True)
+    for name, default in PARAM_DEFAULTS.items():
+        if name not in grid.columns:
+            grid[name] = default
+
+    if n_jobs > 1 and len(grid) > n_jobs:
+        chunks = np.array_split(np.arange(len(grid)), n_jobs)
+        tasks = [(close, predictions, grid.iloc[idx], initial_capital, transaction_cost_rate, slippage_rate) for idx in chunks]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            metrics = pd.concat(list(executor.map(_run_chunk, tasks)))
+    else:
+        metrics = _run_chunk((close, predictions, grid, initial_capital, transaction_cost_rate, slippage_rate))
+
+    result = pd.concat([grid, metrics], axis=1)
+    return result.sort_values(sort_by, ascending=False).reset_index(drop=True)
+
+
+def sweep_backtester(backtester, grid: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    """对 Backtester 的回测区间只预测一次，然后评估整个参数网格。"""
+    predictions = backtester.predict_returns()
+    return sweep(backtester.data['close'].to_numpy(), predictions, grid, initial_capital=backtester.initial_capital, **kwargs)
+
+
+if __name__ == '__main__':
+    import time
+
+    rng = np.random.default_rng(0)
+    n_bars = 252
+    demo_close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n_bars)))
+    demo_predictions = np.roll(demo_close, -5) / demo_close - 1 + rng.normal(0, 0.02, n_bars)
+
+    demo_grid = build_grid(
+        buy_threshold=[0.0, 0.005, 0.01, 0.02, 0.03],
+        sell_threshold=[0.0, -0.005, -0.01, -0.02],
+        buy_fraction=[0.1, 0.2, 0.5],
+        sell_fraction=[0.5, 1.0],
+        stop_loss_pct=[np.nan, -0.05, -0.08],
+        take_profit_pct=[np.nan, 0.16],
+        trailing_stop_pct=[np.nan, -0.12],
+    )
+    start = time.perf_counter()
+    table = sweep(demo_close, demo_predictions, demo_grid)
+    print(f"{len(demo_grid)} 个参数配置, 耗时 {time.perf_counter() - start:.3f}s")
+    print(table.head(10).to_string())
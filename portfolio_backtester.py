@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Any
+
+from fast_backtester import TRADE_DTYPE, performance_metrics_from_arrays
+
+# 组合回测的成交记录: 在单标的成交格式上增加标的列下标 asset
+PORTFOLIO_TRADE_DTYPE = np.dtype(TRADE_DTYPE.descr + [('asset', np.int32)])
+
+
+def load_frames(tickers: List[str], start_date: str, end_date: str) -> Dict[str, pd.DataFrame]:
+    """
+    通过 data_handler 从本地缓存 (缺失时下载) 加载多个标的的日线数据，并截取 [start_date, end_date]。
+    日期格式为 YYYYMMDD。
+    """
+    from data_handler import get_any_stock_data
+
+    start, end = pd.to_datetime(start_date), pd.to_datetime(end_date)
+    frames = {}
+    for ticker in tickers:
+        df = get_any_stock_data(ticker=ticker, start_date=start_date, end_date=end_date)
+        if df is None or df.empty:
+            print(f"警告: 未能获取 {ticker} 的数据，已从组合中剔除。")
+            continue
+        frames[ticker] = df[(df.index >= start) & (df.index <= end)]
+    return frames
+
+
+def align_frames(frames: Dict[str, pd.DataFrame], column: str = 'close') -> pd.DataFrame:
+    """
+    将多个标的的某一列对齐到共同的交易日历 (所有标的日期的并集)，返回 日期 x 标的 的面板。
+    某标的在某日无数据 (未上市/停牌) 时为 NaN。
+    """
+    series = {ticker: pd.to_numeric(df[column], errors='coerce') for ticker, df in frames.items() if column in df.columns}
+    if not series:
+        return pd.DataFrame()
+    panel = pd.concat(series, axis=1).sort_index()
+    return panel[~panel.index.duplicated(keep='last')]
+
+
+class PortfolioBacktester:
+    """
+    多标的组合回测器：所有标的共用一个现金账户，每根K线对全部标的做向量化处理。
+
+    规则 (与 jjquant 策略一致)：
+    - 先处理卖出信号：卖出持仓的 sell_fraction (默认全部平仓)。
+    - 再处理买入信号：每个标的目标买入 净值 * capital_per_trade，且单标的持仓市值不超过 净值 * max_position_pct。
+      现金不足时按比例缩减所有买单。
+    - 按成交额计手续费和滑点；停牌/无数据的标的不可交易，估值沿用最近收盘价。
+    """
+
+    def __init__(self, close: pd.DataFrame, signals: pd.DataFrame, initial_capital: float = 1000000.0,
+                 capital_per_trade: float = 0.2, max_position_pct: float = 0.2, sell_fraction: float = 1.0,
+                 lot_size: int = 1):
+        if close.empty:
+            raise ValueError("回测数据不能为空。")
+        signals = signals.reindex(index=close.index, columns=close.columns)
+
+        self.calendar = close.index
+        self.tickers = list(close.columns)
+        raw_close = close.to_numpy(dtype=np.float64)
+        self.tradable = ~np.isnan(raw_close)
+        # 估值价格: 前向填充，上市前为 0 (此时不可能持仓)
+        self.close = np.nan_to_num(close.ffill().to_numpy(dtype=np.float64), nan=0.0)
+        self.signals = np.nan_to_num(signals.to_numpy(dtype=np.float64)).astype(np.int8)
+
+        self.initial_capital = initial_capital
+        self.capital_per_trade = capital_per_trade
+        self.max_position_pct = max_position_pct
+        self.sell_fraction = sell_fraction
+        self.lot_size = lot_size
+
+        self.cash = None
+        self.positions = None
+        self.portfolio_value = None
+        self.daily_returns = None
+        self.trade_array = None
+
+    def run_backtest(self, transaction_cost_rate: float = 0.0003, slippage_rate: float = 0.0001):
+        """运行组合回测。"""
+        n_bars, n_assets = self.close.shape
+        lot = self.lot_size
+        cost_factor = 1 + transaction_cost_rate + slippage_rate
+
+        cash = float(self.initial_capital)
+        shares = np.zeros(n_assets, dtype=np.int64)
+        avg_cost = np.zeros(n_assets, dtype=np.float64)
+        cash_curve = np.empty(n_bars, dtype=np.float64)
+        positions = np.empty((n_bars, n_assets), dtype=np.int64)
+        portfolio_value = np.empty(n_bars, dtype=np.float64)
+        trade_chunks = []
+
+        for t in range(n_bars):
+            price = self.close[t]
+            signal = self.signals[t]
+            tradable = self.tradable[t]
+
+            # --- 1. 卖出 ---
+            sell_mask = (signal == -1) & tradable & (shares > 0)
+            if sell_mask.any():
+                idx = np.flatnonzero(sell_mask)
+                qty = np.floor(shares[idx] * self.sell_fraction / lot).astype(np.int64) * lot
+                qty = np.where(self.sell_fraction >= 1.0, shares[idx], qty)
+                idx, qty = idx[qty > 0], qty[qty > 0]
+                if len(idx):
+                    revenue = qty * price[idx]
+                    net_revenue = revenue - revenue * transaction_cost_rate - revenue * slippage_rate
+                    profit_loss = net_revenue - avg_cost[idx] * qty
+                    cash += net_revenue.sum()
+                    shares[idx] -= qty
+                    avg_cost[idx] = np.where(shares[idx] == 0, 0.0, avg_cost[idx])
+                    trade_chunks.append(self._trade_records(t, idx, -1, price[idx], qty, net_revenue, profit_loss))
+
+            # --- 2. 买入 ---
+            buy_mask = (signal == 1) & tradable & (price > 0)
+            if buy_mask.any() and cash > 0:
+                nav = cash + (shares * price).sum()
+                idx = np.flatnonzero(buy_mask)
+                headroom = nav * self.max_position_pct - shares[idx] * price[idx]
+                budget = np.clip(np.minimum(nav * self.capital_per_trade, headroom), 0.0, None)
+                qty = np.floor(budget / (price[idx] * cost_factor) / lot).astype(np.int64) * lot
+                total_cost = qty * price[idx] * cost_factor
+                if total_cost.sum() > cash:
+                    scale = cash / total_cost.sum()
+                    qty = np.floor(qty * scale / lot).astype(np.int64) * lot
+                    total_cost = qty * price[idx] * cost_factor
+                idx, qty, total_cost = idx[qty > 0], qty[qty > 0], total_cost[qty > 0]
+                if len(idx):
+                    cash -= total_cost.sum()
+                    new_shares = shares[idx] + qty
+                    avg_cost[idx] = (avg_cost[idx] * shares[idx] + total_cost) / new_shares
+                    shares[idx] = new_shares
+                    trade_chunks.append(self._trade_records(t, idx, 1, price[idx], qty, total_cost,
+                                                            np.full(len(idx), np.nan)))
+
+            cash_curve[t] = cash
+            positions[t] = shares
+            portfolio_value[t] = cash + (shares * price).sum()
+
+        daily_returns = np.zeros(n_bars, dtype=np.float64)
+        if n_bars > 1:
+            prev = portfolio_value[:-1]
+            nonzero = prev != 0
+            daily_returns[1:][nonzero] = (portfolio_value[1:][nonzero] - prev[nonzero]) / prev[nonzero]
+
+        self.cash = cash_curve
+        self.positions = positions
+        self.portfolio_value = portfolio_value
+        self.daily_returns = daily_returns
+        self.trade_array = np.concatenate(trade_chunks) if trade_chunks else np.empty(0, dtype=PORTFOLIO_TRADE_DTYPE)
+        print(f"组合回测运行结束: {len(self.tickers)} 个标的, {n_bars} 根K线, {len(self.trade_array)} 笔成交。")
+
+    @staticmethod
+    def _trade_records(t, idx, trade_type, price, qty, amount, profit_loss) -> np.ndarray:
+        records = np.empty(len(idx), dtype=PORTFOLIO_TRADE_DTYPE)
+        records['index'] = t
+        records['type'] = trade_type
+        records['price'] = price
+        records['shares'] = qty
+        records['amount'] = amount
+        records['profit_loss'] = profit_loss
+        records['asset'] = idx
+        return records
+
+    def get_performance_metrics(self) -> Dict[str, Any]:
+        """计算组合层面的性能指标 (与 Backtester.get_performance_metrics 字段一致)。"""
+        if self.portfolio_value is None:
+            return {"Error": "回测尚未运行，无法计算性能指标。"}
+        return performance_metrics_from_arrays(self.portfolio_value, self.daily_returns, self.trade_array,
+                                               self.initial_capital, float(self.cash[-1]), len(self.calendar))
+
+    def trades_frame(self) -> pd.DataFrame:
+        """把成交记录转换为便于查看的 DataFrame。"""
+        trades = self.trade_array
+        return pd.DataFrame({
+            'date': self.calendar[trades['index']],
+            'ticker': np.asarray(self.tickers, dtype=object)[trades['asset']],
+            'type': np.where(trades['type'] == 1, 'BUY', 'SELL'),
+            'price': trades['price'],
+            'shares': trades['shares'],
+            'amount': trades['amount'],
+            'profit_loss': trades['profit_loss'],
+        })
+
+    def holdings_frame(self) -> pd.DataFrame:
+        """每日各标的持股数量。"""
+        return pd.DataFrame(self.positions, index=self.calendar, columns=self.tickers)
+
+
+if __name__ == '__main__':
+    import time
+
+    # 合成数据演示: 300 个标的, 10 年日线, 随机信号
+    rng = np.random.default_rng(0)
+    n_days, n_assets = 2520, 300
+    calendar = pd.bdate_range('2014-01-01', periods=n_days)
+    tickers = [f'T{i:03d}' for i in range(n_assets)]
+    prices = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_days, n_assets)), axis=0))
+    prices[rng.random((n_days, n_assets)) < 0.01] = np.nan # 模拟停牌
+    close_panel = pd.DataFrame(prices, index=calendar, columns=tickers)
+    signal_panel = pd.DataFrame(rng.choice([-1, 0, 1], size=(n_days, n_assets), p=[0.02, 0.96, 0.02]),
+                                index=calendar, columns=tickers)
+
+    start = time.perf_counter()
+    bt = PortfolioBacktester(close_panel, signal_panel, capital_per_trade=0.02, max_position_pct=0.05)
+    bt.run_backtest()
+    print(f"耗时: {time.perf_counter() - start:.2f}s")
+    for key, value in bt.get_performance_metrics().items():
+        print(f"{key}: {value}")
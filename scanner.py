@@ -3,6 +3,10 @@ import pandas as pd
 import numpy as np
 import joblib
 import os
+import time
+import heapq
+import argparse
+import multiprocessing.util
 from tqdm import tqdm
 import warnings
 import concurrent.futures
@@ -12,6 +16,33 @@ import concurrent.futures
 MODEL_FILE_PATH = 'stock_prediction_model.joblib'
 # 计算特征所需的最短历史天数
 REQUIRED_HISTORY_DAYS = 50
+# 扫描器自己的日线缓存目录 (只保存扫描需要的近期数据，不能与训练/回测使用的全量历史混用)
+SCANNER_CACHE_DIR = 'scanner_cache'
+# data_downloader.download_all_stock_data 的全量历史缓存，扫描器只读取它来建立自己的缓存
+FULL_HISTORY_CACHE_DIR = 'stock_data_cache'
+# 与 data_downloader 写入缓存时相同的字段
+HISTORY_FIELDS = "date,code,open,high,low,close,preclose,volume,amount,pctChg"
+# baostock 当日日线数据的发布时间 (小时)，之前的扫描以前一交易日为最新数据
+DAILY_DATA_READY_HOUR = 18
+# 并行获取数据的进程数 (每个进程只登录一次 baostock)
+SCANNER_MAX_WORKERS = int(os.getenv('SCANNER_MAX_WORKERS', '4'))
+# 单只股票获取失败时的重试次数与退避基数 (秒)，第 n 次重试前等待 backoff * 2**n
+FETCH_RETRIES = 3
+FETCH_BACKOFF_SECONDS = 0.5
+
+# 扫描模型使用的特征列
+SCANNER_FEATURES = [
+    'SMA_10', 'SMA_20', 'SMA_50',
+    'RSI_14',
+    'MACD_12_26_9', 'MACDh_12_26_9', 'MACDs_12_26_9',
+    'BBL_20_2.0_2.0', 'BBM_20_2.0_2.0', 'BBU_20_2.0_2.0', 'BBB_20_2.0_2.0', 'BBP_20_2.0_2.0',
+    'STOCHk_14_3_3', 'STOCHd_14_3_3',
+    'ATRr_14',
+    'MOM_10',
+    'MFI_14',
+    'WILLR_14',
+    'OBV'
+]
 
 # 忽略一些pandas的警告
 warnings.filterwarnings('ignore', category=FutureWarning)
@@ -31,7 +62,8 @@ def calculate_features(df: pd.DataFrame) -> pd.DataFrame:
         df[col] = pd.to_numeric(df[col], errors='coerce')
     df.dropna(subset=numeric_cols, inplace=True)
 
-    return generate_features(df)
+    features_df, _ = generate_features(df)
+    return features_df
 
 # --- 数据获取与处理模块 (使用 Baostock) ---
 
@@ -59,97 +91,227 @@ def get_all_stock_codes_from_baostock(max_retry_days=7):
     a_stock_df.rename(columns={'code': '代码', 'code_name': '名称'}, inplace=True)
     return a_stock_df[['代码', '名称']]
 
+def _query_history(stock_code: str, start_date: str, end_date: str) -> pd.DataFrame:
+    """查询 baostock 日线 (前复权，字段与 data_downloader 写入的缓存一致)。查询失败时抛出 RuntimeError。"""
+    rs = bs.query_history_k_data_plus(
+        stock_code,
+        HISTORY_FIELDS,
+        start_date=start_date,
+        end_date=end_date,
+        frequency="d",
+        adjustflag="2" # 前复权
+    )
+    if rs.error_code != '0':
+        raise RuntimeError(f"baostock 查询失败 ({rs.error_code}): {rs.error_msg}")
+    return rs.get_data()
+
 def get_recent_history_from_baostock(stock_code: str, days: int = REQUIRED_HISTORY_DAYS) -> pd.DataFrame:
-    """使用 baostock 获取单只股票最近N天的日线数据"""
+    """
+    使用 baostock 获取单只股票最近N天的日线数据 (需已登录)。
+    查询失败时抛出 RuntimeError，数据不足时返回空 DataFrame。
+    """
+    end_date = pd.to_datetime('today').strftime('%Y-%m-%d')
+    # 为了确保有足够的数据，我们多获取一些
+    start_date = (pd.to_datetime('today') - pd.Timedelta(days=days*2)).strftime('%Y-%m-%d')
+
+    data_df = _query_history(stock_code, start_date, end_date)
+    if data_df.empty or len(data_df) < days:
+        return pd.DataFrame()
+
+    data_df['date'] = pd.to_datetime(data_df['date'])
+    data_df.set_index('date', inplace=True)
+    return data_df.tail(days)
+
+# --- 本地缓存: 读取 scanner_cache 中的历史，只向 baostock 请求缺失的尾部 ---
+
+def _cache_path(stock_code: str, root: str = SCANNER_CACHE_DIR) -> str:
+    return os.path.join(root, f"{stock_code.replace('.', '_')}_daily.csv")
+
+def _checked_marker_path(path: str) -> str:
+    # 记录最近一次增量检查对应的交易日 (节假日没有新数据时，同一交易日内不再重复请求)
+    return path + '.checked'
+
+def _read_checked_day(path: str) -> str:
     try:
-        end_date = pd.to_datetime('today').strftime('%Y-%m-%d')
-        # 为了确保有足够的数据，我们多获取一些
-        start_date = (pd.to_datetime('today') - pd.Timedelta(days=days*2)).strftime('%Y-%m-%d')
-
-        rs = bs.query_history_k_data_plus(
-            stock_code,
-            "date,code,open,high,low,close,volume",
-            start_date=start_date,
-            end_date=end_date,
-            frequency="d",
-            adjustflag="2" # 前复权
-        )
-        if rs.error_code != '0':
-            return pd.DataFrame()
-        
-        data_df = rs.get_data()
-        if data_df.empty or len(data_df) < days:
-            return pd.DataFrame()
-            
-        data_df.rename(columns={'close': 'close', 'open': 'open', 'high': 'high', 'low': 'low', 'volume': 'volume'}, inplace=True)
-        data_df['date'] = pd.to_datetime(data_df['date'])
-        data_df.set_index('date', inplace=True)
-        return data_df.tail(days)
-    except Exception:
+        with open(_checked_marker_path(path), encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return ''
+
+def _write_checked_day(path: str, day: str):
+    with open(_checked_marker_path(path), 'w', encoding='utf-8') as f:
+        f.write(day)
+
+def latest_expected_trading_day(now: pd.Timestamp = None) -> pd.Timestamp:
+    """最近一个应已发布日线的交易日 (只排除周末，节假日由缓存的检查记录兜底)。"""
+    now = now or pd.Timestamp.now()
+    day = now.normalize()
+    if now.hour < DAILY_DATA_READY_HOUR:
+        day -= pd.Timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= pd.Timedelta(days=1)
+    return day
+
+def _write_cache(path: str, df: pd.DataFrame):
+    tmp_path = path + '.tmp'
+    df.to_csv(tmp_path, index=False, encoding='utf-8-sig')
+    os.replace(tmp_path, path)
+
+def get_recent_history(stock_code: str, days: int = REQUIRED_HISTORY_DAYS, now: pd.Timestamp = None) -> pd.DataFrame:
+    """
+    从本地缓存读取单只股票最近N天的日线，只向 baostock 请求缓存最后一天之后的数据并写回缓存。
+
+    - 缓存已包含最近应发布的交易日，或本交易日已检查过 (.checked 记录)，则不访问网络。
+    - 增量请求从缓存最后一天开始 (重叠一根K线)；若重叠K线的收盘价与缓存不一致，说明发生了除权，
+      前复权价格整体变化，此时重新下载整段缓存区间。
+    - 没有缓存时用 stock_data_cache 中的全量历史的最后 days 行建立缓存 (再增量补齐)，
+      两者都没有时下载最近 days*2 个自然日。
+    """
+    now = now or pd.Timestamp.now()
+    path = _cache_path(stock_code)
+    today_str = now.strftime('%Y-%m-%d')
+
+    cached = pd.read_csv(path, encoding='utf-8-sig', dtype={'date': str}) if os.path.exists(path) else pd.DataFrame()
+    if cached.empty or 'date' not in cached.columns:
+        full_path = _cache_path(stock_code, FULL_HISTORY_CACHE_DIR)
+        if os.path.exists(full_path):
+            cached = pd.read_csv(full_path, encoding='utf-8-sig', dtype={'date': str})
+            cached = cached.reindex(columns=HISTORY_FIELDS.split(',')).dropna(subset=['date']).tail(days)
+        if cached.empty:
+            data_df = get_recent_history_from_baostock(stock_code, days)
+            if not data_df.empty:
+                os.makedirs(SCANNER_CACHE_DIR, exist_ok=True)
+                _write_cache(path, data_df.reset_index().assign(date=lambda d: d['date'].dt.strftime('%Y-%m-%d')))
+                _write_checked_day(path, latest_expected_trading_day(now).strftime('%Y-%m-%d'))
+            return data_df
+        os.makedirs(SCANNER_CACHE_DIR, exist_ok=True)
+        _write_cache(path, cached)
+
+    expected_day = latest_expected_trading_day(now)
+    expected_str = expected_day.strftime('%Y-%m-%d')
+    last_date = cached['date'].max()
+
+    if pd.Timestamp(last_date) < expected_day and _read_checked_day(path) != expected_str:
+        tail = _query_history(stock_code, last_date, today_str)
+        overlap = tail[tail['date'] == last_date]
+        cached_close = float(cached.loc[cached['date'] == last_date, 'close'].iloc[-1])
+        if not overlap.empty and not np.isclose(float(overlap['close'].iloc[0]), cached_close, rtol=1e-6):
+            print(f"{stock_code} 复权价格已变化，重新下载缓存区间。")
+            cached = _query_history(stock_code, cached['date'].min(), today_str)
+            _write_cache(path, cached)
+        else:
+            new_rows = tail[tail['date'] > last_date]
+            if not new_rows.empty:
+                new_rows = new_rows.reindex(columns=cached.columns)
+                # 文件开头已有 BOM，追加时使用普通 utf-8
+                new_rows.to_csv(path, mode='a', header=False, index=False, encoding='utf-8')
+                cached = pd.concat([cached, new_rows], ignore_index=True)
+        _write_checked_day(path, expected_str)
+
+    recent = cached.tail(days).copy()
+    if len(recent) < days:
         return pd.DataFrame()
+    recent['date'] = pd.to_datetime(recent['date'])
+    recent.set_index('date', inplace=True)
+    return recent
+
+# --- 并行工作进程: 每个进程登录一次 baostock 并复用会话 ---
 
-def process_stock_isolated(code):
-    """在独立的进程中获取单只股票的特征数据"""
+def _worker_login() -> bool:
     lg = bs.login()
-    if lg.error_code != '0':
-        # 如果登录失败，直接返回，不要尝试登出
-        return None
-    
+    return lg.error_code == '0'
+
+def _worker_logout():
     try:
-        hist_df = get_recent_history_from_baostock(code)
-        if hist_df.empty:
-            return None
-            
-        features_df = calculate_features(hist_df)
-        if features_df.empty:
-            return None
-
-        last_features = features_df.iloc[-1:].copy()
-        last_features['代码'] = code.split('.')[1]
-        return last_features
+        bs.logout()
     except Exception:
-        # 捕获所有可能的异常，确保登出逻辑能执行
-        return None
-    finally:
-        # 确保只要登录成功，就一定会执行登出
+        pass
+
+def init_scanner_worker():
+    """进程池初始化函数：登录 baostock，并在工作进程退出时登出。"""
+    warnings.filterwarnings('ignore', category=FutureWarning)
+    if not _worker_login():
+        print(f"警告: 工作进程 {os.getpid()} 登录 baostock 失败，将在首次查询时重试。")
+    # ProcessPoolExecutor 的工作进程退出时不会执行 atexit，使用 multiprocessing 的 Finalize
+    multiprocessing.util.Finalize(None, _worker_logout, exitpriority=10)
+
+def fetch_history_with_retry(code: str, retries: int = FETCH_RETRIES, backoff: float = FETCH_BACKOFF_SECONDS) -> pd.DataFrame:
+    """获取历史数据，失败时按指数退避重试，重试前重新登录 (会话可能已失效)。"""
+    for attempt in range(retries + 1):
         try:
-            bs.logout()
+            return get_recent_history(code)
         except Exception:
-            pass
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+            _worker_logout()
+            _worker_login()
+
+def process_stock(code):
+    """在工作进程中获取单只股票的最新特征 (复用进程内的 baostock 会话)。"""
+    hist_df = fetch_history_with_retry(code)
+    if hist_df.empty:
+        return None
+
+    features_df = calculate_features(hist_df)
+    if features_df.empty:
+        return None
+
+    last_features = features_df.iloc[-1:].copy()
+    last_features['代码'] = code.split('.')[1]
+    return last_features
+
+def load_stock_universe() -> pd.DataFrame:
+    """获取待扫描的A股列表 (代码带交易所前缀)。股票列表查询需要登录，仅在父进程中短暂登录一次。"""
+    lg = bs.login()
+    if lg.error_code != '0':
+        print(f"baostock 登录失败: {lg.error_msg}")
+        return pd.DataFrame()
+    try:
+        return get_all_stock_codes_from_baostock()
+    finally:
+        bs.logout()
 
-def get_latest_features_for_all_stocks():
+def iter_stock_features(stock_codes, max_workers: int = SCANNER_MAX_WORKERS, cancel_event=None):
+    """
+    并行获取股票的最新特征，按完成顺序逐只产出 (code, features 或 None, error 或 None)。
+    cancel_event (threading.Event) 被设置后停止产出并取消尚未开始的任务。
+    """
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=init_scanner_worker)
+    try:
+        future_to_code = {executor.submit(process_stock, code): code for code in stock_codes}
+        for future in concurrent.futures.as_completed(future_to_code):
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            code = future_to_code[future]
+            try:
+                yield code, future.result(), None
+            except Exception as exc:
+                yield code, None, exc
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def get_latest_features_for_all_stocks(max_workers: int = SCANNER_MAX_WORKERS):
     """并行获取所有A股的最新特征数据 (使用 Baostock)"""
-    codes_and_names = get_all_stock_codes_from_baostock()
+    codes_and_names = load_stock_universe()
     if codes_and_names.empty:
         return pd.DataFrame(), pd.DataFrame()
     
     stock_codes = codes_and_names['代码'].tolist()
     latest_features = []
+    failed_codes = []
     
-    print(f"开始并行获取 {len(stock_codes)} 只股票的最新特征数据...")
+    print(f"开始使用 {max_workers} 个进程并行获取 {len(stock_codes)} 只股票的最新特征数据...")
     
-    # 折中方案：使用2个并行进程，在速度和稳定性之间取得平衡
-    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
-        future_to_code = {executor.submit(process_stock_isolated, code): code for code in stock_codes}
-        
-        for future in tqdm(concurrent.futures.as_completed(future_to_code), total=len(stock_codes), desc="获取最新特征"):
-            code = future_to_code[future]
-            try:
-                # 为每个进程设置一个更长的超时，例如60秒
-                result = future.result(timeout=60)
-                if result is not None:
-                    latest_features.append(result)
-            except concurrent.futures.TimeoutError:
-                print(f"获取 {code} 数据进程超时，已被跳过。")
-            except Exception as exc:
-                print(f"处理 {code} 数据时发生错误: {exc}")
+    for code, result, error in tqdm(iter_stock_features(stock_codes, max_workers), total=len(stock_codes), desc="获取最新特征"):
+        if error is not None:
+            failed_codes.append(code)
+            print(f"处理 {code} 数据时发生错误 (已重试 {FETCH_RETRIES} 次): {error}")
+        elif result is not None:
+            latest_features.append(result)
 
-    print("\n所有并行任务已处理完毕。")
+    print(f"\n所有并行任务已处理完毕。失败 {len(failed_codes)} 只。")
 
-    if not latest_features:
-        return pd.DataFrame(), pd.DataFrame()
-    
-    latest_features = [f for f in latest_features if f is not None]
     if not latest_features:
         return pd.DataFrame(), pd.DataFrame()
         
@@ -160,67 +322,114 @@ def get_latest_features_for_all_stocks():
 
 # --- 主预测流程 ---
 
-def predict_stocks(top_n: int = 50):
+def load_scanner_model(model_path: str = MODEL_FILE_PATH):
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"模型文件 '{model_path}' 不存在。请先运行 model_trainer.py。")
+    print(f"正在加载模型: {model_path}")
+    return joblib.load(model_path)
+
+def score_features(model, features_df: pd.DataFrame, names: dict) -> pd.DataFrame:
+    """对一批股票的特征打分，返回 代码、名称、predicted_return。特征不完整的股票被跳过。"""
+    usable = features_df.dropna(subset=SCANNER_FEATURES)
+    if usable.empty:
+        return pd.DataFrame(columns=['代码', '名称', 'predicted_return'])
+    return pd.DataFrame({
+        '代码': usable['代码'].to_numpy(),
+        '名称': usable['代码'].map(names).to_numpy(),
+        'predicted_return': model.predict(usable[SCANNER_FEATURES]),
+    })
+
+def to_display_records(df: pd.DataFrame) -> list:
+    """转换为前端使用的记录格式 (与 predicted_stocks.json 相同)。"""
+    out = df[['代码', '名称']].copy()
+    out['predicted_return(%)'] = (df['predicted_return'] * 100).round(2)
+    return out.to_dict(orient='records')
+
+def scan_stocks(top_n: int = 50, max_workers: int = SCANNER_MAX_WORKERS, batch_size: int = 100,
+                cancel_event=None, model=None):
     """
-    加载模型，获取最新数据，进行预测，并返回Top N结果。
+    流式全市场扫描 (生成器)。每完成 batch_size 只股票 (含失败/数据不足的)，对该批打分并更新用小顶堆维护的 Top N，然后产出:
+    {'batch': 本批打分结果, 'top': 当前 Top N (降序), 'improved': Top N 是否变化,
+     'done': 已完成数, 'total': 总数, 'failed': 失败数, 'cancelled': 是否已取消}
+    cancel_event 被设置后，产出一次 cancelled=True 的最终状态并结束。
     """
-    if not os.path.exists(MODEL_FILE_PATH):
-        print(f"错误: 模型文件 '{MODEL_FILE_PATH}' 不存在。请先运行 model_trainer.py。")
+    model = model if model is not None else load_scanner_model()
+    codes_and_names = load_stock_universe()
+    if codes_and_names.empty:
         return
-    
-    print(f"正在加载模型: {MODEL_FILE_PATH}")
-    model = joblib.load(MODEL_FILE_PATH)
+    stock_codes = codes_and_names['代码'].tolist()
+    names = dict(zip(codes_and_names['代码'].str.split('.').str[1], codes_and_names['名称']))
+    total = len(stock_codes)
 
-    # 登录 baostock
-    lg = bs.login()
-    if lg.error_code != '0':
-        print(f"baostock 登录失败: {lg.error_msg}")
-        return
-    print("baostock 登录成功！")
+    heap = [] # (predicted_return, 代码, 名称)，堆顶为当前 Top N 中最低的一只
+    pending = []
+    done = failed = 0
 
-    features_df, codes_and_names = get_latest_features_for_all_stocks()
-    
-    # 登出 baostock
-    bs.logout()
-    print("已登出 baostock。")
+    def flush(cancelled=False):
+        batch = score_features(model, pd.concat(pending, ignore_index=True), names) if pending else \
+            pd.DataFrame(columns=['代码', '名称', 'predicted_return'])
+        pending.clear()
+        improved = False
+        for code, name, pred in zip(batch['代码'], batch['名称'], batch['predicted_return']):
+            item = (float(pred), code, name)
+            if len(heap) < top_n:
+                heapq.heappush(heap, item)
+                improved = True
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+                improved = True
+        top = pd.DataFrame(sorted(heap, reverse=True), columns=['predicted_return', '代码', '名称'])
+        return {'batch': batch, 'top': top[['代码', '名称', 'predicted_return']], 'improved': improved,
+                'done': done, 'total': total, 'failed': failed, 'cancelled': cancelled}
 
-    if features_df.empty:
-        print("未能获取到任何股票的最新特征数据，预测中止。")
-        return
+    print(f"开始使用 {max_workers} 个进程流式扫描 {total} 只股票...")
+    since_flush = 0
+    for code, result, error in iter_stock_features(stock_codes, max_workers, cancel_event):
+        done += 1
+        since_flush += 1
+        if error is not None:
+            failed += 1
+        elif result is not None:
+            pending.append(result)
+        if since_flush >= batch_size or done == total:
+            since_flush = 0
+            yield flush()
 
-    features_for_prediction = features_df.dropna()
-    if features_for_prediction.empty:
-        print("数据清洗后为空，无法进行预测。")
-        return
-        
-    feature_names = [
-        'SMA_10', 'SMA_20', 'SMA_50',
-        'RSI_14',
-        'MACD_12_26_9', 'MACDh_12_26_9', 'MACDs_12_26_9',
-        'BBL_20_2.0_2.0', 'BBM_20_2.0_2.0', 'BBU_20_2.0_2.0', 'BBB_20_2.0_2.0', 'BBP_20_2.0_2.0',
-        'STOCHk_14_3_3', 'STOCHd_14_3_3',
-        'ATRr_14',
-        'MOM_10',
-        'MFI_14',
-        'WILLR_14',
-        'OBV'
-    ]
-    X_pred = features_for_prediction[feature_names]
+    if cancel_event is not None and cancel_event.is_set():
+        print(f"扫描已取消，完成 {done}/{total} 只。")
+        yield flush(cancelled=True)
+    else:
+        print(f"扫描完成: {total} 只股票，失败 {failed} 只。")
 
-    print("模型正在进行预测...")
-    predictions = model.predict(X_pred)
-    features_for_prediction['predicted_return'] = predictions
+def predict_stocks(top_n: int = 50, max_workers: int = SCANNER_MAX_WORKERS):
+    """
+    加载模型，获取最新数据，进行预测，并返回Top N结果。
+    """
+    try:
+        model = load_scanner_model()
+    except FileNotFoundError as e:
+        print(f"错误: {e}")
+        return
 
-    result_df = pd.merge(features_for_prediction, codes_and_names, on='代码')
-    final_df = result_df.sort_values(by='predicted_return', ascending=False)
+    last = None
+    for last in scan_stocks(top_n, max_workers, model=model):
+        pass
+    if last is None or last['top'].empty:
+        print("未能获取到任何股票的最新特征数据，预测中止。")
+        return
 
+    final_df = last['top']
     print(f"\n--- 模型预测完成，返回预期收益最高的 {top_n} 只股票 ---")
-    display_columns = ['代码', '名称', 'predicted_return']
-    return final_df.head(top_n)[display_columns]
+    return final_df.head(top_n)
 
 
 if __name__ == '__main__':
-    top_stocks = predict_stocks(top_n=50)
+    parser = argparse.ArgumentParser(description='全市场A股扫描预测')
+    parser.add_argument('--top', type=int, default=50, help='返回预期收益最高的股票数量')
+    parser.add_argument('--workers', type=int, default=SCANNER_MAX_WORKERS, help='并行获取数据的进程数')
+    args = parser.parse_args()
+
+    top_stocks = predict_stocks(top_n=args.top, max_workers=args.workers)
 
     if top_stocks is not None and not top_stocks.empty:
         top_stocks['predicted_return(%)'] = (top_stocks['predicted_return'] * 100).round(2)
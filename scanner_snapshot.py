@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import argparse
+import threading
+import datetime
+import pandas as pd
+from typing import Dict, Any, List, Optional
+
+from scanner import scan_stocks, latest_expected_trading_day, SCANNER_MAX_WORKERS, DAILY_DATA_READY_HOUR
+
+# 全市场扫描快照目录：每个交易日一个 CSV (全部打分结果) 和一个 meta.json
+SCANNER_SNAPSHOT_DIR = 'scanner_snapshots'
+# 收盘数据发布后多少分钟开始定时扫描
+SNAPSHOT_DELAY_MINUTES = int(os.getenv('SCANNER_SNAPSHOT_DELAY_MINUTES', '10'))
+# 扫描失败后的重试间隔 (秒)
+SNAPSHOT_RETRY_SECONDS = 30 * 60
+SNAPSHOT_COLUMNS = ['代码', '名称', 'predicted_return']
+SORTABLE_COLUMNS = ('代码', '名称', 'predicted_return')
+
+
+def _snapshot_paths(trade_date: str, root: str = SCANNER_SNAPSHOT_DIR):
+    datetime.date.fromisoformat(trade_date) # 校验日期格式，防止路径穿越
+    return os.path.join(root, f'{trade_date}.csv'), os.path.join(root, f'{trade_date}.meta.json')
+
+
+def save_snapshot(scored: pd.DataFrame, trade_date: str, meta: Dict[str, Any], root: str = SCANNER_SNAPSHOT_DIR) -> Dict[str, Any]:
+    """保存一个交易日的全市场打分结果 (按预期收益降序)。先写临时文件再原子替换。"""
+    os.makedirs(root, exist_ok=True)
+    csv_path, meta_path = _snapshot_paths(trade_date, root)
+    scored = scored[SNAPSHOT_COLUMNS].sort_values('predicted_return', ascending=False)
+    scored.to_csv(csv_path + '.tmp', index=False, encoding='utf-8-sig')
+    os.replace(csv_path + '.tmp', csv_path)
+
+    meta = dict(meta, trade_date=trade_date, count=len(scored),
+                created_at=datetime.datetime.now().isoformat(timespec='seconds'))
+    with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(meta_path + '.tmp', meta_path)
+    return meta
+
+
+def list_snapshots(root: str = SCANNER_SNAPSHOT_DIR) -> List[Dict[str, Any]]:
+    """列出所有快照的元数据，按交易日倒序。"""
+    if not os.path.isdir(root):
+        return []
+    snapshots = []
+    for name in sorted(os.listdir(root), reverse=True):
+        if not name.endswith('.meta.json'):
+            continue
+        try:
+            with open(os.path.join(root, name), 'r', encoding='utf-8') as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+# 进程内缓存：(路径, mtime) -> DataFrame，快照文件被替换后自动失效
+_loaded: Dict[str, Any] = {}
+
+def load_snapshot(trade_date: Optional[str] = None, root: str = SCANNER_SNAPSHOT_DIR):
+    """读取指定交易日 (默认最新) 的快照，返回 (meta, DataFrame)；没有快照时返回 (None, None)。"""
+    if trade_date is None:
+        snapshots = list_snapshots(root)
+        if not snapshots:
+            return None, None
+        trade_date = snapshots[0]['trade_date']
+    csv_path, meta_path = _snapshot_paths(trade_date, root)
+    try:
+        mtime = os.stat(csv_path).st_mtime_ns
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None, None
+    if _loaded.get('key') != (csv_path, mtime):
+        df = pd.read_csv(csv_path, encoding='utf-8-sig', dtype={'代码': str})
+        _loaded.update(key=(csv_path, mtime), df=df)
+    return meta, _loaded['df']
+
+
+def is_fresh(meta: Optional[Dict[str, Any]], now: pd.Timestamp = None) -> bool:
+    """快照是否已覆盖最近一个应已发布日线的交易日。"""
+    return meta is not None and meta.get('trade_date') == latest_expected_trading_day(now).strftime('%Y-%m-%d')
+
+
+def query_snapshot(df: pd.DataFrame, min_return: float = None, max_return: float = None, prefix: str = None,
+                   name: str = None, sort_by: str = 'predicted_return', ascending: bool = False,
+                   limit: int = 50, offset: int = 0):
+    """按预期收益区间、代码前缀 (如 '300')、名称关键字过滤并排序，返回 (匹配总数, 当前页)。"""
+    if sort_by not in SORTABLE_COLUMNS:
+        raise ValueError(f"不支持的排序字段: {sort_by}")
+    mask = pd.Series(True, index=df.index)
+    if min_return is not None:
+        mask &= df['predicted_return'] >= min_return
+    if max_return is not None:
+        mask &= df['predicted_return'] <= max_return
+    if prefix:
+        mask &= df['代码'].str.startswith(prefix)
+    if name:
+        mask &= df['名称'].astype(str).str.contains(name, regex=False)
+    matched = df[mask].sort_values(sort_by, ascending=ascending, kind='stable')
+    return len(matched), matched.iloc[offset:offset + limit]
+
+
+def _scan_and_save(max_workers: int, now: pd.Timestamp, cancel_event, on_update) -> Optional[Dict[str, Any]]:
+    trade_date = latest_expected_trading_day(now).strftime('%Y-%m-%d')
+    started = time.time()
+    batches, last = [], None
+    for last in scan_stocks(max_workers=max_workers, cancel_event=cancel_event):
+        if not last['batch'].empty:
+            batches.append(last['batch'])
+        on_update(last)
+    if last is None or last['cancelled'] or not batches:
+        return None
+    meta = save_snapshot(pd.concat(batches, ignore_index=True), trade_date, {
+        'total': last['total'], 'failed': last['failed'], 'duration_seconds': round(time.time() - started, 1),
+    })
+    print(f"已保存 {trade_date} 的全市场扫描快照: {meta['count']} 只股票。")
+    return meta
+
+
+class _SharedScan:
+    """一次正在运行的全市场扫描 (在后台线程中执行)，所有调用方共享它的进度和结果。"""
+
+    def __init__(self):
+        self.cancel_event = threading.Event()
+        self.finished = threading.Event()
+        self.last = None
+        self.meta = None
+        self.error = None
+        self._listeners: Dict[int, Any] = {}
+        self._next_token = 0
+        self._lock = threading.Lock()
+
+    def join(self, on_update) -> int:
+        """加入扫描；扫描已有进度时先把最近一次进度交给 on_update。"""
+        with self._lock:
+            token = self._next_token
+            self._next_token += 1
+            self._listeners[token] = on_update
+            if on_update is not None and self.last is not None:
+                on_update(self.last)
+        return token
+
+    def leave(self, token: int):
+        """退出扫描；所有调用方都已退出而扫描尚未结束 (都取消了) 时停止扫描。"""
+        with self._lock:
+            self._listeners.pop(token, None)
+            if not self._listeners and not self.finished.is_set():
+                self.cancel_event.set()
+
+    def _publish(self, update):
+        with self._lock:
+            self.last = update
+            listeners = [fn for fn in self._listeners.values() if fn is not None]
+            for fn in listeners:
+                try:
+                    fn(update)
+                except Exception as e:
+                    print(f"推送扫描进度失败: {e}")
+
+    def run(self, max_workers: int, now: pd.Timestamp):
+        global _current_scan
+        try:
+            self.meta = _scan_and_save(max_workers, now, self.cancel_event, self._publish)
+        except Exception as e:
+            self.error = e
+        finally:
+            with _current_scan_lock:
+                if _current_scan is self:
+                    _current_scan = None
+            self.finished.set()
+
+
+# 进程内同时只运行一次全市场扫描
+_current_scan: Optional[_SharedScan] = None
+_current_scan_lock = threading.Lock()
+
+
+def run_snapshot_scan(max_workers: int = SCANNER_MAX_WORKERS, now: pd.Timestamp = None, cancel_event=None,
+                      on_update=None, force: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    扫描全市场并保存当日快照 (全部打分结果，不只是 Top N)，阻塞到扫描结束。
+    同一进程内同时只运行一次扫描：扫描已在运行时加入它 (on_update 先收到最近一次进度，再接收后续每次产出)，
+    返回同一个结果；force=False 且当日快照已存在时不再扫描，直接返回快照的元数据。
+    cancel_event 被设置后当前调用方立即退出并返回 None，所有调用方都退出后扫描才真正停止。
+    扫描被取消或没有结果时不保存，返回 None。
+    """
+    global _current_scan
+    with _current_scan_lock:
+        scan = _current_scan
+        # 所有调用方都已取消、正在停止的扫描不再加入
+        if scan is None or scan.cancel_event.is_set():
+            if not force:
+                meta = load_snapshot()[0]
+                if is_fresh(meta, now):
+                    return meta
+            scan = _current_scan = _SharedScan()
+            threading.Thread(target=scan.run, args=(max_workers, now), name='snapshot-scan', daemon=True).start()
+        token = scan.join(on_update)
+    try:
+        while not scan.finished.wait(0.5):
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+    finally:
+        scan.leave(token)
+    if scan.error is not None:
+        raise scan.error
+    return scan.meta
+
+
+def next_snapshot_time(now: pd.Timestamp = None) -> pd.Timestamp:
+    """下一次定时扫描的时间：工作日收盘数据发布后 (DAILY_DATA_READY_HOUR 点 + SNAPSHOT_DELAY_MINUTES 分钟)。"""
+    now = now or pd.Timestamp.now()
+    run_at = now.normalize() + pd.Timedelta(hours=DAILY_DATA_READY_HOUR, minutes=SNAPSHOT_DELAY_MINUTES)
+    while run_at <= now or run_at.weekday() >= 5:
+        run_at += pd.Timedelta(days=1)
+    return run_at
+
+
+if __name__ == '__main__':
+    # 作为独立进程运行 (可由 cron 调用，或 --loop 常驻)，API 进程只负责读取快照
+    parser = argparse.ArgumentParser(description='全市场扫描快照')
+    parser.add_argument('--workers', type=int, default=SCANNER_MAX_WORKERS, help='并行获取数据的进程数')
+    parser.add_argument('--loop', action='store_true', help='常驻运行，每个交易日收盘后扫描一次')
+    parser.add_argument('--force', action='store_true', help='当日快照已存在时仍重新扫描')
+    args = parser.parse_args()
+
+    while True:
+        if args.force or not is_fresh(load_snapshot()[0]):
+            try:
+                run_snapshot_scan(args.workers, force=args.force)
+            except Exception as e:
+                print(f"全市场扫描失败: {e}")
+                if args.loop:
+                    time.sleep(SNAPSHOT_RETRY_SECONDS)
+                    continue
+        if not args.loop:
+            break
+        args.force = False
+        run_at = next_snapshot_time()
+        print(f"下一次扫描时间: {run_at}")
+        time.sleep(max(0.0, (run_at - pd.Timestamp.now()).total_seconds()))
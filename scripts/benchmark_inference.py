@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+单行推理延迟基准测试。
+
+对比 model.predict(DataFrame) 与 tree_inference 编译路径的单行预测中位延迟，
+并估算预测在 /predict 处理时间 (特征生成 + 预测) 中所占的比例。
+
+用法: python scripts/benchmark_inference.py [--rows 250] [--repeat 200]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# ensure project root on path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import lightgbm as lgb
+from sklearn.ensemble import RandomForestRegressor
+
+from feature_generator import generate_features
+from tree_inference import compile_model
+
+
+def make_ohlcv(n_rows: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n_rows)))
+    open_ = close * (1 + rng.normal(0, 0.002, n_rows))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.003, n_rows)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.003, n_rows)))
+    volume = rng.integers(1_000, 100_000, n_rows).astype(float)
+    index = pd.date_range('2020-01-01', periods=n_rows, freq='D', name='date')
+    return pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}, index=index)
+
+
+def median_ms(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='单行推理延迟基准测试')
+    parser.add_argument('--rows', type=int, default=250, help='合成K线数量 (与 /predict 的 250 天窗口一致)')
+    parser.add_argument('--repeat', type=int, default=200, help='每项计时的重复次数')
+    args = parser.parse_args()
+
+    raw = make_ohlcv(args.rows)
+    with contextlib.redirect_stdout(io.StringIO()):
+        features_df, features = generate_features(raw.copy())
+    train_df = features_df[features].dropna()
+    target = raw['close'].shift(-5).reindex(train_df.index) / raw['close'].reindex(train_df.index) - 1
+    mask = target.notna()
+    X, y = train_df[mask], target[mask]
+
+    models = {
+        'LightGBM': lgb.LGBMRegressor(n_estimators=200, learning_rate=0.05, num_leaves=31, random_state=42, verbose=-1).fit(X, y),
+        'RandomForest': RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=1).fit(X, y),
+    }
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        feature_ms = median_ms(lambda: generate_features(raw.copy()), max(5, args.repeat // 20))
+
+    last_row = features_df.iloc[-1:][features]
+    print(f"特征生成 (generate_features, {args.rows} 行) 中位耗时: {feature_ms:.2f} ms\n")
+    print(f"{'模型':<14}{'predict(ms)':>14}{'compiled(ms)':>14}{'加速比':>10}{'predict占比':>14}{'compiled占比':>14}{'一致':>6}")
+    for name, model in models.items():
+        compiled = compile_model(model)
+        batch = features_df[features].to_numpy(dtype=float)
+        exact = np.array_equal(model.predict(features_df[features]), compiled.predict(batch))
+
+        predict_ms = median_ms(lambda: model.predict(last_row)[0], args.repeat)
+        compiled_ms = median_ms(lambda: compiled.predict_one(last_row.to_numpy(dtype=float)[0]), args.repeat)
+        share = predict_ms / (feature_ms + predict_ms)
+        compiled_share = compiled_ms / (feature_ms + compiled_ms)
+        print(f"{name:<14}{predict_ms:>14.3f}{compiled_ms:>14.3f}{predict_ms / compiled_ms:>9.1f}x"
+              f"{share:>14.1%}{compiled_share:>14.1%}{'是' if exact else '否':>6}")
+
+
+if __name__ == '__main__':
+    main()
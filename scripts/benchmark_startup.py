@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+启动耗时基准测试。
+
+在全新的解释器中用 `python -X importtime` 导入指定模块 (默认 api 与 model_trainer)，
+报告导入总耗时 (多次运行取中位数)、按顶层包汇总的自身耗时，以及被测模块直接导入的耗时最大的模块。
+
+用法: python scripts/benchmark_startup.py [--modules api model_trainer] [--repeat 3] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def parse_importtime(stderr: str):
+    """解析 -X importtime 输出，返回 [(depth, name, self_us, cumulative_us)]。"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def run_import(module: str):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          cwd=PROJECT_ROOT, env=env, capture_output=True, text=True)
+    return time.perf_counter() - started, proc
+
+
+def report(module: str, repeat: int, top: int):
+    print(f"\n=== import {module} ===")
+    timings, proc = [], None
+    for _ in range(repeat):
+        seconds, proc = run_import(module)
+        timings.append(seconds)
+        if proc.returncode != 0:
+            tail = proc.stderr.strip().splitlines()[-1:] or ['']
+            print(f"❌ 导入失败: {tail[0]}")
+            return
+    rows = parse_importtime(proc.stderr)
+    target = next((r for r in rows if r[1] == module), None)
+    print(f"进程耗时 (中位数, {repeat} 次): {statistics.median(timings) * 1000:.0f} ms")
+    if target is not None:
+        print(f"import {module} 累计: {target[3] / 1000:.0f} ms")
+
+    by_package = defaultdict(int)
+    for _, name, self_us, _ in rows:
+        by_package[name.split('.')[0]] += self_us
+    print(f"\n按顶层包汇总的自身耗时 (前 {top}):")
+    for package, self_us in sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+        print(f"  {self_us / 1000:8.1f} ms  {package}")
+
+    if target is not None:
+        depth = target[0] + 1
+        direct = [r for r in rows if r[0] == depth]
+        print(f"\n{module} 直接导入的模块 (按累计耗时, 前 {top}):")
+        for _, name, _, cumulative_us in sorted(direct, key=lambda r: r[3], reverse=True)[:top]:
+            print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测量模块冷启动导入耗时')
+    parser.add_argument('--modules', nargs='+', default=['api', 'model_trainer'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+    for module in args.modules:
+        report(module, args.repeat, args.top)
+
+
+if __name__ == '__main__':
+    main()
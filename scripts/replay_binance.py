@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+用本地回放交易所驱动 BinanceTradingService.execute_trade_logic (实盘同一条代码路径)。
+
+K线来自录制的 CSV (--csv) 或随机游走合成数据；不访问网络，按 CPU 允许的最快速度逐根回放，
+输出成交、最终权益以及每根K线的端到端延迟和各交易所接口的调用统计。
+需要 ./{SYMBOL}_model.joblib (与实盘相同的模型文件)。审计记录写入单独的文件，不写入审计数据库。
+
+用法: python scripts/replay_binance.py --symbol BTC/USDT [--csv candles.csv] [--bars 2000] [--dry-run]
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+# 将项目根目录加入导入路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.trading_service import BinanceTradingService
+from services.exchange_replay import ReplayExchange, replay, synthetic_candles, load_candles_csv
+
+
+async def main(args):
+    candles = load_candles_csv(args.csv) if args.csv else synthetic_candles(args.bars + args.warmup, args.timeframe, seed=0)
+    exchange = ReplayExchange({args.symbol: candles}, timeframe=args.timeframe, initial_balance=args.balance,
+                              warmup=args.warmup, simulated_latency=args.latency_ms / 1000)
+    service = BinanceTradingService()
+    result = await replay(service, exchange, args.symbol, trade_amount_usdt=args.amount, dry_run=args.dry_run,
+                          max_position_size=args.max_position, max_notional=args.max_notional,
+                          max_steps=args.bars if not args.csv else None)
+
+    steps = result['steps']
+    print(f"回放 {len(steps)} 根K线, {len(result['orders'])} 笔成交, {result['bars_per_second']:.1f} 根/秒")
+    print(f"信号分布: {steps['signal'].value_counts().to_dict() if not steps.empty else {}}")
+    print(f"最终权益: {result['final_equity']:.2f} (已实现盈亏 {result['realized_pnl']:.2f}, 手续费 {result['fees_paid']:.2f})")
+    print(f"execute_trade_logic 延迟: {result['latency']}")
+    for name, stats in result['exchange_calls'].items():
+        print(f"  {name}: {stats['count']} 次, 平均 {stats['mean_ms']:.3f}ms")
+    print(f"审计记录: {result['audit_log']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='BinanceTradingService 本地回放')
+    parser.add_argument('--symbol', type=str, default='BTC/USDT')
+    parser.add_argument('--timeframe', type=str, default='5m')
+    parser.add_argument('--csv', type=str, default=None, help='录制的K线 CSV (timestamp 或 date, open, high, low, close, volume)')
+    parser.add_argument('--bars', type=int, default=2000, help='合成数据时回放的K线数')
+    parser.add_argument('--warmup', type=int, default=250, help='回放开始前可见的历史K线数')
+    parser.add_argument('--balance', type=float, default=10000.0)
+    parser.add_argument('--amount', type=float, default=100.0, help='每笔下单金额 (USDT)')
+    parser.add_argument('--max-position', type=float, default=1.0)
+    parser.add_argument('--max-notional', type=float, default=1000.0)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='模拟每次接口调用的网络延迟')
+    parser.add_argument('--dry-run', action='store_true')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+快速回测引擎 (fast_backtester) 与 Backtester 逐 bar 回测的一致性检查及性能测试。
+
+1. 用合成行情训练 RandomForest / LightGBM，分别以 engine='loop' 和 engine='fast' 回测，
+   要求成交记录、每日组合净值和性能指标完全一致。
+2. 用 10 年 1 分钟K线 (约 526 万根) 的合成信号测试数组引擎耗时。
+
+用法: python scripts/test_fast_backtest_parity.py
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+# ensure project root on path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import lightgbm as lgb
+from sklearn.ensemble import RandomForestRegressor
+
+from backtester import Backtester
+from fast_backtester import simulate_signals, performance_metrics_from_arrays
+
+
+def make_frame(n_rows: int, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n_rows)))
+    df = pd.DataFrame({
+        'close': close,
+        'f1': rng.normal(size=n_rows),
+        'f2': rng.normal(size=n_rows),
+    }, index=pd.date_range('2020-01-01', periods=n_rows, freq='D'))
+    df.loc[df.index[:20], 'f1'] = np.nan
+    return df
+
+
+def run_engine(df, model_path, engine):
+    with contextlib.redirect_stdout(io.StringIO()):
+        bt = Backtester(data=df, model_path=model_path, features=['f1', 'f2'])
+        bt.run_backtest(engine=engine)
+        metrics = bt.get_performance_metrics()
+    return bt, metrics
+
+
+def check_parity() -> bool:
+    df = make_frame(1500)
+    target = df['close'].shift(-5) / df['close'] - 1
+    train = df.assign(target=target).dropna()
+    models = {
+        'RandomForest': RandomForestRegressor(n_estimators=30, random_state=0).fit(train[['f1', 'f2']], train['target']),
+        'LightGBM': lgb.LGBMRegressor(n_estimators=50, random_state=0, verbose=-1).fit(train[['f1', 'f2']], train['target']),
+    }
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, model in models.items():
+            model_path = os.path.join(tmp, f'{name}.joblib')
+            joblib.dump(model, model_path)
+            loop_bt, loop_metrics = run_engine(df, model_path, 'loop')
+            fast_bt, fast_metrics = run_engine(df, model_path, 'fast')
+
+            fast_trades = fast_bt.trade_array
+            trades_equal = len(loop_bt.trades) == len(fast_trades) and all(
+                t['date'] == fast_bt.data.index[ft['index']]
+                and t['type'] == ('BUY' if ft['type'] == 1 else 'SELL')
+                and t['price'] == ft['price']
+                and t['shares'] == ft['shares']
+                and t.get('cost', t.get('revenue')) == ft['amount']
+                and ('profit_loss' not in t or t['profit_loss'] == ft['profit_loss'])
+                for t, ft in zip(loop_bt.trades, fast_trades)
+            )
+            values_equal = np.array_equal(np.asarray(loop_bt.portfolio_value), fast_bt.portfolio_value)
+            returns_equal = np.array_equal(np.asarray(loop_bt.daily_returns), fast_bt.daily_returns)
+            metrics_equal = loop_metrics == fast_metrics
+            passed = trades_equal and values_equal and returns_equal and metrics_equal
+            ok &= passed
+            print(f"[{'PASS' if passed else 'FAIL'}] {name}: {len(fast_trades)} 笔成交, "
+                  f"成交一致={trades_equal}, 净值一致={values_equal}, 收益率一致={returns_equal}, 指标一致={metrics_equal}")
+            if not metrics_equal:
+                print(f"  loop: {loop_metrics}\n  fast: {fast_metrics}")
+    return ok
+
+
+def check_speed(limit_seconds: float = 1.0) -> bool:
+    n_bars = 10 * 365 * 24 * 60
+    rng = np.random.default_rng(1)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.0005, n_bars)))
+    signals = rng.choice(np.array([-1, 0, 1], dtype=np.int8), size=n_bars, p=[0.05, 0.9, 0.05])
+
+    # 预热 (numba 首次调用需要编译)
+    simulate_signals(close[:1000], signals[:1000])
+
+    start = time.perf_counter()
+    result = simulate_signals(close, signals)
+    metrics = performance_metrics_from_arrays(result['portfolio_value'], result['daily_returns'], result['trades'],
+                                              100000.0, result['capital'])
+    elapsed = time.perf_counter() - start
+    passed = elapsed < limit_seconds
+    print(f"[{'PASS' if passed else 'FAIL'}] 10年1分钟K线 ({n_bars} 根, {len(result['trades'])} 笔成交) 耗时 {elapsed:.3f}s "
+          f"(上限 {limit_seconds}s), 最终净值 {metrics['Final Portfolio Value']:.2f}")
+    return passed
+
+
+if __name__ == '__main__':
+    parity_ok = check_parity()
+    speed_ok = check_speed()
+    sys.exit(0 if parity_ok and speed_ok else 1)
@@ -0,0 +1,205 @@
+import os
+import glob
+import time
+import asyncio
+import threading
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from config import config
+from services import metrics, profiler
+
+# 计算进程数；0 表示不使用进程池 (退回默认线程池，例如本地回放或调试时)
+COMPUTE_POOL_WORKERS = int(os.getenv('COMPUTE_POOL_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+
+# --- 行情在进程间以紧凑数组传递 ---
+
+def encode_frame(df: pd.DataFrame) -> Dict[str, Any]:
+    """DataFrame -> 数组：数值列合并为一个 float64 矩阵 (记录原 dtype)，索引为 datetime64 数组，其他列单独保存。"""
+    numeric = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
+    return {
+        'index': np.asarray(df.index),
+        'index_name': df.index.name,
+        'columns': numeric,
+        'values': np.ascontiguousarray(df[numeric].to_numpy(dtype=np.float64)),
+        'dtypes': [df[c].dtype.str for c in numeric],
+        'extra': {c: df[c].to_numpy() for c in df.columns if c not in numeric},
+        'order': list(df.columns),
+    }
+
+
+def decode_frame(payload: Dict[str, Any]) -> pd.DataFrame:
+    df = pd.DataFrame(payload['values'], columns=payload['columns'],
+                      index=pd.Index(payload['index'], name=payload['index_name']))
+    df = df.astype(dict(zip(payload['columns'], payload['dtypes'])), copy=False)
+    for column, values in payload['extra'].items():
+        df[column] = values
+    return df[payload['order']]
+
+
+# --- 工作进程 ---
+
+def init_compute_worker():
+    """工作进程启动时预先导入特征/模型模块，并加载项目目录下的所有模型 (编译后的树模型常驻内存)。"""
+    from services import model_service
+    import feature_generator
+    feature_generator.ensure_factor_data()
+    model_service.get_error_model()
+    for path in glob.glob(config.MODEL_PATH_TEMPLATE.format(ticker='*')):
+        ticker = os.path.basename(path)[:-len('_model.joblib')]
+        model_service.load_compiled_model(ticker, lambda msg: None)
+
+
+def _signal_task(kind: str, payload: Any, log_func) -> Dict[str, Any]:
+    from services import model_service
+    if kind == 'stock':
+        ticker, frame = payload
+        return model_service.generate_signal_from_data(ticker, decode_frame(frame), log_func)
+    if kind == 'crypto':
+        ticker, frame = payload
+        return model_service.generate_signal_from_crypto_data(ticker, decode_frame(frame), log_func)
+    if kind == 'stock_batch':
+        return model_service.generate_signals_batch({t: decode_frame(f) for t, f in payload.items()}, log_func)
+    raise ValueError(f"未知的任务类型: {kind}")
+
+
+def _run_signal_task(kind: str, payload: Any, labels=('', ''), profile: bool = False) -> Dict[str, Any]:
+    """
+    在工作进程中执行信号计算；日志和各阶段耗时收集后随结果一起返回，由主进程写入。
+    profile 为 True 时 (请求开启了 profiling) 同时返回本任务的 cProfile 统计。
+    """
+    logs: List[str] = []
+    stats = None
+    started = time.perf_counter()
+    with metrics.capture(labels) as observations:
+        if profile:
+            result, stats = profiler.profile_call(_signal_task, kind, payload, logs.append)
+        else:
+            result = _signal_task(kind, payload, logs.append)
+    return {'result': result, 'logs': logs, 'metrics': observations, 'profile': stats,
+            'seconds': time.perf_counter() - started}
+
+
+class _Worker:
+    def __init__(self, index: int):
+        self.index = index
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=1, initializer=init_compute_worker)
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.restarts = 0
+
+
+class ComputePool:
+    """
+    CPU 密集的信号计算 (generate_features + predict) 专用进程池。
+
+    每个工作进程有自己的单进程执行器，任务派发给排队最少的进程，因此可以按进程统计队列深度；
+    同一品种优先派发给同一进程，使其模型缓存保持命中。未启动 (workers=0) 时在默认线程池中执行。
+    """
+
+    def __init__(self, workers: int = COMPUTE_POOL_WORKERS):
+        self.workers = workers
+        self._workers: List[_Worker] = []
+        self._lock = threading.Lock()
+
+    @property
+    def started(self) -> bool:
+        return bool(self._workers)
+
+    def start(self):
+        if self.started or self.workers <= 0:
+            return
+        self._workers = [_Worker(i) for i in range(self.workers)]
+        # 提前拉起进程并完成预加载，避免第一个请求承担启动开销
+        for worker in self._workers:
+            worker.executor.submit(time.sleep, 0)
+        print(f"✅ Compute pool started with {self.workers} worker processes.")
+
+    def shutdown(self):
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _pick(self, affinity: str) -> _Worker:
+        with self._lock:
+            preferred = self._workers[hash(affinity) % len(self._workers)]
+            least = min(self._workers, key=lambda w: w.pending)
+            worker = preferred if preferred.pending <= least.pending else least
+            worker.pending += 1
+            return worker
+
+    async def _submit(self, kind: str, payload: Any, affinity: str, log_func: Callable[[str], None]):
+        loop = asyncio.get_running_loop()
+        labels = metrics.current_labels()
+        request_profile = profiler.current()
+        with metrics.stage_timer('compute_pool', symbol='batch' if kind == 'stock_batch' else affinity):
+            output = await self._execute(kind, payload, affinity, labels, request_profile is not None, loop)
+        metrics.record(output['metrics'])
+        if request_profile is not None and output['profile'] is not None:
+            request_profile.add_worker_stats(output['profile'])
+        for line in output['logs']:
+            log_func(line)
+        return output['result']
+
+    async def _execute(self, kind: str, payload: Any, affinity: str, labels, profile: bool, loop):
+        if not self.started:
+            output = await loop.run_in_executor(None, _run_signal_task, kind, payload, labels, profile)
+        else:
+            worker = self._pick(affinity)
+            try:
+                output = await asyncio.wrap_future(worker.executor.submit(_run_signal_task, kind, payload, labels, profile))
+                worker.completed += 1
+                worker.busy_seconds += output['seconds']
+            except BrokenProcessPool:
+                # 工作进程异常退出 (如内存不足)：替换该进程，本次请求报错
+                worker.failed += 1
+                self._restart(worker)
+                raise
+            except Exception:
+                worker.failed += 1
+                raise
+            finally:
+                worker.pending -= 1
+        return output
+
+    def _restart(self, worker: _Worker):
+        with self._lock:
+            worker.executor.shutdown(wait=False, cancel_futures=True)
+            worker.executor = concurrent.futures.ProcessPoolExecutor(max_workers=1, initializer=init_compute_worker)
+            worker.restarts += 1
+
+    async def stock_signal(self, ticker: str, data_df: pd.DataFrame, log_func) -> Dict[str, Any]:
+        return await self._submit('stock', (ticker, encode_frame(data_df)), ticker, log_func)
+
+    async def crypto_signal(self, ticker: str, data_df: pd.DataFrame, log_func) -> Dict[str, Any]:
+        return await self._submit('crypto', (ticker, encode_frame(data_df)), ticker, log_func)
+
+    async def stock_signals_batch(self, ticker_data: Dict[str, pd.DataFrame], log_func) -> Dict[str, Any]:
+        payload = {ticker: encode_frame(df) for ticker, df in ticker_data.items()}
+        return await self._submit('stock_batch', payload, next(iter(ticker_data)), log_func)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'started': self.started,
+            'queue_depth': sum(w.pending for w in self._workers),
+            'per_worker': [{
+                'worker': w.index,
+                'pending': w.pending,
+                'completed': w.completed,
+                'failed': w.failed,
+                'busy_seconds': round(w.busy_seconds, 3),
+                'restarts': w.restarts,
+            } for w in self._workers],
+        }
+
+
+# 进程内共享；由 API 启动时 start()，未启动时任务在线程池中执行
+compute_pool = ComputePool()
@@ -0,0 +1,343 @@
+"""
+BinanceTradingService 的本地回放环境。
+
+ReplayExchange 用录制或合成的K线实现交易服务用到的 ccxt 异步接口子集
+(load_markets, fetch_ohlcv, fetch_positions, create_market_buy/sell_order, amount_to_precision)。
+replay() 把它接到真实的 BinanceTradingService 上，逐根K线调用 execute_trade_logic，
+不访问网络，也不按真实时间等待。
+"""
+import os
+import time
+import contextlib
+from collections import deque, defaultdict
+from decimal import Decimal, ROUND_DOWN
+
+import numpy as np
+import pandas as pd
+
+from config import config
+import services.data_service as data_service
+
+TIMEFRAME_MS = {
+    '1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+    '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '6h': 21_600_000, '12h': 43_200_000,
+    '1d': 86_400_000,
+}
+
+
+class ReplayOrderError(Exception):
+    """真实交易所会拒绝的订单 (数量不足、无效的 reduceOnly)。"""
+
+
+def synthetic_candles(n_bars: int, timeframe: str = '5m', start_price: float = 30000.0, volatility: float = 0.002,
+                      seed: int = None, start: str = '2022-01-01') -> np.ndarray:
+    """随机游走生成的 OHLCV K线，(n, 6) 数组，列顺序与 ccxt 相同: timestamp(ms), open, high, low, close, volume。"""
+    rng = np.random.default_rng(seed)
+    close = start_price * np.exp(np.cumsum(rng.normal(0, volatility, n_bars)))
+    open_ = np.concatenate(([start_price], close[:-1]))
+    spread = np.abs(rng.normal(0, volatility / 2, n_bars)) * close
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    volume = rng.lognormal(3, 0.5, n_bars)
+    timestamps = pd.Timestamp(start).value // 1_000_000 + np.arange(n_bars) * TIMEFRAME_MS[timeframe]
+    return np.column_stack([timestamps, open_, high, low, close, volume]).astype(np.float64)
+
+
+def load_candles_csv(path: str) -> np.ndarray:
+    """从 CSV 读取录制的K线：毫秒 'timestamp' 列或 'date' 列，以及 open/high/low/close/volume。"""
+    df = pd.read_csv(path)
+    if 'timestamp' in df.columns:
+        timestamps = pd.to_numeric(df['timestamp'], errors='coerce')
+    else:
+        timestamps = pd.to_datetime(df['date']).astype('int64') // 1_000_000
+    cols = [pd.to_numeric(df[c], errors='coerce') for c in ('open', 'high', 'low', 'close', 'volume')]
+    candles = np.column_stack([timestamps] + cols).astype(np.float64)
+    return candles[~np.isnan(candles).any(axis=1)]
+
+
+class ReplayExchange:
+    """
+    与 ccxt 接口兼容的币安 U 本位合约账户模拟 (异步)。
+
+    - cursor 指向最后一根已收盘的K线，fetch_ohlcv 不会返回它之后的K线。
+    - 市价单按 cursor K线的收盘价成交 (按 slippage_rate 调整)，按成交额收取 fee_rate 手续费。
+    - 单向持仓 (带符号的数量)，开仓价按成交量加权，与币安默认模式一致。
+    - 每次接口调用都计时并计入 call_stats；simulated_latency (秒) 可为每次调用增加等待，模拟网络往返。
+    """
+
+    def __init__(self, candles, timeframe: str = '5m', initial_balance: float = 10000.0, fee_rate: float = 0.0004,
+                 slippage_rate: float = 0.0, amount_step: float = 0.001, min_amount: float = 0.001,
+                 warmup: int = 250, simulated_latency: float = 0.0):
+        if not isinstance(candles, dict):
+            raise TypeError("candles 必须是 {symbol: (n, 6) ohlcv 数组} 字典")
+        self.candles = {symbol: np.asarray(data, dtype=np.float64) for symbol, data in candles.items()}
+        lengths = {len(data) for data in self.candles.values()}
+        if len(lengths) != 1:
+            raise ValueError("所有品种的K线数量必须相同")
+        self.n_bars = lengths.pop()
+        if timeframe not in TIMEFRAME_MS:
+            raise ValueError(f"不支持的周期: {timeframe}")
+        self.timeframe = timeframe
+        self.fee_rate = fee_rate
+        self.slippage_rate = slippage_rate
+        self.amount_step = amount_step
+        self.min_amount = min_amount
+        self.simulated_latency = simulated_latency
+
+        self.cursor = min(warmup, self.n_bars) - 1
+        self.balance = float(initial_balance)
+        self.positions = {symbol: {'qty': 0.0, 'entry_price': 0.0} for symbol in self.candles}
+        self.orders = []
+        self.fees_paid = 0.0
+        self.realized_pnl = 0.0
+        self.call_stats = defaultdict(lambda: {'count': 0, 'total_s': 0.0})
+        self.markets = None
+
+    # --- 回放控制 ---
+    def advance(self) -> bool:
+        """前进到下一根K线，历史数据用完时返回 False。"""
+        if self.cursor + 1 >= self.n_bars:
+            return False
+        self.cursor += 1
+        return True
+
+    def last_price(self, symbol: str) -> float:
+        return float(self.candles[symbol][self.cursor, 4])
+
+    def current_timestamp(self) -> int:
+        return int(next(iter(self.candles.values()))[self.cursor, 0])
+
+    def equity(self) -> float:
+        unrealized = sum(pos['qty'] * (self.last_price(symbol) - pos['entry_price'])
+                         for symbol, pos in self.positions.items() if pos['qty'])
+        return self.balance + unrealized
+
+    @contextlib.asynccontextmanager
+    async def _timed(self, name: str):
+        start = time.perf_counter()
+        try:
+            if self.simulated_latency:
+                import asyncio
+                await asyncio.sleep(self.simulated_latency)
+            yield
+        finally:
+            stats = self.call_stats[name]
+            stats['count'] += 1
+            stats['total_s'] += time.perf_counter() - start
+
+    # --- ccxt 接口 ---
+    def set_sandbox_mode(self, enabled: bool):
+        pass
+
+    async def close(self):
+        pass
+
+    async def load_markets(self, reload: bool = False):
+        async with self._timed('load_markets'):
+            if self.markets is None or reload:
+                precision = -Decimal(str(self.amount_step)).as_tuple().exponent
+                self.markets = {
+                    symbol: {
+                        'symbol': symbol,
+                        'type': 'swap',
+                        'linear': True,
+                        'precision': {'amount': precision},
+                        'limits': {'amount': {'min': self.min_amount}},
+                    }
+                    for symbol in self.candles
+                }
+            return self.markets
+
+    async def fetch_ohlcv(self, symbol: str, timeframe: str = '1m', since: int = None, limit: int = None, params=None):
+        async with self._timed('fetch_ohlcv'):
+            if timeframe != self.timeframe:
+                raise ValueError(f"回放数据周期为 {self.timeframe}，请求的是 {timeframe}")
+            data = self.candles[symbol][:self.cursor + 1]
+            if since is not None:
+                data = data[data[:, 0] >= since]
+            if limit is not None:
+                data = data[-limit:]
+            rows = data.tolist()
+            for row in rows:
+                row[0] = int(row[0])
+            return rows
+
+    async def fetch_positions(self, symbols=None, params=None):
+        """与 ccxt 的币安实现一致，只返回数量不为 0 的持仓。"""
+        async with self._timed('fetch_positions'):
+            result = []
+            for symbol in (symbols or list(self.positions)):
+                pos = self.positions.get(symbol)
+                if not pos or pos['qty'] == 0:
+                    continue
+                price = self.last_price(symbol)
+                result.append({
+                    'symbol': symbol,
+                    'contracts': abs(pos['qty']),
+                    'side': 'long' if pos['qty'] > 0 else 'short',
+                    'entryPrice': pos['entry_price'],
+                    'markPrice': price,
+                    'notional': pos['qty'] * price,
+                    'unrealizedPnl': pos['qty'] * (price - pos['entry_price']),
+                    'info': {'positionAmt': str(pos['qty'])},
+                })
+            return result
+
+    def amount_to_precision(self, symbol: str, amount) -> str:
+        step = Decimal(str(self.amount_step))
+        value = (Decimal(str(amount)) / step).to_integral_value(rounding=ROUND_DOWN) * step
+        return format(value.normalize(), 'f')
+
+    async def create_market_buy_order(self, symbol: str, amount, params=None):
+        async with self._timed('create_market_buy_order'):
+            return self._fill(symbol, 'buy', float(amount), params or {})
+
+    async def create_market_sell_order(self, symbol: str, amount, params=None):
+        async with self._timed('create_market_sell_order'):
+            return self._fill(symbol, 'sell', float(amount), params or {})
+
+    def _fill(self, symbol: str, side: str, amount: float, params: dict) -> dict:
+        if symbol not in self.positions:
+            raise ReplayOrderError(f"未知品种 {symbol}")
+        if amount < self.min_amount:
+            raise ReplayOrderError(f"下单数量 {amount} 低于最小值 {self.min_amount}")
+
+        pos = self.positions[symbol]
+        signed = amount if side == 'buy' else -amount
+        if params.get('reduceOnly'):
+            if pos['qty'] == 0 or np.sign(pos['qty']) == np.sign(signed):
+                raise ReplayOrderError("ReduceOnly Order is rejected.")
+            signed = np.sign(signed) * min(abs(signed), abs(pos['qty']))
+
+        close = self.last_price(symbol)
+        price = close * (1 + self.slippage_rate) if side == 'buy' else close * (1 - self.slippage_rate)
+        qty = pos['qty']
+
+        realized = 0.0
+        if qty and np.sign(qty) != np.sign(signed):
+            closed = min(abs(signed), abs(qty))
+            realized = closed * (price - pos['entry_price']) * np.sign(qty)
+        new_qty = qty + signed
+        if abs(new_qty) < 1e-12:
+            new_qty, entry_price = 0.0, 0.0
+        elif qty == 0 or np.sign(new_qty) != np.sign(qty):
+            entry_price = price
+        elif np.sign(signed) == np.sign(qty):
+            entry_price = (pos['entry_price'] * abs(qty) + price * abs(signed)) / abs(new_qty)
+        else:
+            entry_price = pos['entry_price']
+
+        filled = abs(signed)
+        fee = filled * price * self.fee_rate
+        self.balance += realized - fee
+        self.fees_paid += fee
+        self.realized_pnl += realized
+        pos['qty'], pos['entry_price'] = new_qty, entry_price
+
+        order = {
+            'id': str(len(self.orders) + 1),
+            'symbol': symbol,
+            'type': 'market',
+            'side': side,
+            'amount': filled,
+            'filled': filled,
+            'remaining': 0.0,
+            'price': price,
+            'average': price,
+            'cost': filled * price,
+            'fee': {'currency': 'USDT', 'cost': fee},
+            'status': 'closed',
+            'timestamp': self.current_timestamp(),
+            'reduceOnly': bool(params.get('reduceOnly')),
+            'info': {'realizedPnl': realized},
+        }
+        self.orders.append(order)
+        return order
+
+
+def attach_replay_exchange(service, exchange: ReplayExchange):
+    """让已有的 BinanceTradingService 使用回放交易所而不是币安。"""
+    service.exchange = exchange
+    service.enabled = True
+    service.markets_loaded = False
+    return service
+
+
+@contextlib.contextmanager
+def redirect_trade_audit(path: str):
+    """回放期间把 write_trade_audit 的输出写入单独的 JSONL 文件，并跳过 SQLite 审计数据库。"""
+    original_log, original_db = config.TRADE_AUDIT_LOG, data_service.audit_db
+    config.TRADE_AUDIT_LOG = path
+    data_service.audit_db = None
+    try:
+        yield path
+    finally:
+        config.TRADE_AUDIT_LOG, data_service.audit_db = original_log, original_db
+
+
+def _latency_summary(samples) -> dict:
+    samples_ms = np.asarray(samples, dtype=np.float64) * 1000
+    if not len(samples_ms):
+        return {'count': 0}
+    return {
+        'count': len(samples_ms),
+        'mean_ms': float(samples_ms.mean()),
+        'p50_ms': float(np.percentile(samples_ms, 50)),
+        'p95_ms': float(np.percentile(samples_ms, 95)),
+        'p99_ms': float(np.percentile(samples_ms, 99)),
+        'max_ms': float(samples_ms.max()),
+    }
+
+
+async def replay(service, exchange: ReplayExchange, symbol: str, trade_amount_usdt: float = 100.0,
+                 dry_run: bool = False, max_position_size: float = 1.0, max_notional: float = 1000.0,
+                 max_steps: int = None, audit_log: str = None, add_log_func=None) -> dict:
+    """
+    在回放交易所剩余的每根K线上调用 service.execute_trade_logic。
+    返回逐K线结果 (信号、权益、延迟)、成交订单、端到端延迟分位数以及各交易所接口的调用统计。
+    """
+    attach_replay_exchange(service, exchange)
+    logs = deque(maxlen=1000)
+    log = add_log_func or logs.append
+    audit_log = audit_log or os.path.join(config.BASE_DIR, 'replay_trade_audit.log')
+
+    steps = []
+    latencies = []
+    wall_start = time.perf_counter()
+    with redirect_trade_audit(audit_log):
+        while max_steps is None or len(steps) < max_steps:
+            start = time.perf_counter()
+            result = await service.execute_trade_logic(symbol, exchange.timeframe, trade_amount_usdt, dry_run,
+                                                       max_position_size, max_notional, log)
+            elapsed = time.perf_counter() - start
+            latencies.append(elapsed)
+            steps.append({
+                'timestamp': exchange.current_timestamp(),
+                'close': exchange.last_price(symbol),
+                'signal': result.get('signal'),
+                'equity': exchange.equity(),
+                'position': exchange.positions[symbol]['qty'],
+                'latency_ms': elapsed * 1000,
+            })
+            if not exchange.advance():
+                break
+    wall_s = time.perf_counter() - wall_start
+
+    steps_df = pd.DataFrame(steps)
+    if not steps_df.empty:
+        steps_df.index = pd.to_datetime(steps_df.pop('timestamp'), unit='ms')
+    return {
+        'steps': steps_df,
+        'orders': exchange.orders,
+        'final_equity': exchange.equity(),
+        'realized_pnl': exchange.realized_pnl,
+        'fees_paid': exchange.fees_paid,
+        'bars_per_second': len(steps) / wall_s if wall_s > 0 else float('inf'),
+        'latency': _latency_summary(latencies),
+        'exchange_calls': {
+            name: {'count': stats['count'], 'mean_ms': stats['total_s'] / stats['count'] * 1000 if stats['count'] else 0.0}
+            for name, stats in exchange.call_stats.items()
+        },
+        'audit_log': audit_log,
+        'logs': list(logs),
+    }
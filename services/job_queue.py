@@ -0,0 +1,141 @@
+import json
+import time
+import uuid
+import hashlib
+import threading
+import concurrent.futures
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+
+class JobQueueFull(Exception):
+    """排队中的任务已达上限。"""
+
+
+class Job:
+    def __init__(self, job_id: str, key: str, params: Dict[str, Any]):
+        self.job_id = job_id
+        self.key = key
+        self.params = params
+        self.status = 'queued' # queued -> running -> succeeded / failed
+        self.stage = 'queued'
+        self.progress: List[Dict[str, Any]] = []
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.error_status: Optional[int] = None
+        self.submitters = 1
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('succeeded', 'failed')
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'stage': self.stage,
+            'submitters': self.submitters,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'params': self.params,
+        }
+
+
+def job_key(params: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:24]
+
+
+class JobQueue:
+    """
+    长耗时任务的后台队列：提交后立即返回任务 id，最多 max_concurrent 个任务同时在线程中执行。
+    参数完全相同的任务在排队或运行中时，重复提交直接返回同一个任务。
+    runner(params, progress) 执行任务，progress(stage, message) 上报阶段进度；
+    on_event(event) 在任务状态或阶段变化时被调用 (在工作线程中)。
+    """
+
+    def __init__(self, runner: Callable[[Dict[str, Any], Callable[[str, str], None]], Any],
+                 max_concurrent: int = 2, max_pending: int = 50, keep_finished: int = 200):
+        self.runner = runner
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self.on_event: Optional[Callable[[Dict[str, Any]], None]] = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='job')
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._active: Dict[str, Job] = {} # key -> 排队或运行中的任务
+        self._lock = threading.Lock()
+
+    def submit(self, params: Dict[str, Any]):
+        """提交任务，返回 (job, 是否合并到了已有任务)。"""
+        key = job_key(params)
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                job.submitters += 1
+                return job, True
+            if sum(1 for j in self._active.values() if j.status == 'queued') >= self.max_pending:
+                raise JobQueueFull(f"排队中的任务已达上限 ({self.max_pending})")
+            job = Job(uuid.uuid4().hex[:12], key, params)
+            self._jobs[job.job_id] = job
+            self._active[key] = job
+            self._prune()
+        self._emit(job, 'queued')
+        self._executor.submit(self._run, job)
+        return job, False
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.summary() for job in reversed(jobs)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in ('queued', 'running', 'succeeded', 'failed')}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: Job):
+        job.status = job.stage = 'running'
+        job.started_at = time.time()
+        self._emit(job, 'started')
+
+        def progress(stage: str, message: str = ''):
+            job.stage = stage
+            self._emit(job, message)
+
+        try:
+            job.result = self.runner(job.params, progress)
+            job.status = job.stage = 'succeeded'
+        except Exception as e:
+            job.status = job.stage = 'failed'
+            job.error = str(getattr(e, 'detail', None) or e)
+            job.error_status = getattr(e, 'status_code', 500)
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._active.pop(job.key, None)
+            self._emit(job, job.error or '')
+
+    def _emit(self, job: Job, message: str):
+        event = {'job_id': job.job_id, 'status': job.status, 'stage': job.stage, 'message': message, 'time': time.time()}
+        job.progress.append(event)
+        if self.on_event is not None:
+            try:
+                self.on_event(event)
+            except Exception as e:
+                print(f"任务事件推送失败: {e}")
+
+    def _prune(self):
+        """只保留最近 keep_finished 个已结束的任务。"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
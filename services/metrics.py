@@ -0,0 +1,145 @@
+import math
+import bisect
+import time
+import asyncio
+import inspect
+import threading
+import functools
+import contextlib
+import contextvars
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 秒；覆盖从缓存命中的几十微秒到慢速数据下载的十几秒
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 当前阶段的 (symbol, timeframe)，嵌套的计时器未指定时沿用外层的标签
+_labels: contextvars.ContextVar = contextvars.ContextVar('metrics_labels', default=('', ''))
+# 计算进程中收集观测值 (随任务结果返回主进程)，为 None 时直接写入本进程的注册表
+_capture: contextvars.ContextVar = contextvars.ContextVar('metrics_capture', default=None)
+
+
+class Histogram:
+    """按标签值分组的累计直方图，与 Prometheus histogram 语义一致。"""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {} # label values -> [每个桶的计数..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, label_values: Tuple[str, ...]):
+        index = bisect.bisect_left(self.buckets, value) # 第一个上界 >= value 的桶，超出时为 +Inf
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            labels = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), values):
+                cumulative += count
+                le = '+Inf' if bound == math.inf else repr(bound)
+                lines.append(f'{self.name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {values[-2]}')
+            lines.append(f'{self.name}_count{{{labels}}} {values[-1]}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# 信号流水线各阶段耗时 (数据加载、特征、模型加载、预测、查询持仓、下单等)
+STAGE_SECONDS = Histogram('signal_stage_seconds', 'Latency of signal pipeline stages in seconds.',
+                          ('stage', 'symbol', 'timeframe'))
+
+
+def current_labels() -> Tuple[str, str]:
+    return _labels.get()
+
+
+def observe_stage(stage: str, symbol: str, timeframe: str, seconds: float):
+    observations = _capture.get()
+    if observations is not None:
+        observations.append((stage, symbol, timeframe, seconds))
+    else:
+        STAGE_SECONDS.observe(seconds, (stage, symbol, timeframe))
+
+
+def record(observations):
+    """写入计算进程返回的观测值。"""
+    for stage, symbol, timeframe, seconds in observations:
+        STAGE_SECONDS.observe(seconds, (stage, symbol, timeframe))
+
+
+@contextlib.contextmanager
+def stage_timer(stage: str, symbol: Optional[str] = None, timeframe: Optional[str] = None):
+    """记录一个阶段的耗时；symbol / timeframe 为 None 时沿用外层阶段的标签。异常退出同样计时。"""
+    parent_symbol, parent_timeframe = _labels.get()
+    symbol = parent_symbol if symbol is None else str(symbol)
+    timeframe = parent_timeframe if timeframe is None else str(timeframe)
+    token = _labels.set((symbol, timeframe))
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, symbol, timeframe, time.perf_counter() - started)
+        _labels.reset(token)
+
+
+@contextlib.contextmanager
+def capture(labels: Tuple[str, str] = ('', '')):
+    """在计算进程中收集本任务的观测值，labels 为主进程调用方的 (symbol, timeframe)。"""
+    observations: List[tuple] = []
+    capture_token = _capture.set(observations)
+    labels_token = _labels.set(tuple(labels))
+    try:
+        yield observations
+    finally:
+        _labels.reset(labels_token)
+        _capture.reset(capture_token)
+
+
+def timed(stage: str, symbol_arg: Optional[str] = None, timeframe_arg: Optional[str] = None):
+    """函数计时装饰器 (同步或 async)，symbol_arg / timeframe_arg 为取标签值的参数名。"""
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        def labels(args, kwargs):
+            if symbol_arg is None and timeframe_arg is None:
+                return None, None
+            arguments = signature.bind_partial(*args, **kwargs).arguments
+            return arguments.get(symbol_arg), arguments.get(timeframe_arg)
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with stage_timer(stage, *labels(args, kwargs)):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage, *labels(args, kwargs)):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render() -> str:
+    """Prometheus 文本格式 (text/plain; version=0.0.4)。"""
+    return '\n'.join(STAGE_SECONDS.render()) + '\n'
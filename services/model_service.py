@@ -1,10 +1,10 @@
 import os
 import joblib
 import pandas as pd
-import lightgbm as lgb
-from sklearn.ensemble import RandomForestRegressor
 from config import config
 from services.data_service import log_base_prediction
+from services.metrics import timed, stage_timer
+from tree_inference import compile_model
 
 # Assuming these modules are available in the path
 try:
@@ -15,22 +15,53 @@ except ImportError:
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     from feature_generator import generate_features
 
-# Load error model once
-error_model = None
-if os.path.exists(config.ERROR_MODEL_FILE):
+# 误差修正模型在第一次预测时加载 (导入本模块时不加载 sklearn / lightgbm)
+_error_model = None
+_error_model_loaded = False
+
+def get_error_model():
+    global _error_model, _error_model_loaded
+    if not _error_model_loaded:
+        _error_model_loaded = True
+        if os.path.exists(config.ERROR_MODEL_FILE):
+            try:
+                _error_model = joblib.load(config.ERROR_MODEL_FILE)
+                print("✅ 误差修正模型已成功加载。")
+            except Exception as e:
+                print(f"⚠️ 加载误差修正模型失败: {e}")
+    return _error_model
+
+# 已加载模型的缓存: model_path -> (mtime_ns, model, model_features, compiled)
+# 模型文件被重新训练覆盖后 mtime 变化，会自动重新加载和编译
+_model_cache = {}
+
+def model_version(ticker: str):
+    """模型文件的修改时间 (ns)，用作模型版本；文件不存在时返回 None。"""
     try:
-        error_model = joblib.load(config.ERROR_MODEL_FILE)
-        print("✅ 误差修正模型已成功加载。")
-    except Exception as e:
-        print(f"⚠️ 加载误差修正模型失败: {e}")
+        return os.stat(config.get_model_path(ticker)).st_mtime_ns
+    except OSError:
+        return None
 
 def load_model(ticker: str, add_log_func):
+    model, model_features, _ = load_compiled_model(ticker, add_log_func)
+    return model, model_features
+
+@timed('load_model', symbol_arg='ticker')
+def load_compiled_model(ticker: str, add_log_func):
+    """返回 (model, model_features, compiled)。compiled 为 None 时调用方应退回 model.predict。"""
     model_path = config.get_model_path(ticker)
     if not os.path.exists(model_path):
         add_log_func(f"警告: 未找到模型文件 {model_path}")
-        return None, None
-    
+        return None, None, None
+
+    mtime_ns = os.stat(model_path).st_mtime_ns
+    cached = _model_cache.get(model_path)
+    if cached and cached[0] == mtime_ns:
+        return cached[1], cached[2], cached[3]
+
     try:
+        import lightgbm as lgb
+        from sklearn.ensemble import RandomForestRegressor
         model_payload = joblib.load(model_path)
         
         # Consistent model loading logic
@@ -51,46 +82,77 @@ def load_model(ticker: str, add_log_func):
             model_features = model_payload['features']
         else:
             raise ValueError("Unknown model format")
-            
-        return model, model_features
     except Exception as e:
         add_log_func(f"加载模型失败 {model_path}: {e}")
-        return None, None
+        return None, None, None
+
+    compiled = None
+    try:
+        compiled = compile_model(model)
+    except Exception as e:
+        add_log_func(f"模型编译失败，将使用 model.predict: {e}")
 
+    _model_cache[model_path] = (mtime_ns, model, model_features, compiled)
+    return model, model_features, compiled
+
+def predict_last_row(model, compiled, features_df: pd.DataFrame, model_features) -> float:
+    """对最后一行特征进行单行预测，优先使用编译后的树模型。"""
+    last_day_features = features_df.iloc[-1:][model_features]
+    if compiled is not None:
+        return compiled.predict_one(last_day_features.to_numpy(dtype=float)[0])
+    return model.predict(last_day_features)[0]
+
+def _last_feature_row(ticker: str, data_df: pd.DataFrame, model_features, add_log_func):
+    """生成特征并取最后一行模型特征，返回 (1 行 DataFrame, None)；数据不足或缺少特征时返回 (None, 原因)。"""
+    data_df['external_event'] = 0
+    for col in ['open', 'high', 'low', 'close', 'volume']:
+        if col in data_df.columns:
+            data_df[col] = pd.to_numeric(data_df[col], errors='coerce')
+
+    with stage_timer('generate_features', symbol=ticker):
+        features_df, feature_names = generate_features(data_df.copy())
+
+    if features_df.empty or features_df.isna().all().all():
+        add_log_func(f"错误: 为 {ticker} 生成特征后数据为空")
+        return None, "Insufficient data"
+
+    if not model_features and feature_names:
+        add_log_func("警告：模型中未找到 feature_names_in_，将使用 generate_features 返回的特征列表。")
+        model_features = feature_names
+
+    missing_features = [f for f in model_features if f not in features_df.columns]
+    if missing_features:
+        add_log_func(f"错误: 数据中缺少模型需要的特征: {missing_features}")
+        return None, f"Missing features: {missing_features}"
+
+    return features_df.iloc[-1:][model_features], None
+
+def _signal_for(prediction: float) -> str:
+    if prediction > 0.005:
+        return "BUY"
+    if prediction < -0.005:
+        return "SELL"
+    return "HOLD"
+
+@timed('generate_signal', symbol_arg='ticker')
 def generate_signal_from_data(ticker: str, data_df: pd.DataFrame, add_log_func) -> dict:
     """Stock signal generation"""
-    model, model_features = load_model(ticker, add_log_func)
+    model, model_features, compiled = load_compiled_model(ticker, add_log_func)
     if not model:
         return {"ticker": ticker, "signal": "HOLD", "comment": "Model not found or invalid"}
 
     try:
-        data_df['external_event'] = 0
-        for col in ['open', 'high', 'low', 'close', 'volume']:
-            if col in data_df.columns:
-                data_df[col] = pd.to_numeric(data_df[col], errors='coerce')
-        
-        features_df, feature_names = generate_features(data_df.copy())
-        
-        if features_df.empty or features_df.isna().all().all():
-            add_log_func(f"错误: 为 {ticker} 生成特征后数据为空")
-            return {"ticker": ticker, "signal": "HOLD", "comment": "Insufficient data"}
-        
-        if not model_features and feature_names:
-            add_log_func("警告：模型中未找到 feature_names_in_，将使用 generate_features 返回的特征列表。")
-            model_features = feature_names
+        last_row, comment = _last_feature_row(ticker, data_df, model_features, add_log_func)
+        if last_row is None:
+            return {"ticker": ticker, "signal": "HOLD", "comment": comment}
 
-        missing_features = [f for f in model_features if f not in features_df.columns]
-        if missing_features:
-            add_log_func(f"错误: 数据中缺少模型需要的特征: {missing_features}")
-            return {"ticker": ticker, "signal": "HOLD", "comment": f"Missing features: {missing_features}"}
-        
-        last_day_features = features_df.iloc[-1:][model_features]
-        
-        base_prediction = model.predict(last_day_features)[0]
+        with stage_timer('predict'):
+            base_prediction = predict_last_row(model, compiled, last_row, list(last_row.columns))
         final_prediction = base_prediction
 
         log_base_prediction(ticker, base_prediction)
 
+        error_model = get_error_model()
         if error_model:
             try:
                 error_model_input = pd.DataFrame({'base_prediction': [base_prediction]})
@@ -101,12 +163,7 @@ def generate_signal_from_data(ticker: str, data_df: pd.DataFrame, add_log_func)
                 add_log_func(f"应用误差模型失败: {e}")
         
         prediction_for_signal = final_prediction 
-        
-        signal = "HOLD"
-        if prediction_for_signal > 0.005:
-            signal = "BUY"
-        elif prediction_for_signal < -0.005:
-            signal = "SELL"
+        signal = _signal_for(prediction_for_signal)
         
         add_log_func(f"为 {ticker} 生成信号: {signal} (最终预测值: {prediction_for_signal:.4f})")
         return {"ticker": ticker, "signal": signal, "prediction": prediction_for_signal}
@@ -116,9 +173,72 @@ def generate_signal_from_data(ticker: str, data_df: pd.DataFrame, add_log_func)
         add_log_func(traceback.format_exc())
         return {"ticker": ticker, "signal": "ERROR", "comment": str(e)}
 
+def generate_signals_batch(ticker_data: dict, add_log_func) -> dict:
+    """
+    批量生成股票信号：每只股票单独生成特征，共用同一个模型文件的股票把最后一行特征堆叠后
+    做一次向量化 predict，误差修正模型同样整批调用。
+    ticker_data: {ticker: 行情 DataFrame}，返回 {ticker: 与 generate_signal_from_data 相同格式的结果}。
+    """
+    results = {}
+    rows = {}
+    for ticker, data_df in ticker_data.items():
+        model, model_features, compiled = load_compiled_model(ticker, add_log_func)
+        if not model:
+            results[ticker] = {"ticker": ticker, "signal": "HOLD", "comment": "Model not found or invalid"}
+            continue
+        try:
+            last_row, comment = _last_feature_row(ticker, data_df, model_features, add_log_func)
+        except Exception as e:
+            add_log_func(f"为 {ticker} 生成特征失败: {e}")
+            results[ticker] = {"ticker": ticker, "signal": "ERROR", "comment": str(e)}
+            continue
+        if last_row is None:
+            results[ticker] = {"ticker": ticker, "signal": "HOLD", "comment": comment}
+        else:
+            rows[ticker] = (model, compiled, last_row)
+    if not rows:
+        return results
+
+    # 按模型分组 (load_compiled_model 对同一模型文件返回同一个对象)，每组一次 predict
+    groups = {}
+    for ticker, (model, compiled, last_row) in rows.items():
+        groups.setdefault(id(model), []).append(ticker)
+    for tickers in groups.values():
+        with stage_timer('predict', symbol='batch'):
+            results.update(_predict_group(tickers, rows, add_log_func))
+    add_log_func(f"批量预测完成: {len(rows)} 只股票, {len(groups)} 次模型调用。")
+    return results
+
+def _predict_group(tickers, rows, add_log_func) -> dict:
+    model, compiled, first_row = rows[tickers[0]]
+    try:
+        X = pd.concat([rows[t][2] for t in tickers], ignore_index=True)[list(first_row.columns)]
+        if compiled is not None:
+            base_predictions = compiled.predict(X.to_numpy(dtype=float))
+        else:
+            base_predictions = model.predict(X)
+    except Exception as e:
+        add_log_func(f"批量预测失败: {e}")
+        return {t: {"ticker": t, "signal": "ERROR", "comment": str(e)} for t in tickers}
+
+    final_predictions = base_predictions
+    error_model = get_error_model()
+    if error_model:
+        try:
+            final_predictions = base_predictions + error_model.predict(pd.DataFrame({'base_prediction': base_predictions}))
+        except Exception as e:
+            add_log_func(f"应用误差模型失败: {e}")
+
+    results = {}
+    for ticker, base_prediction, prediction in zip(tickers, base_predictions, final_predictions):
+        log_base_prediction(ticker, float(base_prediction))
+        results[ticker] = {"ticker": ticker, "signal": _signal_for(prediction), "prediction": float(prediction)}
+    return results
+
+@timed('generate_signal', symbol_arg='ticker')
 def generate_signal_from_crypto_data(ticker: str, data_df: pd.DataFrame, add_log_func) -> dict:
     """Crypto signal generation"""
-    model, model_features = load_model(ticker, add_log_func)
+    model, model_features, compiled = load_compiled_model(ticker, add_log_func)
     if not model:
         return {"ticker": ticker, "signal": "HOLD", "comment": "Model not found"}
     
@@ -127,7 +247,8 @@ def generate_signal_from_crypto_data(ticker: str, data_df: pd.DataFrame, add_log
             if col in data_df.columns:
                 data_df[col] = pd.to_numeric(data_df[col], errors='coerce')
         
-        features_df, feature_names = generate_features(data_df.copy())
+        with stage_timer('generate_features'):
+            features_df, feature_names = generate_features(data_df.copy())
         features_df['external_event'] = 0
         
         if not model_features and feature_names:
@@ -145,7 +266,8 @@ def generate_signal_from_crypto_data(ticker: str, data_df: pd.DataFrame, add_log
             add_log_func(f"警告: 用于预测的最新数据点包含NaN值")
             return {"ticker": ticker, "signal": "HOLD", "comment": "数据不足以生成所有特征 (NaNs in last row)"}
             
-        prediction = model.predict(last_day_features)[0]
+        with stage_timer('predict'):
+            prediction = predict_last_row(model, compiled, features_df, model_features)
         add_log_func(f"模型预测值 (原始): {prediction:.6f}")
         
         signal = "HOLD"
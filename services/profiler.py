@@ -0,0 +1,175 @@
+import io
+import os
+import re
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import threading
+import contextlib
+import contextvars
+from typing import Any, Dict, List, Optional
+
+from config import config
+
+# 分析结果目录，只保留最近 PROFILE_KEEP 份
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(config.BASE_DIR, 'profiles'))
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '50'))
+# 设为 1 时分析每个 /predict 与 /strategy/run 请求 (否则需要 X-Profile 请求头或 ?profile=1)
+PROFILE_ALL_REQUESTS = os.getenv('PROFILE_REQUESTS', '0') == '1'
+# 摘要中列出的函数数量 (按累计耗时)
+SUMMARY_LINES = 40
+
+_TRUE_VALUES = ('1', 'true', 'yes', 'on')
+_PROFILE_ID = re.compile(r'^[\w-]+$')
+
+_current: contextvars.ContextVar = contextvars.ContextVar('request_profile', default=None)
+# cProfile 同一时间只允许一个 (3.12 起基于 sys.monitoring，全进程共享)；已有请求在分析时新请求不再分析
+_active = threading.Lock()
+
+
+def profiling_requested(request) -> bool:
+    """请求是否要求分析：X-Profile 请求头、?profile=1 或 PROFILE_REQUESTS=1。"""
+    if PROFILE_ALL_REQUESTS:
+        return True
+    value = request.headers.get('x-profile') or request.query_params.get('profile')
+    return value is not None and value.lower() in _TRUE_VALUES
+
+
+def current() -> Optional['RequestProfile']:
+    return _current.get()
+
+
+class _StatsSnapshot:
+    """让 pstats.Stats.add 接受计算进程返回的统计字典。"""
+
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class RequestProfile:
+    def __init__(self, endpoint: str, meta: Dict[str, Any]):
+        self.profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}_{endpoint}_{uuid.uuid4().hex[:6]}"
+        self.endpoint = endpoint
+        self.meta = meta
+        self.profiler = cProfile.Profile()
+        self.worker_stats: List[dict] = []
+        self.started = time.time()
+
+    def add_worker_stats(self, stats: dict):
+        """合并计算进程中同一请求的分析结果。"""
+        self.worker_stats.append(stats)
+
+    def save(self, seconds: float, error: Optional[str] = None):
+        stats = pstats.Stats(self.profiler)
+        for worker_stats in self.worker_stats:
+            stats.add(_StatsSnapshot(worker_stats))
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, self.profile_id)
+        stats.dump_stats(base + '.prof')
+
+        summary = io.StringIO()
+        stats.stream = summary
+        stats.sort_stats('cumulative').print_stats(SUMMARY_LINES)
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            f.write(f"{self.endpoint} {json.dumps(self.meta, ensure_ascii=False, default=str)} {seconds:.3f}s\n")
+            f.write(summary.getvalue())
+
+        info = {
+            'profile_id': self.profile_id,
+            'endpoint': self.endpoint,
+            'meta': self.meta,
+            'created_at': self.started,
+            'seconds': seconds,
+            'worker_tasks': len(self.worker_stats),
+            'error': error,
+        }
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(info, f, ensure_ascii=False, default=str)
+        _rotate()
+
+
+@contextlib.contextmanager
+def profile_request(endpoint: str, **meta):
+    """
+    用 cProfile 分析代码块，结束时 (包括异常) 把结果写入 PROFILE_DIR，yield RequestProfile；
+    已有请求正在被分析时不分析，yield None。
+    事件循环中的分析会包含同一时间段内其他请求在该线程上的执行。
+    """
+    if not _active.acquire(blocking=False):
+        print(f"⚠️ 已有请求正在被分析，跳过 {endpoint} 的 profiling")
+        yield None
+        return
+    profile = RequestProfile(endpoint, meta)
+    token = _current.set(profile)
+    started = time.perf_counter()
+    error = None
+    try:
+        profile.profiler.enable()
+        try:
+            yield profile
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            profile.profiler.disable()
+            try:
+                profile.save(time.perf_counter() - started, error)
+            except Exception as e:
+                print(f"❌ 保存分析结果失败: {e}")
+    finally:
+        _current.reset(token)
+        _active.release()
+
+
+def profile_call(fn, *args, **kwargs):
+    """在计算进程中分析一次调用，返回 (结果, 统计字典)；已有分析器在运行时 (同进程线程池) 统计为 None。"""
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return fn(*args, **kwargs), None
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+    profiler.create_stats()
+    return result, profiler.stats
+
+
+def _rotate():
+    profiles = list_profiles()
+    for info in profiles[PROFILE_KEEP:]:
+        for ext in ('.prof', '.txt', '.json'):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, info['profile_id'] + ext))
+            except OSError:
+                pass
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """最近的分析结果 (新的在前)。"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name), encoding='utf-8') as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(profiles, key=lambda p: p.get('created_at', 0), reverse=True)
+
+
+def profile_path(profile_id: str, fmt: str = 'txt') -> Optional[str]:
+    """分析结果文件路径 (fmt: txt 为按累计耗时排序的摘要，prof 为 pstats 原始数据)；不存在时返回 None。"""
+    if fmt not in ('txt', 'prof') or not _PROFILE_ID.match(profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.{fmt}")
+    return path if os.path.exists(path) else None
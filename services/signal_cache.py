@@ -0,0 +1,71 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class SignalCache:
+    """
+    按K线缓存信号：每个 (命名空间, 品种, 周期) 只保留最新一根K线的结果，
+    并记录生成它的模型版本和K线时间戳。同一根K线内的重复请求直接返回内存中的结果；
+    新K线出现或模型文件被替换时，旧结果失效并重新计算。
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # (namespace, symbol, timeframe) -> (model_version, bar_ts, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidated_bar = 0
+        self.invalidated_model = 0
+        self.evictions = 0
+
+    def get(self, namespace: str, symbol: str, timeframe: str, model_version: Hashable, bar_ts: Hashable) -> Optional[Any]:
+        slot = (namespace, symbol, timeframe)
+        with self._lock:
+            entry = self._entries.get(slot)
+            if entry is not None and entry[0] == model_version and entry[1] == bar_ts:
+                self.hits += 1
+                self._entries.move_to_end(slot)
+                return entry[2]
+            self.misses += 1
+            if entry is not None:
+                if entry[0] != model_version:
+                    self.invalidated_model += 1
+                else:
+                    self.invalidated_bar += 1
+                del self._entries[slot]
+            return None
+
+    def put(self, namespace: str, symbol: str, timeframe: str, model_version: Hashable, bar_ts: Hashable, value: Any):
+        slot = (namespace, symbol, timeframe)
+        with self._lock:
+            self._entries[slot] = (model_version, bar_ts, value)
+            self._entries.move_to_end(slot)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'invalidated_bar': self.invalidated_bar,
+                'invalidated_model': self.invalidated_model,
+                'evictions': self.evictions,
+                'entries': [{'namespace': ns, 'symbol': sym, 'timeframe': tf, 'bar': str(bar)}
+                            for (ns, sym, tf), (_, bar, _) in self._entries.items()],
+            }
+
+
+# 进程内共享的信号缓存 (/predict 与 /get_btc_signal)
+signal_cache = SignalCache()
@@ -0,0 +1,149 @@
+import re
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+# K线收盘后等待交易所写完该K线最终数据的时间 (秒)，之后按刚收盘的K线计算信号
+BAR_CLOSE_DELAY_SECONDS = 2.0
+# 收盘后仍拿到旧K线或计算失败时的首次重试间隔 (秒)，之后逐次翻倍，最长为K线周期的 1/12
+RETRY_SECONDS = 5.0
+# 同时推送的 (品种, 周期) 上限
+MAX_STREAMS = 200
+
+_TIMEFRAME = re.compile(r'^(\d+)([mhdw])$')
+_UNIT_SECONDS = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def timeframe_seconds(timeframe: str) -> int:
+    """'5m' -> 300；格式不正确时抛出 ValueError。"""
+    match = _TIMEFRAME.match(timeframe or '')
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"不支持的周期: {timeframe}")
+    return int(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+
+
+def seconds_until_next_bar(period: int, now: float) -> float:
+    """到下一根K线收盘 (按 UTC 对齐) 的秒数。"""
+    return period - (now % period)
+
+
+class SignalStream:
+    """
+    按 (品种, 周期) 推送信号：每个有订阅者的品种一个后台循环，在每根K线收盘后计算一次信号并推送给所有订阅者，
+    计算量与订阅者数量和轮询频率无关。最后一个订阅者退订后循环停止。
+    compute(symbol, timeframe) 返回 (K线时间, 信号结果)；publish(key, payload) 推送给该 key 的订阅者。
+    只在单个事件循环内使用。
+    """
+
+    def __init__(self, compute: Callable[[str, str], Awaitable[Tuple[Any, Dict[str, Any]]]],
+                 max_streams: int = MAX_STREAMS):
+        self.compute = compute
+        self.publish: Optional[Callable[[Tuple[str, str], Dict[str, Any]], Awaitable[None]]] = None
+        self.max_streams = max_streams
+        self._subscribers: Dict[Tuple[str, str], Set[str]] = {}
+        self._tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.latest: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.computes = 0
+        self.pushes = 0
+
+    def subscribe(self, sid: str, symbol: str, timeframe: str) -> Optional[Dict[str, Any]]:
+        """订阅并返回该 key 最近一次推送的信号 (没有则为 None)；周期无效或推送数量已达上限时抛出 ValueError。"""
+        timeframe_seconds(timeframe)
+        key = (symbol, timeframe)
+        if key not in self._subscribers and len(self._subscribers) >= self.max_streams:
+            raise ValueError(f"推送的品种数量已达上限 ({self.max_streams})")
+        self._subscribers.setdefault(key, set()).add(sid)
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.ensure_future(self._run(key))
+        return self.latest.get(key)
+
+    def unsubscribe(self, sid: str, symbol: str, timeframe: str) -> bool:
+        key = (symbol, timeframe)
+        subscribers = self._subscribers.get(key)
+        if not subscribers or sid not in subscribers:
+            return False
+        subscribers.discard(sid)
+        if not subscribers:
+            self._stop(key)
+        return True
+
+    def unsubscribe_all(self, sid: str):
+        for symbol, timeframe in [key for key, subscribers in self._subscribers.items() if sid in subscribers]:
+            self.unsubscribe(sid, symbol, timeframe)
+
+    def shutdown(self):
+        for key in list(self._subscribers):
+            self._stop(key)
+
+    def _stop(self, key: Tuple[str, str]):
+        self._subscribers.pop(key, None)
+        self.latest.pop(key, None)
+        task = self._tasks.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    async def _run(self, key: Tuple[str, str]):
+        symbol, timeframe = key
+        period = timeframe_seconds(timeframe)
+        last_bar = None
+        retries = 0
+        while True:
+            try:
+                bar, result = await self.compute(symbol, timeframe)
+                self.computes += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                bar, result = None, {"signal": "ERROR", "comment": str(e)}
+
+            previous = self.latest.get(key)
+            recovered = previous is None or previous.get("signal") == "ERROR"
+            if result.get("signal") == "ERROR":
+                # 错误只推送一次，之后按重试间隔重新计算
+                if previous is None or previous.get("signal") != "ERROR":
+                    await self._push(key, None, result)
+                delay = self._retry_delay(period, retries)
+                retries += 1
+            elif bar != last_bar or recovered:
+                last_bar = bar
+                retries = 0
+                await self._push(key, bar, result)
+                delay = seconds_until_next_bar(period, time.time()) + BAR_CLOSE_DELAY_SECONDS
+            else:
+                # 数据源还没有新K线 (如日线在休市日)
+                delay = self._retry_delay(period, retries)
+                retries += 1
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _retry_delay(period: int, retries: int) -> float:
+        return min(RETRY_SECONDS * 2 ** min(retries, 16), max(RETRY_SECONDS, period / 12))
+
+    async def _push(self, key: Tuple[str, str], bar, result: Dict[str, Any]):
+        payload = {
+            "symbol": key[0],
+            "timeframe": key[1],
+            "bar": None if bar is None else str(bar),
+            "signal": result.get("signal"),
+            "prediction": result.get("prediction"),
+            "comment": result.get("comment"),
+            "computed_at": time.time(),
+        }
+        self.latest[key] = payload
+        if self.publish is not None:
+            try:
+                await self.publish(key, payload)
+                self.pushes += 1
+            except Exception as e:
+                print(f"信号推送失败 {key}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'streams': len(self._subscribers),
+            'subscriptions': sum(len(s) for s in self._subscribers.values()),
+            'computes': self.computes,
+            'pushes': self.pushes,
+            'keys': [{'symbol': symbol, 'timeframe': timeframe, 'subscribers': len(subscribers),
+                      'bar': (self.latest.get((symbol, timeframe)) or {}).get('bar')}
+                     for (symbol, timeframe), subscribers in self._subscribers.items()],
+        }
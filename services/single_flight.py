@@ -0,0 +1,40 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    合并并发的重复请求：同一个 key 同时只执行一次，执行期间到达的相同请求等待同一个结果
+    (异常同样共享)。执行结束后 key 被移除，之后的请求会重新执行 (结果缓存由 SignalCache 负责)。
+    只在单个事件循环内使用。
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: 某个调用方被取消 (如客户端断开) 时不影响其他等待者
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        calls = self.executions + self.coalesced
+        return {
+            'in_flight': len(self._inflight),
+            'executions': self.executions,
+            'coalesced': self.coalesced,
+            'coalesced_rate': self.coalesced / calls if calls else 0.0,
+        }
+
+
+# 进程内共享，用于 /predict 与 /get_btc_signal 的信号计算
+signal_flight = SingleFlight()
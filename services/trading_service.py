@@ -1,9 +1,20 @@
-import ccxt.async_support as ccxt
 import pandas as pd
-import asyncio
+import time
 from config import config
 from services.data_service import write_trade_audit, sanitize_for_json
-from services.model_service import generate_signal_from_crypto_data
+from services.model_service import model_version
+from services.signal_cache import signal_cache
+from services.single_flight import signal_flight
+from services.compute_pool import compute_pool
+from services.metrics import timed, stage_timer
+from services.signal_stream import timeframe_seconds
+
+
+def closed_klines(df: pd.DataFrame, timeframe: str, now: float = None) -> pd.DataFrame:
+    """去掉尚未收盘的K线 (币安返回的最后一根是正在形成的K线)，now 为 UNIX 秒，默认当前时间。"""
+    now_ms = (time.time() if now is None else now) * 1000
+    return df[df['timestamp'] + timeframe_seconds(timeframe) * 1000 <= now_ms]
+
 
 class BinanceTradingService:
     def __init__(self):
@@ -32,6 +43,7 @@ class BinanceTradingService:
             print(f"🌍 Using Proxy: {exchange_config['proxies']}")
 
         try:
+            import ccxt.async_support as ccxt # 导入很慢，未配置密钥时不需要
             self.exchange = ccxt.binance(exchange_config)
             if config.BINANCE_TESTNET:
                 self.exchange.set_sandbox_mode(True)
@@ -70,6 +82,7 @@ class BinanceTradingService:
         if self.exchange:
             await self.exchange.close()
 
+    @timed('get_klines', symbol_arg='symbol', timeframe_arg='timeframe')
     async def get_klines(self, symbol: str, timeframe: str = '5m', limit: int = 250) -> pd.DataFrame:
         if not await self.ensure_markets():
              raise Exception("Binance markets not loaded")
@@ -81,6 +94,7 @@ class BinanceTradingService:
         df.set_index('date', inplace=True)
         return df
 
+    @timed('fetch_positions', symbol_arg='symbol')
     async def get_position(self, symbol: str):
         if not await self.ensure_markets():
             return 0.0, None
@@ -103,6 +117,33 @@ class BinanceTradingService:
             print(f"Error fetching position: {e}")
             return 0.0, None
 
+    async def signal_for_klines(self, symbol: str, timeframe: str, df: pd.DataFrame, add_log_func) -> dict:
+        """
+        根据已收盘的K线计算信号 (不下单)，正在形成的最后一根K线不参与计算，也不作为缓存键。
+        同一根已收盘K线、同一模型版本内的重复请求复用已生成的信号，
+        因此下单请求与信号推送 (SignalStream) 在同一根K线上只计算一次，结果也与该K线内的请求时间无关。
+        """
+        try:
+            df = closed_klines(df, timeframe)
+        except ValueError as e:
+            return {"symbol": symbol, "signal": "ERROR", "comment": str(e)}
+        if df.empty:
+            return {"symbol": symbol, "signal": "ERROR", "comment": "No closed klines"}
+        bar_ts = int(df['timestamp'].iloc[-1])
+        version = model_version(symbol)
+        result = signal_cache.get('binance', symbol, timeframe, version, bar_ts)
+        if result is not None:
+            add_log_func(f"Signal cache hit for bar {df.index[-1]}")
+            return result
+        result = await signal_flight.do(
+            ('binance', symbol, timeframe, version, bar_ts),
+            lambda: compute_pool.crypto_signal(symbol, df, add_log_func)
+        )
+        if result.get("signal") != "ERROR":
+            signal_cache.put('binance', symbol, timeframe, version, bar_ts, result)
+        return result
+
+    @timed('trade_logic', symbol_arg='symbol', timeframe_arg='timeframe')
     async def execute_trade_logic(self, symbol: str, timeframe: str, trade_amount_usdt: float, 
                            dry_run: bool, max_position_size: float, max_notional: float,
                            add_log_func):
@@ -117,13 +158,8 @@ class BinanceTradingService:
             add_log_func(f"Failed to fetch klines: {e}")
             return {"symbol": symbol, "signal": "ERROR", "comment": f"Fetch klines failed: {e}"}
 
-        # 2. Generate Signal (CPU bound, run in executor)
-        loop = asyncio.get_running_loop()
-        result = await loop.run_in_executor(
-            None, 
-            generate_signal_from_crypto_data, 
-            symbol, df, add_log_func
-        )
+        # 2. Generate Signal (CPU bound, run in the compute pool)
+        result = await self.signal_for_klines(symbol, timeframe, df, add_log_func)
         
         signal = result.get("signal", "ERROR")
         pred = result.get('prediction', 'N/A')
@@ -171,7 +207,8 @@ class BinanceTradingService:
                 add_log_func(f"Closing Short: {close_qty}")
                 if not dry_run:
                     try:
-                        order = await self.exchange.create_market_buy_order(symbol, close_qty, params={'reduceOnly': True})
+                        with stage_timer('place_order'):
+                            order = await self.exchange.create_market_buy_order(symbol, close_qty, params={'reduceOnly': True})
                         self._audit_trade(symbol, signal, 'close', 'BUY', close_qty, current_price, dry_run, order)
                     except Exception as e:
                         add_log_func(f"Close Short Failed: {e}")
@@ -182,7 +219,8 @@ class BinanceTradingService:
             add_log_func(f"Opening Long: {adjusted_qty}")
             if not dry_run:
                 try:
-                    order = await self.exchange.create_market_buy_order(symbol, adjusted_qty)
+                    with stage_timer('place_order'):
+                        order = await self.exchange.create_market_buy_order(symbol, adjusted_qty)
                     audit_id = self._audit_trade(symbol, signal, 'open', 'BUY', adjusted_qty, current_price, dry_run, order)
                 except Exception as e:
                     add_log_func(f"Open Long Failed: {e}")
@@ -197,7 +235,8 @@ class BinanceTradingService:
                 add_log_func(f"Closing Long: {close_qty}")
                 if not dry_run:
                     try:
-                        order = await self.exchange.create_market_sell_order(symbol, close_qty, params={'reduceOnly': True})
+                        with stage_timer('place_order'):
+                            order = await self.exchange.create_market_sell_order(symbol, close_qty, params={'reduceOnly': True})
                         self._audit_trade(symbol, signal, 'close', 'SELL', close_qty, current_price, dry_run, order)
                     except Exception as e:
                         add_log_func(f"Close Long Failed: {e}")
@@ -208,7 +247,8 @@ class BinanceTradingService:
             add_log_func(f"Opening Short: {adjusted_qty}")
             if not dry_run:
                 try:
-                    order = await self.exchange.create_market_sell_order(symbol, adjusted_qty)
+                    with stage_timer('place_order'):
+                        order = await self.exchange.create_market_sell_order(symbol, adjusted_qty)
                     audit_id = self._audit_trade(symbol, signal, 'open', 'SELL', adjusted_qty, current_price, dry_run, order)
                 except Exception as e:
                     add_log_func(f"Open Short Failed: {e}")
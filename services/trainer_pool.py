@@ -0,0 +1,250 @@
+import os
+import io
+import sys
+import time
+import uuid
+import asyncio
+import threading
+import contextlib
+import multiprocessing
+import multiprocessing.connection
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+# 常驻训练进程数；0 表示不使用 (每次训练启动一个 model_trainer.py 子进程)
+TRAINER_POOL_WORKERS = int(os.getenv('TRAINER_POOL_WORKERS', '1'))
+# 这些源码文件变化后，工作进程在下一个任务开始前重新加载模块
+TRAINER_SOURCES = ('model_trainer.py', 'feature_generator.py')
+
+_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _mtimes(paths) -> tuple:
+    result = []
+    for path in paths:
+        try:
+            result.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            result.append(None)
+    return tuple(result)
+
+
+class _LineWriter(io.TextIOBase):
+    """把 print 输出按行发送给主进程 (tqdm 的 \\r 进度刷新也按行处理)。"""
+
+    def __init__(self, events, job_id: str):
+        self.events = events
+        self.job_id = job_id
+        self._buffer = ''
+
+    def write(self, text: str) -> int:
+        self._buffer += text.replace('\r', '\n')
+        *lines, self._buffer = self._buffer.split('\n')
+        for line in lines:
+            if line.strip():
+                self.events.send((self.job_id, 'log', line.rstrip()))
+        return len(text)
+
+    def flush(self):
+        if self._buffer.strip():
+            self.events.send((self.job_id, 'log', self._buffer.rstrip()))
+        self._buffer = ''
+
+
+def _trainer_worker(tasks, events):
+    """
+    常驻训练进程：导入 model_trainer (连带 pandas、lightgbm、feature_generator 与因子数据) 后循环接收任务。
+    源码文件变化时重新加载模块，因子文件变化时重新加载因子数据。
+    """
+    sys.path.insert(0, _BASE_DIR)
+    import importlib
+    import feature_generator
+    import model_trainer
+    import lightgbm # noqa: F401  (model_trainer 在训练时才导入)
+    feature_generator.ensure_factor_data()
+
+    source_paths = [os.path.join(_BASE_DIR, name) for name in TRAINER_SOURCES]
+    source_sig = _mtimes(source_paths)
+    factor_sig = _mtimes(feature_generator.FACTOR_FILES.values())
+    events.send((None, 'ready', os.getpid()))
+
+    while True:
+        try:
+            task = tasks.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        job_id, ticker, horizons = task
+        writer = _LineWriter(events, job_id)
+        try:
+            with contextlib.redirect_stdout(writer), contextlib.redirect_stderr(writer):
+                if _mtimes(source_paths) != source_sig:
+                    print("检测到训练代码变化，重新加载模块...")
+                    feature_generator = importlib.reload(feature_generator)
+                    model_trainer = importlib.reload(model_trainer)
+                    source_sig = _mtimes(source_paths)
+                    factor_sig = _mtimes(feature_generator.FACTOR_FILES.values())
+                elif _mtimes(feature_generator.FACTOR_FILES.values()) != factor_sig:
+                    feature_generator._load_factor_data()
+                    factor_sig = _mtimes(feature_generator.FACTOR_FILES.values())
+                model_trainer.train_single_stock_model(ticker, horizons=horizons)
+            writer.flush()
+            events.send((job_id, 'done', None))
+        except BaseException as e:
+            writer.flush()
+            events.send((job_id, 'error', f"{type(e).__name__}: {e}"))
+
+
+class _TrainJob:
+    def __init__(self, job_id: str, task: tuple, loop, log_func: Optional[Callable[[str], None]]):
+        self.job_id = job_id
+        self.task = task
+        self.loop = loop
+        self.log_func = log_func
+        self.future = loop.create_future()
+        self.logs: List[str] = []
+
+
+class _TrainerProcess:
+    """一个训练进程及其任务/事件管道 (每个进程独立的管道，进程异常退出不会锁住其他进程)。"""
+
+    def __init__(self):
+        task_reader, self.tasks = multiprocessing.Pipe(duplex=False)
+        self.events, event_writer = multiprocessing.Pipe(duplex=False)
+        self.process = multiprocessing.Process(target=_trainer_worker, args=(task_reader, event_writer), daemon=True)
+        self.process.start()
+        task_reader.close()
+        event_writer.close()
+        self.job: Optional[_TrainJob] = None
+
+
+class TrainerPool:
+    """
+    常驻的模型训练进程池。任务排队后派发给空闲进程，训练输出逐行流回调用方，
+    省去每次训练启动解释器和导入 pandas / lightgbm / 因子数据的开销。
+    """
+
+    def __init__(self, workers: int = TRAINER_POOL_WORKERS):
+        self.workers = workers
+        self._procs: List[_TrainerProcess] = []
+        self._pending: Deque[_TrainJob] = deque()
+        self._lock = threading.Lock()
+        self._reader: Optional[threading.Thread] = None
+        self._running = False
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+
+    @property
+    def started(self) -> bool:
+        return self._running
+
+    def start(self):
+        if self._running or self.workers <= 0:
+            return
+        self._procs = [_TrainerProcess() for _ in range(self.workers)]
+        self._running = True
+        self._reader = threading.Thread(target=self._read_events, name='trainer-pool-events', daemon=True)
+        self._reader.start()
+        print(f"✅ Trainer pool started with {self.workers} worker processes.")
+
+    def shutdown(self):
+        if not self._running:
+            return
+        self._running = False
+        for proc in self._procs:
+            try:
+                proc.tasks.send(None)
+            except OSError:
+                pass
+        for proc in self._procs:
+            proc.process.join(timeout=5)
+            if proc.process.is_alive():
+                proc.process.terminate()
+        self._procs = []
+
+    async def train(self, ticker: str, horizons=None, log_func: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """提交训练任务并等待完成，返回 {'ok', 'error', 'logs', 'seconds'}；log_func 在读取线程中逐行调用。"""
+        job_id = uuid.uuid4().hex[:12]
+        job = _TrainJob(job_id, (job_id, ticker, list(horizons) if horizons else None), asyncio.get_running_loop(), log_func)
+        started = time.time()
+        with self._lock:
+            self._pending.append(job)
+            self._dispatch()
+        error = await job.future
+        return {'ok': error is None, 'error': error, 'logs': '\n'.join(job.logs), 'seconds': time.time() - started}
+
+    def _dispatch(self):
+        """把排队的任务发给空闲进程 (调用方持有锁)。"""
+        for proc in self._procs:
+            if not self._pending:
+                return
+            if proc.job is None and proc.process.is_alive():
+                job = self._pending.popleft()
+                proc.job = job
+                proc.tasks.send(job.task)
+
+    def _read_events(self):
+        while self._running:
+            conns = {proc.events: proc for proc in self._procs}
+            ready = multiprocessing.connection.wait(list(conns), timeout=1.0)
+            for conn in ready:
+                proc = conns[conn]
+                try:
+                    job_id, kind, payload = conn.recv()
+                except (EOFError, OSError):
+                    continue # 进程已退出，由下面的检查处理
+                job = proc.job
+                if job is None or job.job_id != job_id:
+                    continue
+                if kind == 'log':
+                    job.logs.append(payload)
+                    if job.log_func is not None:
+                        try:
+                            job.log_func(payload)
+                        except Exception:
+                            pass
+                elif kind in ('done', 'error'):
+                    self._finish(proc, payload if kind == 'error' else None)
+            self._replace_dead_workers()
+
+    def _finish(self, proc: _TrainerProcess, error: Optional[str]):
+        job = proc.job
+        with self._lock:
+            proc.job = None
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self._dispatch()
+        job.loop.call_soon_threadsafe(lambda: job.future.done() or job.future.set_result(error))
+
+    def _replace_dead_workers(self):
+        """训练进程异常退出 (如内存不足) 时让它正在执行的任务失败，并补充新进程。"""
+        for i, proc in enumerate(self._procs):
+            if proc.process.is_alive() or not self._running:
+                continue
+            if proc.job is not None:
+                self._finish(proc, f"训练进程异常退出 (exit code {proc.process.exitcode})")
+            with self._lock:
+                self._procs[i] = _TrainerProcess()
+                self.restarts += 1
+                self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'started': self._running,
+                'alive': sum(1 for proc in self._procs if proc.process.is_alive()),
+                'running_jobs': sum(1 for proc in self._procs if proc.job is not None),
+                'queued_jobs': len(self._pending),
+                'completed': self.completed,
+                'failed': self.failed,
+                'restarts': self.restarts,
+            }
+
+
+# 进程内共享；由 API 启动时 start()
+trainer_pool = TrainerPool()
@@ -0,0 +1,212 @@
+import numpy as np
+
+# LightGBM 中判定 "零值" 的阈值 (与 C++ 端 kZeroThreshold 一致)
+_LGB_ZERO_THRESHOLD = 1e-35
+# 输出不经过变换 (即 raw score 就是预测值) 的 LightGBM 目标函数
+_LGB_IDENTITY_OBJECTIVES = ('regression', 'regression_l1', 'huber', 'fair', 'quantile', 'mape')
+
+
+class CompiledTreeEnsemble:
+    """
+    把训练好的树模型 (LightGBM / RandomForest) 展平为紧凑的 NumPy 节点数组，
+    绕过 DataFrame 校验与 sklearn/LightGBM 包装层，直接做向量化的树遍历。
+
+    所有树的节点拼接在同一组数组中；叶子节点的左右孩子都指向自身，
+    因此遍历固定迭代 max_depth 步即可，不需要逐节点分支。
+    """
+
+    def __init__(self, feature, threshold, left, right, value, missing_left, nan_to_zero, zero_is_missing,
+                 roots, max_depth, n_features, average, cast_float32, feature_names=None, kind=''):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.missing_left = missing_left
+        self.nan_to_zero = nan_to_zero
+        self.zero_is_missing = zero_is_missing
+        self.roots = roots
+        self.max_depth = max_depth
+        self.n_features = n_features
+        self.average = average
+        self.cast_float32 = cast_float32
+        self.feature_names = list(feature_names) if feature_names is not None else []
+        self.kind = kind
+        self._has_zero_missing = bool(zero_is_missing.any())
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def _prepare(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"特征数量不匹配: 模型需要 {self.n_features} 个，输入为 {X.shape[1]} 个")
+        if self.cast_float32:
+            # sklearn 在预测前会把输入转换为 float32，这里保持一致以保证结果完全相同
+            X = X.astype(np.float32).astype(np.float64)
+        return X
+
+    def _leaf_nodes(self, X: np.ndarray) -> np.ndarray:
+        """返回形状为 (n_rows, n_trees) 的叶子节点下标。"""
+        n_rows = X.shape[0]
+        nodes = np.broadcast_to(self.roots, (n_rows, self.n_trees)).copy()
+        rows = np.arange(n_rows)[:, None]
+        if not self._has_zero_missing and not np.isnan(X).any():
+            # 常见情况: 无缺失值，只需比较阈值
+            for _ in range(self.max_depth):
+                go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+                nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            return nodes
+        for _ in range(self.max_depth):
+            v = X[rows, self.feature[nodes]]
+            is_nan = np.isnan(v)
+            nan_to_zero = self.nan_to_zero[nodes]
+            v = np.where(is_nan & nan_to_zero, 0.0, v)
+            missing = (is_nan & ~nan_to_zero) | (self.zero_is_missing[nodes] & (np.abs(v) <= _LGB_ZERO_THRESHOLD))
+            go_left = np.where(missing, self.missing_left[nodes], v <= self.threshold[nodes])
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict(self, X) -> np.ndarray:
+        """对一行 (1-D) 或多行 (2-D) 特征进行预测，返回 1-D 数组。"""
+        X = self._prepare(X)
+        leaf_values = self.value[self._leaf_nodes(X)]
+        # 按树的顺序逐棵累加，与 sklearn/LightGBM 的累加顺序一致
+        out = leaf_values[:, 0].copy()
+        for t in range(1, self.n_trees):
+            out += leaf_values[:, t]
+        if self.average:
+            out /= self.n_trees
+        return out
+
+    def predict_one(self, row) -> float:
+        """单行预测的便捷接口。"""
+        return float(self.predict(row)[0])
+
+    def predict_frame(self, df) -> np.ndarray:
+        """按模型的特征顺序从 DataFrame 中取列后预测。"""
+        columns = self.feature_names if self.feature_names else list(df.columns)
+        return self.predict(df[columns].to_numpy(dtype=np.float64))
+
+
+class _NodeBuffer:
+    """展平过程中累积节点属性的辅助容器。"""
+
+    def __init__(self):
+        self.feature, self.threshold, self.left, self.right, self.value = [], [], [], [], []
+        self.missing_left, self.nan_to_zero, self.zero_is_missing = [], [], []
+
+    def add(self, feature=0, threshold=0.0, value=0.0, missing_left=False, nan_to_zero=False, zero_is_missing=False) -> int:
+        idx = len(self.feature)
+        self.feature.append(feature)
+        self.threshold.append(threshold)
+        self.left.append(idx)
+        self.right.append(idx)
+        self.value.append(value)
+        self.missing_left.append(missing_left)
+        self.nan_to_zero.append(nan_to_zero)
+        self.zero_is_missing.append(zero_is_missing)
+        return idx
+
+    def build(self, roots, max_depth, n_features, average, cast_float32, feature_names, kind) -> CompiledTreeEnsemble:
+        return CompiledTreeEnsemble(
+            feature=np.asarray(self.feature, dtype=np.int32),
+            threshold=np.asarray(self.threshold, dtype=np.float64),
+            left=np.asarray(self.left, dtype=np.int32),
+            right=np.asarray(self.right, dtype=np.int32),
+            value=np.asarray(self.value, dtype=np.float64),
+            missing_left=np.asarray(self.missing_left, dtype=bool),
+            nan_to_zero=np.asarray(self.nan_to_zero, dtype=bool),
+            zero_is_missing=np.asarray(self.zero_is_missing, dtype=bool),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max_depth,
+            n_features=n_features,
+            average=average,
+            cast_float32=cast_float32,
+            feature_names=feature_names,
+            kind=kind,
+        )
+
+
+def _compile_sklearn_forest(model) -> CompiledTreeEnsemble:
+    buf = _NodeBuffer()
+    roots = []
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        offset = len(buf.feature)
+        missing_go_left = getattr(tree, 'missing_go_to_left', None)
+        for node in range(tree.node_count):
+            is_leaf = tree.children_left[node] == -1
+            idx = buf.add(
+                feature=0 if is_leaf else int(tree.feature[node]),
+                threshold=float(tree.threshold[node]),
+                value=float(tree.value[node, 0, 0]),
+                missing_left=bool(missing_go_left[node]) if missing_go_left is not None else False,
+            )
+            if not is_leaf:
+                buf.left[idx] = offset + int(tree.children_left[node])
+                buf.right[idx] = offset + int(tree.children_right[node])
+        roots.append(offset)
+        max_depth = max(max_depth, int(tree.max_depth))
+    feature_names = getattr(model, 'feature_names_in_', None)
+    return buf.build(roots, max_depth, int(model.n_features_in_), average=True, cast_float32=True,
+                     feature_names=feature_names, kind='sklearn')
+
+
+def _compile_lightgbm_booster(booster) -> CompiledTreeEnsemble:
+    dump = booster.dump_model()
+    objective = str(dump.get('objective', 'regression')).split(' ')[0]
+    if dump.get('num_class', 1) != 1 or objective not in _LGB_IDENTITY_OBJECTIVES:
+        raise ValueError(f"不支持的 LightGBM 目标函数: {objective}")
+
+    buf = _NodeBuffer()
+    roots = []
+    max_depth = 0
+    for tree_info in dump['tree_info']:
+        root = tree_info['tree_structure']
+        roots.append(len(buf.feature))
+        # 用显式栈做先序展平，避免深树时的递归开销；(节点, 父节点下标, 是否左孩子, 深度)
+        stack = [(root, -1, False, 0)]
+        while stack:
+            node, parent, is_left, depth = stack.pop()
+            if 'leaf_value' in node:
+                idx = buf.add(value=float(node['leaf_value']))
+                max_depth = max(max_depth, depth)
+            else:
+                if node.get('decision_type', '<=') != '<=':
+                    raise ValueError("不支持类别型分裂的 LightGBM 模型")
+                missing_type = node.get('missing_type', 'None')
+                idx = buf.add(
+                    feature=int(node['split_feature']),
+                    threshold=float(node['threshold']),
+                    missing_left=bool(node.get('default_left', True)),
+                    nan_to_zero=missing_type != 'NaN',
+                    zero_is_missing=missing_type == 'Zero',
+                )
+                stack.append((node['right_child'], idx, False, depth + 1))
+                stack.append((node['left_child'], idx, True, depth + 1))
+            if parent >= 0:
+                if is_left:
+                    buf.left[parent] = idx
+                else:
+                    buf.right[parent] = idx
+    return buf.build(roots, max_depth, int(dump['max_feature_idx']) + 1, average=False, cast_float32=False,
+                     feature_names=dump.get('feature_names'), kind='lightgbm')
+
+
+def compile_model(model) -> CompiledTreeEnsemble:
+    """
+    将 LGBMRegressor / lightgbm.Booster / RandomForestRegressor 编译为 CompiledTreeEnsemble。
+    不支持的模型类型抛出 TypeError。
+    """
+    if hasattr(model, 'booster_'):
+        return _compile_lightgbm_booster(model.booster_)
+    if hasattr(model, 'dump_model'):
+        return _compile_lightgbm_booster(model)
+    if hasattr(model, 'estimators_') and all(hasattr(e, 'tree_') for e in model.estimators_):
+        return _compile_sklearn_forest(model)
+    raise TypeError(f"无法编译的模型类型: {type(model).__name__}")
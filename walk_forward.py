@@ -0,0 +1,189 @@
+import os
+import hashlib
+import json
+import argparse
+import concurrent.futures
+import joblib
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List
+
+from backtester import Backtester
+from fast_backtester import simulate_signals, performance_metrics_from_arrays
+
+# 每个 fold 的模型与样本外预测缓存目录
+WALK_FORWARD_CACHE_DIR = 'walk_forward_cache'
+# 与 model_trainer.train_single_stock_model 一致的 LightGBM 参数
+DEFAULT_MODEL_PARAMS = {
+    'objective': 'regression',
+    'n_estimators': 200,
+    'learning_rate': 0.05,
+    'num_leaves': 31,
+    'max_depth': -1,
+    'random_state': 42,
+    'n_jobs': 1,
+    'verbose': -1,
+}
+
+
+def make_folds(n_rows: int, train_size: int, test_size: int, step: int = None) -> List[Dict[str, int]]:
+    """
+    生成滚动窗口的训练/测试区间 (行号, 左闭右开)。step 默认等于 test_size，即测试区间首尾相接。
+    """
+    step = step or test_size
+    folds = []
+    start = 0
+    while start + train_size + test_size <= n_rows:
+        folds.append({
+            'train_start': start,
+            'train_end': start + train_size,
+            'test_start': start + train_size,
+            'test_end': start + train_size + test_size,
+        })
+        start += step
+    return folds
+
+
+def _frame_digest(df: pd.DataFrame) -> str:
+    return hashlib.sha256(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes()).hexdigest()
+
+
+def fold_fingerprint(X_train: pd.DataFrame, y_train: pd.Series, X_test: pd.DataFrame, model_params: Dict[str, Any]) -> str:
+    """由训练数据、测试特征和模型参数计算 fold 指纹；任一变化都会得到新的指纹。"""
+    payload = json.dumps({
+        'train': _frame_digest(X_train.assign(__target__=y_train)),
+        'test': _frame_digest(X_test),
+        'features': list(X_train.columns),
+        'params': model_params,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def _fit_fold(X_train: pd.DataFrame, y_train: pd.Series, X_test: pd.DataFrame, model_params: Dict[str, Any]):
+    """训练单个 fold 的模型并预测测试区间 (在子进程中执行)。"""
+    import lightgbm as lgb
+
+    model = lgb.LGBMRegressor(**model_params)
+    model.fit(X_train, y_train)
+    predictions = np.full(len(X_test), np.nan)
+    valid = X_test.notna().all(axis=1).to_numpy()
+    if valid.any():
+        predictions[valid] = model.predict(X_test[valid])
+    return model, predictions
+
+
+def run_walk_forward(data: pd.DataFrame, features: List[str], target_col: str, train_size: int = 500,
+                     test_size: int = 60, step: int = None, purge: int = 5, model_params: Dict[str, Any] = None,
+                     buy_threshold: float = 0.01, sell_threshold: float = -0.01, initial_capital: float = 100000.0,
+                     transaction_cost_rate: float = 0.0003, slippage_rate: float = 0.0001,
+                     cache_dir: str = WALK_FORWARD_CACHE_DIR, n_jobs: int = 4) -> Dict[str, Any]:
+    """
+    滚动训练/测试的 walk-forward 回测。
+
+    data 为已生成特征和标签的 DataFrame (只需生成一次)。每个 fold 用 [train_start, train_end - purge)
+    训练 (剔除标签会看到测试区间的末尾 purge 行)，在测试区间上预测。模型与预测按 fold 指纹缓存，
+    参数或数据不变的 fold 直接读取缓存，其余 fold 在进程池中并行训练。
+    所有 fold 的样本外预测拼接后用快速回测引擎跑一条连续的净值曲线。
+    """
+    model_params = dict(DEFAULT_MODEL_PARAMS, **(model_params or {}))
+    os.makedirs(cache_dir, exist_ok=True)
+
+    folds = make_folds(len(data), train_size, test_size, step)
+    if not folds:
+        raise ValueError(f"数据长度 {len(data)} 不足以划分训练 {train_size} + 测试 {test_size} 的区间。")
+
+    X_all = data[features]
+    y_all = data[target_col]
+    fold_inputs = []
+    for fold in folds:
+        train_slice = slice(fold['train_start'], fold['train_end'] - purge)
+        train = pd.concat([X_all.iloc[train_slice], y_all.iloc[train_slice]], axis=1).dropna()
+        X_train, y_train = train[features], train[target_col]
+        X_test = X_all.iloc[fold['test_start']:fold['test_end']]
+        fingerprint = fold_fingerprint(X_train, y_train, X_test, model_params)
+        fold_inputs.append((fold, X_train, y_train, X_test, fingerprint))
+
+    results = {}
+    pending = []
+    for fold, X_train, y_train, X_test, fingerprint in fold_inputs:
+        cache_path = os.path.join(cache_dir, f'{fingerprint}.joblib')
+        if os.path.exists(cache_path):
+            results[fingerprint] = joblib.load(cache_path)['predictions']
+        else:
+            pending.append((X_train, y_train, X_test, fingerprint))
+
+    print(f"walk-forward: 共 {len(folds)} 个 fold，命中缓存 {len(folds) - len(pending)} 个，需训练 {len(pending)} 个。")
+    if pending:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max(1, n_jobs)) as executor:
+            futures = {executor.submit(_fit_fold, X_train, y_train, X_test, model_params): fingerprint
+                       for X_train, y_train, X_test, fingerprint in pending}
+            for future in concurrent.futures.as_completed(futures):
+                fingerprint = futures[future]
+                model, predictions = future.result()
+                joblib.dump({'model': model, 'features': features, 'predictions': predictions},
+                            os.path.join(cache_dir, f'{fingerprint}.joblib'))
+                results[fingerprint] = predictions
+
+    # --- 拼接样本外预测并回测 ---
+    oos_index = []
+    oos_predictions = []
+    fold_rows = []
+    computed = {fingerprint for *_, fingerprint in pending}
+    for fold, X_train, _, X_test, fingerprint in fold_inputs:
+        if oos_index and X_test.index[0] <= oos_index[-1][-1]:
+            # step < test_size 时测试区间重叠，只保留尚未覆盖的部分
+            keep = X_test.index > oos_index[-1][-1]
+            test_index, predictions = X_test.index[keep], results[fingerprint][keep]
+        else:
+            test_index, predictions = X_test.index, results[fingerprint]
+        oos_index.append(test_index)
+        oos_predictions.append(predictions)
+        fold_rows.append({
+            'train_from': data.index[fold['train_start']], 'train_to': data.index[fold['train_end'] - 1],
+            'test_from': data.index[fold['test_start']], 'test_to': data.index[fold['test_end'] - 1],
+            'train_samples': len(X_train), 'fingerprint': fingerprint, 'cached': fingerprint not in computed,
+        })
+
+    index = oos_index[0].append(oos_index[1:]) if len(oos_index) > 1 else oos_index[0]
+    predictions = np.concatenate(oos_predictions)
+    close = data.loc[index, 'close'].to_numpy(dtype=np.float64)
+    signals = Backtester.predictions_to_signals(predictions, buy_threshold, sell_threshold)
+    result = simulate_signals(close, signals, initial_capital, transaction_cost_rate, slippage_rate)
+    metrics = performance_metrics_from_arrays(result['portfolio_value'], result['daily_returns'], result['trades'],
+                                              initial_capital, result['capital'])
+    return {
+        'folds': pd.DataFrame(fold_rows),
+        'predictions': pd.Series(predictions, index=index, name='predicted_return'),
+        'equity': pd.Series(result['portfolio_value'], index=index, name='portfolio_value'),
+        'trades': result['trades'],
+        'metrics': metrics,
+    }
+
+
+if __name__ == '__main__':
+    from data_handler import get_any_stock_data
+    from feature_generator import generate_features
+    from model_trainer import create_target_labels
+
+    parser = argparse.ArgumentParser(description='滚动窗口 walk-forward 回测')
+    parser.add_argument('ticker', type=str, help='股票代码 (例如: sh.600519, NVDA, BTC/USDT)')
+    parser.add_argument('--start', type=str, default='20150101', help='开始日期 (YYYYMMDD)')
+    parser.add_argument('--end', type=str, default='20231231', help='结束日期 (YYYYMMDD)')
+    parser.add_argument('--train', type=int, default=500, help='训练窗口长度 (K线数)')
+    parser.add_argument('--test', type=int, default=60, help='测试窗口长度 (K线数)')
+    parser.add_argument('--future_days', type=int, default=5, help='预测周期')
+    parser.add_argument('--jobs', type=int, default=4, help='并行训练的进程数')
+    args = parser.parse_args()
+
+    raw = get_any_stock_data(ticker=args.ticker, start_date=args.start, end_date=args.end)
+    if raw.empty:
+        print("无法获取数据，退出。")
+        raise SystemExit(1)
+    features_df, feature_names = generate_features(raw.copy())
+    labeled = create_target_labels(features_df, future_days=args.future_days)
+    output = run_walk_forward(labeled, feature_names, f'future_{args.future_days}d_return', train_size=args.train,
+                              test_size=args.test, purge=args.future_days, n_jobs=args.jobs)
+    print(output['folds'].to_string())
+    print("\n--- walk-forward 样本外回测指标 ---")
+    for key, value in output['metrics'].items():
+        print(f"{key}: {value}")